@@ -0,0 +1,326 @@
+import os
+import math
+import time
+import asyncio
+import itertools
+import threading
+from collections import OrderedDict, namedtuple
+from dotenv import load_dotenv
+from metrics import count_admission
+
+# Load environment variables
+load_dotenv()
+
+ADMITTED = 'admitted'
+DEGRADED = 'degraded'
+SHED = 'shed'
+
+# outcome: admitted, degraded or shed; reason: the limit that was hit; retry_after: seconds
+Decision = namedtuple('Decision', ['outcome', 'reason', 'retry_after'])
+
+ADMIT = Decision(ADMITTED, None, 0.0)
+
+def _take(state, rate, burst, now, cost=1):
+    """Refill a [tokens, updated] bucket and take cost tokens: 0.0, or seconds until they are available
+
+    A cost above burst needs a full bucket and leaves it in debt, so the caller waits
+    cost / rate seconds in total before the next request.
+    """
+    tokens = min(burst, state[0] + (now - state[1]) * rate)
+    state[1] = now
+    needed = min(cost, burst)
+    if tokens >= needed:
+        state[0] = tokens - cost
+        return 0.0
+    state[0] = tokens
+    return (needed - tokens) / rate
+
+class TokenBucket:
+    """rate tokens per second up to burst; one token per request unless given a cost"""
+    
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._state = [float(burst), clock()]
+        self._lock = threading.Lock()
+    
+    def take(self, cost=1):
+        with self._lock:
+            return _take(self._state, self.rate, self.burst, self._clock(), cost)
+
+class KeyedTokenBuckets:
+    """One token bucket per key, the least recently seen key evicted beyond max_keys
+
+    An evicted key starts again with a full bucket, which is what it would have
+    refilled to after sitting idle that long in most cases.
+    """
+    
+    def __init__(self, rate, burst, max_keys=100000, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._clock = clock
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def take(self, key, cost=1):
+        with self._lock:
+            now = self._clock()
+            state = self._buckets.get(key)
+            if state is None:
+                state = self._buckets[key] = [float(self.burst), now]
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            return _take(state, self.rate, self.burst, now, cost)
+    
+    def __len__(self):
+        return len(self._buckets)
+
+class _Waiter:
+    __slots__ = ('granted', 'notify')
+    
+    def __init__(self, notify):
+        self.granted = False
+        self.notify = notify
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+class ConcurrencyLimiter:
+    """At most max_in_flight requests at once; others wait up to queue_timeout in FIFO order
+
+    A freed slot passes straight to the oldest waiter. Once a request has waited the whole
+    queue_timeout the queue is standing, so new arrivals that find no free slot are refused
+    at once until it drains instead of each waiting out the timeout.
+    """
+    
+    def __init__(self, max_in_flight, max_queue=32, queue_timeout=0.5, clock=time.monotonic):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._waiters = OrderedDict()
+        self._ids = itertools.count()
+        self._shed_until = 0.0
+        
+        # Counters
+        self.timeouts = 0
+    
+    def _enqueue(self, notify):
+        """(None, None) after taking a free slot, (reason, None) when refused, else (key, waiter) once queued"""
+        if self._in_flight < self.max_in_flight and not self._waiters:
+            self._in_flight += 1
+            return None, None
+        if len(self._waiters) >= self.max_queue:
+            return 'queue_full', None
+        if self._clock() < self._shed_until:
+            return 'queue_timeout', None
+        key = next(self._ids)
+        waiter = self._waiters[key] = _Waiter(notify)
+        return key, waiter
+    
+    def acquire(self):
+        """Take a slot; returns None once admitted or the reason the request was refused"""
+        event = threading.Event()
+        with self._lock:
+            key, waiter = self._enqueue(event.set)
+        if waiter is None:
+            return key
+        event.wait(self.queue_timeout)
+        return self._finish_wait(key, waiter)
+    
+    async def acquire_async(self):
+        """acquire() for the event loop; waiting does not hold a thread"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            key, waiter = self._enqueue(lambda: loop.call_soon_threadsafe(_resolve, future))
+        if waiter is None:
+            return key
+        try:
+            await asyncio.wait_for(future, self.queue_timeout)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            # The client went away; hand back a slot granted in the meantime
+            with self._lock:
+                granted = waiter.granted
+                if not granted:
+                    del self._waiters[key]
+            if granted:
+                self.release()
+            raise
+        return self._finish_wait(key, waiter)
+    
+    def _finish_wait(self, key, waiter):
+        with self._lock:
+            # A slot granted between the timeout and taking the lock is kept
+            if waiter.granted:
+                return None
+            del self._waiters[key]
+            self._shed_until = self._clock() + self.queue_timeout
+            self.timeouts += 1
+            return 'queue_timeout'
+    
+    def release(self):
+        with self._lock:
+            if self._waiters:
+                _, waiter = self._waiters.popitem(last=False)
+                waiter.granted = True
+                waiter.notify()
+                return
+            self._in_flight -= 1
+            # The queue has drained
+            self._shed_until = 0.0
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'in_flight': self._in_flight,
+                'waiting': len(self._waiters),
+                'max_in_flight': self.max_in_flight,
+                'max_queue': self.max_queue,
+                'queue_timeout': self.queue_timeout,
+                'timeouts': self.timeouts
+            }
+
+class AdmissionController:
+    """Per-user and global token buckets plus a concurrency limit in front of chat requests
+
+    Over a user's rate the request is shed (429). Over the global rate or the queue-wait
+    target it is degraded to a local answer or shed (503), following overload_policy.
+    Every check is O(1).
+    """
+    
+    def __init__(self, user_rate=0.0, user_burst=10, max_users=100000, global_rate=0.0, global_burst=100,
+                 max_in_flight=6, max_queue=32, queue_target=0.5, overload_policy='degrade', clock=time.monotonic):
+        if overload_policy not in ('degrade', 'shed'):
+            raise ValueError(f"Unknown overload policy: {overload_policy}")
+        self.overload_policy = overload_policy
+        # A rate of 0 (or no slots) disables that check
+        self.user_buckets = KeyedTokenBuckets(user_rate, user_burst, max_users, clock) if user_rate > 0 else None
+        self.global_bucket = TokenBucket(global_rate, global_burst, clock) if global_rate > 0 else None
+        self.limiter = ConcurrencyLimiter(max_in_flight, max_queue, queue_target, clock) if max_in_flight > 0 else None
+    
+    def _check_rates(self, key, cost=1):
+        if self.user_buckets is not None:
+            wait = self.user_buckets.take(key, cost)
+            if wait:
+                count_admission(SHED, 'user_rate')
+                return Decision(SHED, 'user_rate', wait)
+        if self.global_bucket is not None:
+            wait = self.global_bucket.take(cost)
+            if wait:
+                return self._overloaded('global_rate', wait)
+        return None
+    
+    def _overloaded(self, reason, retry_after=None):
+        if retry_after is None:
+            retry_after = self.limiter.queue_timeout
+        outcome = DEGRADED if self.overload_policy == 'degrade' else SHED
+        count_admission(outcome, reason)
+        return Decision(outcome, reason, retry_after)
+    
+    def admit(self, key, hold_slot=True, cost=1):
+        """Decide on a request from key (the user id); call release() with the decision afterwards
+
+        cost is the number of messages the request carries, charged to the rate limits.
+        hold_slot=False only charges the rate limits, for requests that take a slot per
+        generation with admit_slot() instead (/api/chat/batch).
+        """
+        decision = self._check_rates(key, cost)
+        if decision is not None:
+            return decision
+        if self.limiter is not None and hold_slot:
+            refusal = self.limiter.acquire()
+            if refusal:
+                return self._overloaded(refusal)
+        return ADMIT
+    
+    def admit_slot(self):
+        """Take one concurrency slot for a generation inside an admitted request; release() it afterwards
+
+        Past the queue-wait target the generation is degraded to a local answer whatever the
+        overload policy, since the request has already started answering.
+        """
+        if self.limiter is not None:
+            refusal = self.limiter.acquire()
+            if refusal:
+                count_admission(DEGRADED, refusal)
+                return Decision(DEGRADED, refusal, self.limiter.queue_timeout)
+        return ADMIT
+    
+    async def admit_async(self, key):
+        decision = self._check_rates(key)
+        if decision is not None:
+            return decision
+        if self.limiter is not None:
+            refusal = await self.limiter.acquire_async()
+            if refusal:
+                return self._overloaded(refusal)
+        return ADMIT
+    
+    def release(self, decision):
+        """Free the slot an admitted request held"""
+        if decision.outcome == ADMITTED and self.limiter is not None:
+            self.limiter.release()
+    
+    def stats(self):
+        return {
+            'overload_policy': self.overload_policy,
+            'tracked_users': len(self.user_buckets) if self.user_buckets is not None else 0,
+            'concurrency': self.limiter.stats() if self.limiter is not None else None
+        }
+
+def shed_response(decision):
+    """(status, JSON payload, Retry-After seconds) for a shed request: 429 over the user's rate, else 503"""
+    retry_after = max(1, math.ceil(decision.retry_after))
+    if decision.reason == 'user_rate':
+        return 429, {"error": "Too many requests; please slow down", "retry_after": retry_after}, retry_after
+    return 503, {"error": "The service is busy; please try again shortly", "retry_after": retry_after}, retry_after
+
+def default_max_in_flight():
+    """Concurrency cap when CHAT_MAX_IN_FLIGHT is unset: the Gemini calls a process may have in flight
+
+    Requests past GEMINI_MAX_CONCURRENCY would only queue for the client, so the async server
+    (asgi.py) is capped there; gunicorn.conf.py sets a lower cap from its thread count.
+    """
+    return int(os.getenv('GEMINI_MAX_CONCURRENCY', '100'))
+
+def create_admission_controller():
+    """Build the admission controller configured in the environment"""
+    return AdmissionController(
+        user_rate=float(os.getenv('CHAT_USER_RATE', '0')),
+        user_burst=float(os.getenv('CHAT_USER_BURST', '10')),
+        max_users=int(os.getenv('CHAT_MAX_TRACKED_USERS', '100000')),
+        global_rate=float(os.getenv('CHAT_GLOBAL_RATE', '0')),
+        global_burst=float(os.getenv('CHAT_GLOBAL_BURST', '100')),
+        max_in_flight=int(os.getenv('CHAT_MAX_IN_FLIGHT') or default_max_in_flight()),
+        max_queue=int(os.getenv('CHAT_MAX_QUEUE', '32')),
+        queue_target=float(os.getenv('CHAT_QUEUE_TARGET_MS', '500')) / 1000,
+        overload_policy=os.getenv('CHAT_OVERLOAD_POLICY', 'degrade').lower()
+    )
+
+_admission_controller = None
+_admission_lock = threading.Lock()
+
+def get_admission_controller():
+    """Return the process-wide admission controller, creating it on first use"""
+    global _admission_controller
+    if _admission_controller is None:
+        with _admission_lock:
+            if _admission_controller is None:
+                _admission_controller = create_admission_controller()
+    return _admission_controller
+
+def configure_admission_controller(controller):
+    """Replace the process-wide admission controller (e.g. for benchmarks)"""
+    global _admission_controller
+    with _admission_lock:
+        _admission_controller = controller
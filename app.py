@@ -1,76 +1,342 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, request, jsonify, render_template, g, url_for
 from flask_cors import CORS
 from diagnosis_system import MedicalDiagnosisSystem
 from openai_processor import OpenAIProcessor  # We'll keep the class name but it now uses Gemini
-from database import create_db_connection, setup_database, populate_sample_data
+from database import pool_stats, populate_sample_data
+from storage import StorageUnavailable, get_storage
+from knowledge_base import get_knowledge_base
+from interaction_writer import get_interaction_writer
+from conversation_history import get_history, get_history_cache
+from symptom_catalog import SymptomCatalog, parse_fields, render_page
+from nlp_processor import NLPProcessor, prewarm as prewarm_nlp
+from text_normalizer import get_normalizer
+from admission import DEGRADED, SHED, get_admission_controller, shed_response
+from metrics import REGISTRY, count_error, count_fallback, end_trace, finish_request, stage, stage_timing_header_enabled, start_trace
 import os
+import gc
+import asyncio
+import contextvars
+from datetime import datetime
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+ERROR_RESPONSE = "I'm sorry, I encountered an error while processing your message. Please try again."
+
 class MedicalChatbot:
-    def __init__(self, gemini_api_key=None):
+    def __init__(self, gemini_api_key=None, openai_processor=None, batch_workers=None):
         self.diagnosis_system = MedicalDiagnosisSystem()
-        self.openai_processor = OpenAIProcessor(api_key=gemini_api_key)
+        self.openai_processor = openai_processor or OpenAIProcessor(api_key=gemini_api_key)
+        # Concurrent LLM generations per batch request
+        self.batch_workers = batch_workers or int(os.getenv('BATCH_MAX_WORKERS', '8'))
     
-    def process_message(self, user_id, message):
-        """Process a user message and generate a response"""
-        try:
-            # Extract symptoms from message
+    def analyze(self, message):
+        """Run the local stages: symptom extraction and diagnosis scoring"""
+        # Extract symptoms from message
+        with stage('extract_symptoms'):
             symptoms = self.diagnosis_system.nlp_processor.extract_symptoms(message)
-            
-            # Get possible diagnoses
+        
+        # Get possible diagnoses
+        with stage('diagnosis'):
             diagnoses = self.diagnosis_system.get_possible_diagnoses(symptoms)
+        
+        return symptoms, diagnoses
+    
+    def analyze_batch(self, messages):
+        """Run the local stages for many messages in one pass; empty or non-text messages map to None"""
+        valid = [i for i, message in enumerate(messages) if isinstance(message, str) and message.strip()]
+        texts = [messages[i] for i in valid]
+        
+        with stage('extract_symptoms'):
+            symptom_lists = self.diagnosis_system.nlp_processor.extract_symptoms_batch(texts)
+        with stage('diagnosis'):
+            diagnosis_lists = self.diagnosis_system.get_possible_diagnoses_batch(symptom_lists)
+        
+        analyses = [None] * len(messages)
+        for i, symptoms, diagnoses in zip(valid, symptom_lists, diagnosis_lists):
+            analyses[i] = (symptoms, diagnoses)
+        return analyses
+    
+    def process_batch(self, user_id, messages, generate=True, admission=None, degraded=False):
+        """Process many messages, yielding one result dict per message in input order
+
+        With an admission controller every generation holds one of its slots, so a batch weighs
+        as much as the chat requests it stands for; degraded answers every message locally.
+        """
+        try:
+            analyses = self.analyze_batch(messages)
+        except Exception as e:
+            print(f"Error processing batch: {e}")
+            count_error('process_message')
+            for index in range(len(messages)):
+                yield {"index": index, "error": ERROR_RESPONSE}
+            return
+        
+        if not generate:
+            for index, analysis in enumerate(analyses):
+                yield self._batch_result(index, analysis)
+            return
+        
+        # Bound the generations in flight so finished replies never pile up behind a slow one
+        window = self.batch_workers * 2
+        with ThreadPoolExecutor(max_workers=self.batch_workers, thread_name_prefix='batch-generate') as executor:
+            in_flight = deque()
+            for index, analysis in enumerate(analyses):
+                future = None
+                if analysis is not None:
+                    # Run in a copy of the request context so worker stages land in the request's trace
+                    future = executor.submit(contextvars.copy_context().run, self._generate_and_save,
+                                             user_id, messages[index], *analysis, admission, degraded)
+                in_flight.append((index, analysis, future))
+                if len(in_flight) >= window:
+                    yield self._batch_result(*in_flight.popleft())
+            
+            while in_flight:
+                yield self._batch_result(*in_flight.popleft())
+    
+    def _generate_and_save(self, user_id, message, symptoms, diagnoses, admission=None, degraded=False):
+        """(response, degraded) for one message of a batch"""
+        slot = admission.admit_slot() if admission is not None and not degraded else None
+        try:
+            degraded = degraded or (slot is not None and slot.outcome == DEGRADED)
+            if degraded:
+                response = self._local_response(symptoms, diagnoses)
+            else:
+                response = self.openai_processor.generate_response(message, symptoms, diagnoses)
+        finally:
+            if slot is not None:
+                admission.release(slot)
+        try:
+            self._save_interaction(user_id, message, response)
+        except Exception as e:
+            print(f"Error saving interaction: {e}")
+            count_error('save_interaction')
+        return response, degraded
+    
+    def _batch_result(self, index, analysis, future=None):
+        if analysis is None:
+            return {"index": index, "error": "No message provided"}
+        
+        symptoms, diagnoses = analysis
+        result = {"index": index, "detected_symptoms": symptoms, "possible_diagnoses": diagnoses}
+        if future is not None:
+            try:
+                result["response"], degraded = future.result()
+                if degraded:
+                    result["degraded"] = True
+            except Exception as e:
+                print(f"Error generating batch response {index}: {e}")
+                count_error('process_message')
+                result["error"] = ERROR_RESPONSE
+        return result
+    
+    def process_message(self, user_id, message, degraded=False):
+        """Process a user message and generate a response (locally when degraded by admission control)"""
+        try:
+            symptoms, diagnoses = self.analyze(message)
             
             # Generate response
-            response = self.openai_processor.generate_response(message, symptoms, diagnoses)
+            if degraded:
+                response = self._local_response(symptoms, diagnoses)
+            else:
+                response = self.openai_processor.generate_response(message, symptoms, diagnoses)
             
             # Save interaction to database
             try:
                 self._save_interaction(user_id, message, response)
             except Exception as e:
                 print(f"Error saving interaction: {e}")
+                count_error('save_interaction')
             
+            return self._result(response, symptoms, diagnoses, degraded)
+        except Exception as e:
+            print(f"Error processing message: {e}")
+            count_error('process_message')
             return {
-                "response": response,
-                "detected_symptoms": symptoms,
-                "possible_diagnoses": diagnoses
+                "response": ERROR_RESPONSE,
+                "detected_symptoms": [],
+                "possible_diagnoses": []
             }
+    
+    async def process_message_async(self, user_id, message, degraded=False):
+        """Async variant of process_message for the ASGI serving mode"""
+        try:
+            # Local stages fall back to blocking database reads when no snapshot is loaded
+            symptoms, diagnoses = await asyncio.to_thread(self.analyze, message)
+            
+            # Generate response without holding a worker during the LLM round trip
+            if degraded:
+                response = self._local_response(symptoms, diagnoses)
+            else:
+                response = await self.openai_processor.generate_response_async(message, symptoms, diagnoses)
+            
+            # Save interaction to database
+            try:
+                await asyncio.to_thread(self._save_interaction, user_id, message, response)
+            except Exception as e:
+                print(f"Error saving interaction: {e}")
+                count_error('save_interaction')
+            
+            return self._result(response, symptoms, diagnoses, degraded)
         except Exception as e:
             print(f"Error processing message: {e}")
+            count_error('process_message')
             return {
-                "response": "I'm sorry, I encountered an error while processing your message. Please try again.",
+                "response": ERROR_RESPONSE,
                 "detected_symptoms": [],
                 "possible_diagnoses": []
             }
     
+    def stream_message(self, user_id, message, degraded=False):
+        """Process a user message, yielding (event, data) pairs as the response is produced"""
+        try:
+            symptoms, diagnoses = self.analyze(message)
+        except Exception as e:
+            print(f"Error processing message: {e}")
+            count_error('process_message')
+            yield "error", {"error": ERROR_RESPONSE}
+            return
+        
+        # Local results go out before the LLM starts
+        meta = {"detected_symptoms": symptoms, "possible_diagnoses": diagnoses}
+        if degraded:
+            meta["degraded"] = True
+        yield "meta", meta
+        
+        if degraded:
+            texts = self.openai_processor.stream_text(self._local_response(symptoms, diagnoses))
+        else:
+            texts = self.openai_processor.stream_response(message, symptoms, diagnoses)
+        
+        chunks = []
+        for text in texts:
+            chunks.append(text)
+            yield "token", {"text": text}
+        
+        # Save interaction to database
+        try:
+            self._save_interaction(user_id, message, ''.join(chunks))
+        except Exception as e:
+            print(f"Error saving interaction: {e}")
+            count_error('save_interaction')
+        
+        yield "done", {}
+    
+    def _local_response(self, symptoms, diagnoses):
+        """Answer without Gemini when admission control degrades a request under overload"""
+        count_fallback('overloaded')
+        return self.openai_processor._generate_fallback_response(symptoms, diagnoses)
+    
+    @staticmethod
+    def _result(response, symptoms, diagnoses, degraded):
+        result = {
+            "response": response,
+            "detected_symptoms": symptoms,
+            "possible_diagnoses": diagnoses
+        }
+        if degraded:
+            result["degraded"] = True
+        return result
+    
     def _save_interaction(self, user_id, message, response):
         """Save the interaction to the database"""
-        connection = create_db_connection()
-        if connection is None:
-            return
+        with stage('save_interaction'):
+            self._write_interaction(user_id, message, response)
+    
+    def _write_interaction(self, user_id, message, response):
+        # Recent turns are served from memory; the id is filled in once the row is written
+        turn = {'id': None, 'message': message, 'response': response,
+                'timestamp': datetime.now().replace(microsecond=0)}
+        history_cache = get_history_cache()
+        history_cache.append(user_id, turn)
         
-        cursor = connection.cursor()
-        query = "INSERT INTO user_interactions (user_id, message, response) VALUES (%s, %s, %s)"
-        cursor.execute(query, (user_id, message, response))
+        def on_written(row_id):
+            turn['id'] = row_id
+            history_cache.mark_written(user_id)
         
-        connection.commit()
-        cursor.close()
-        connection.close()
+        if os.getenv("INTERACTION_WRITE_MODE", "async").lower() != "sync":
+            # Buffered and written in batches off the request thread
+            get_interaction_writer().enqueue(user_id, message, response, timestamp=turn['timestamp'],
+                                             on_written=on_written)
+            return
+        
+        try:
+            with stage('db_query'):
+                on_written(get_storage().insert_interactions([(user_id, message, response, turn['timestamp'])])[0])
+        except StorageUnavailable:
+            return
 
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
+import json
 
 app = Flask(__name__)
-CORS(app)  # Enable CORS for all routes
+CORS(app, expose_headers=['X-Request-ID', 'Server-Timing', 'ETag', 'Link', 'X-Next-Cursor', 'Retry-After'])  # Enable CORS for all routes
+
+# Set by initialize() once shared state is loaded; /readyz answers 503 until then
+ready = False
+
+@app.before_request
+def _start_worker_threads():
+    # Background threads are started per process on first request, never in a pre-fork master
+    if ready:
+        get_knowledge_base().ensure_refreshing()
+
+@app.before_request
+def _start_request_trace():
+    g.trace, g.trace_token = start_trace(request.headers.get('X-Request-ID'), request.endpoint or 'unknown')
+
+@app.after_request
+def _finish_request_trace(response):
+    trace = g.get('trace')
+    if trace is None:
+        return response
+    
+    # Streamed bodies are still being produced here, so their breakdown covers the headers only
+    finish_request(trace, response.status_code)
+    response.headers['X-Request-ID'] = trace.request_id
+    if stage_timing_header_enabled() and trace.stages:
+        response.headers['Server-Timing'] = trace.server_timing()
+    return response
+
+@app.teardown_request
+def _end_request_trace(exc):
+    token = g.pop('trace_token', None)
+    if token is not None:
+        end_trace(token)
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """Liveness probe: the process is serving requests"""
+    return jsonify({"status": "ok"})
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    """Readiness probe: shared state has been warmed up"""
+    snapshot = get_knowledge_base().snapshot
+    return jsonify({
+        "ready": ready,
+        "knowledge_base": snapshot.version if snapshot is not None else None
+    }), 200 if ready else 503
 
 @app.route('/')
 def index():
     """Serve the main chatbot interface"""
     return render_template('index.html')
 
+def _admit(data, hold_slot=True, cost=1):
+    """Admission decision for a chat request, keyed by user id or, without one, the client address"""
+    with stage('admission'):
+        return get_admission_controller().admit(data.get('user_id') or f"addr:{request.remote_addr}", hold_slot, cost)
+
+def _shed(decision):
+    status, payload, retry_after = shed_response(decision)
+    return jsonify(payload), status, {'Retry-After': str(retry_after)}
+
 @app.route('/api/chat', methods=['POST'])
 def chat():
     """API endpoint for chatbot interactions"""
@@ -81,44 +347,376 @@ def chat():
     if not message:
         return jsonify({"error": "No message provided"}), 400
     
+    # Refuse or degrade before any work when over a rate limit or the queue-wait target
+    decision = _admit(data)
+    if decision.outcome == SHED:
+        return _shed(decision)
+    
     # Use the global chatbot instance instead of creating a new one each time
-    result = chatbot.process_message(user_id, message)
+    try:
+        result = chatbot.process_message(user_id, message, degraded=decision.outcome == DEGRADED)
+    finally:
+        get_admission_controller().release(decision)
     
     return jsonify(result)
 
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """API endpoint streaming the chatbot reply as Server-Sent Events"""
+    data = request.json
+    user_id = data.get('user_id', 'anonymous')
+    message = data.get('message', '')
+    
+    if not message:
+        return jsonify({"error": "No message provided"}), 400
+    
+    decision = _admit(data)
+    if decision.outcome == SHED:
+        return _shed(decision)
+    
+    def events():
+        for event, payload in chatbot.stream_message(user_id, message, degraded=decision.outcome == DEGRADED):
+            yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+    
+    response = Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            # Stop reverse proxies from buffering the stream
+            'X-Accel-Buffering': 'no'
+        }
+    )
+    # The slot is held until the stream ends, including when the client disconnects first
+    response.call_on_close(lambda: get_admission_controller().release(decision))
+    return response
+
+@app.route('/api/chat/batch', methods=['POST'])
+def chat_batch():
+    """API endpoint triaging a list of messages, streamed back as NDJSON in input order"""
+    data = request.json or {}
+    user_id = data.get('user_id', 'anonymous')
+    messages = data.get('messages')
+    generate = data.get('generate', True) is not False
+    
+    if not isinstance(messages, list) or not messages:
+        return jsonify({"error": "No messages provided"}), 400
+    
+    max_messages = int(os.getenv('BATCH_MAX_MESSAGES', '1000'))
+    if len(messages) > max_messages:
+        return jsonify({"error": f"At most {max_messages} messages per batch"}), 413
+    
+    # Every message is charged to the rate limits; each generation then waits for a concurrency slot of its own
+    decision = _admit(data, hold_slot=False, cost=len(messages))
+    if decision.outcome == SHED:
+        return _shed(decision)
+    
+    def lines():
+        for result in chatbot.process_batch(user_id, messages, generate=generate,
+                                            admission=get_admission_controller(),
+                                            degraded=decision.outcome == DEGRADED):
+            yield json.dumps(result) + "\n"
+    
+    return Response(
+        stream_with_context(lines()),
+        mimetype='application/x-ndjson',
+        headers={'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/history/<user_id>', methods=['GET'])
+def get_user_history(user_id):
+    """API endpoint paging through a user's past turns, newest first"""
+    if user_id == 'anonymous':
+        return jsonify({"error": "History is not kept for anonymous users"}), 400
+    
+    max_page_size = int(os.getenv('HISTORY_MAX_PAGE_SIZE', '100'))
+    try:
+        limit = min(max(int(request.args.get('limit', '20')), 1), max_page_size)
+        cursor = request.args.get('cursor')
+        before_id = int(cursor) if cursor else None
+    except ValueError:
+        return jsonify({"error": "limit and cursor must be integers"}), 400
+    
+    try:
+        turns, next_cursor, source = get_history(user_id, limit, before_id)
+    except Exception as e:
+        print(f"Error reading history: {e}")
+        count_error('history')
+        return jsonify({"error": "Database connection error"}), 500
+    
+    return jsonify({
+        "user_id": user_id,
+        "turns": [
+            {
+                "id": turn['id'],
+                "message": turn['message'],
+                "response": turn['response'],
+                "timestamp": turn['timestamp'].isoformat() if turn['timestamp'] else None
+            }
+            for turn in turns
+        ],
+        "next_cursor": str(next_cursor) if next_cursor is not None else None,
+        "source": source
+    })
+
+symptom_catalog = SymptomCatalog()
+
 @app.route('/api/symptoms', methods=['GET'])
 def get_symptoms():
     """API endpoint to get all available symptoms"""
-    connection = create_db_connection()
-    if connection is None:
-        return jsonify({"error": "Database connection error"}), 500
+    try:
+        fields = parse_fields(request.args.get('fields'))
+        cursor = request.args.get('cursor')
+        after_id = int(cursor) if cursor else None
+        limit = request.args.get('limit')
+        max_page_size = int(os.getenv('SYMPTOMS_MAX_PAGE_SIZE', '1000'))
+        # A cursor alone pages with the default size; neither returns the whole list
+        limit = min(max(int(limit), 1), max_page_size) if limit else (100 if cursor else None)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    snapshot = get_knowledge_base().snapshot
+    if snapshot is not None:
+        # Serialised and compressed once per knowledge-base version
+        page = symptom_catalog.page(snapshot.version, snapshot.symptom_rows, fields, after_id, limit)
+    else:
+        try:
+            symptoms = get_storage().fetch_symptoms()
+        except StorageUnavailable:
+            return jsonify({"error": "Database connection error"}), 500
+        page = render_page(symptoms, fields, after_id, limit)
+    
+    headers = {
+        'ETag': f'W/"{page.etag}"',
+        'Cache-Control': f"public, max-age={int(os.getenv('SYMPTOMS_CACHE_MAX_AGE', '300'))}",
+        'Vary': 'Accept-Encoding'
+    }
+    if page.next_cursor is not None:
+        headers['X-Next-Cursor'] = str(page.next_cursor)
+        next_args = {**request.args.to_dict(), 'cursor': page.next_cursor, 'limit': limit}
+        headers['Link'] = f'<{url_for("get_symptoms", **next_args)}>; rel="next"'
+    
+    if request.if_none_match.contains_weak(page.etag):
+        return Response(status=304, headers=headers)
+    
+    encoding, body = page.negotiate(request.headers.get('Accept-Encoding'))
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    return Response(body, mimetype='application/json', headers=headers)
+
+def _admin_denied():
+    """Reject admin calls without the configured ADMIN_TOKEN (open when no token is set)"""
+    admin_token = os.getenv("ADMIN_TOKEN")
+    if not admin_token:
+        return None
+    # Prometheus scrapers authenticate with a bearer token rather than a custom header
+    bearer = request.headers.get("Authorization", "")
+    if request.headers.get("X-Admin-Token") != admin_token and bearer != f"Bearer {admin_token}":
+        return jsonify({"error": "Forbidden"}), 403
+    return None
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Stage latency histograms, error counters and component gauges in Prometheus text format"""
+    denied = _admin_denied()
+    if denied:
+        return denied
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+def _component_metrics():
+    """Gauges and counters read from the pool, write-behind queue and response cache at scrape time"""
+    pool = pool_stats()
+    yield 'chatbot_db_pool_connections', 'gauge', 'Pooled MySQL connections by state', [
+        ({'state': 'in_use'}, pool['in_use']),
+        ({'state': 'idle'}, pool['idle'])
+    ]
+    yield 'chatbot_db_pool_timeouts_total', 'counter', 'Checkouts that timed out waiting for a connection', [
+        ({}, pool['timeouts'])
+    ]
+    
+    writer = get_interaction_writer().stats()
+    yield 'chatbot_interaction_queue_depth', 'gauge', 'Interactions waiting to be written', [
+        ({}, writer['queue_depth'])
+    ]
+    yield 'chatbot_interactions_total', 'counter', 'Interactions by write outcome', [
+        ({'outcome': outcome}, writer[outcome]) for outcome in ('written', 'dropped', 'spilled', 'replayed')
+    ]
+    
+    chatbot_instance = globals().get('chatbot')
+    response_cache = chatbot_instance.openai_processor.response_cache if chatbot_instance else None
+    if response_cache is not None:
+        cache = response_cache.stats()
+        yield 'chatbot_response_cache_lookups_total', 'counter', 'Response cache lookups by result', [
+            ({'result': 'hit'}, cache['hits']),
+            ({'result': 'miss'}, cache['misses'])
+        ]
+    
+    normalizer = get_normalizer()
+    if normalizer is not None:
+        lemmas = normalizer.stats()
+        yield 'chatbot_lemma_cache_lookups_total', 'counter', 'Symptom-extraction lemma cache lookups by result', [
+            ({'result': 'hit'}, lemmas['hits']),
+            ({'result': 'miss'}, lemmas['misses'])
+        ]
+        yield 'chatbot_lemma_cache_entries', 'gauge', 'Tokens with a cached lemma', [
+            ({}, lemmas['size'])
+        ]
     
-    cursor = connection.cursor(dictionary=True)
-    cursor.execute("SELECT id, name, description FROM symptoms")
-    symptoms = cursor.fetchall()
+    if chatbot_instance is not None:
+        breaker = chatbot_instance.openai_processor.breaker.stats()
+        yield 'chatbot_llm_circuit_open', 'gauge', 'Whether the Gemini circuit breaker is open (1) or half-open/closed (0)', [
+            ({}, 1 if breaker['state'] == 'open' else 0)
+        ]
+        yield 'chatbot_llm_circuit_rejected_total', 'counter', 'Gemini calls skipped because the circuit was open', [
+            ({}, breaker['rejected'])
+        ]
+
+    concurrency = get_admission_controller().stats()['concurrency']
+    if concurrency is not None:
+        yield 'chatbot_admission_requests', 'gauge', 'Chat requests holding or waiting for a generation slot', [
+            ({'state': 'in_flight'}, concurrency['in_flight']),
+            ({'state': 'waiting'}, concurrency['waiting'])
+        ]
+
+REGISTRY.add_collector(_component_metrics)
+
+@app.route('/api/admin/pool', methods=['GET'])
+def get_pool_stats():
+    """API endpoint exposing database connection pool usage"""
+    denied = _admin_denied()
+    if denied:
+        return denied
+    return jsonify(pool_stats())
+
+@app.route('/api/admin/response-cache', methods=['GET'])
+def get_response_cache_stats():
+    """API endpoint exposing LLM response cache hit/miss counters"""
+    denied = _admin_denied()
+    if denied:
+        return denied
     
-    cursor.close()
-    connection.close()
+    response_cache = chatbot.openai_processor.response_cache
+    if response_cache is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **response_cache.stats()})
+
+@app.route('/api/admin/llm', methods=['GET'])
+def get_llm_status():
+    """API endpoint describing the Gemini client's resilience settings and circuit breaker"""
+    denied = _admin_denied()
+    if denied:
+        return denied
+    
+    processor = chatbot.openai_processor
+    return jsonify({
+        "timeout": processor.timeout,
+        "max_retries": processor.max_retries,
+        "hedge_delay": processor.hedge_delay,
+        "circuit_breaker": processor.breaker.stats()
+    })
+
+@app.route('/api/admin/admission', methods=['GET'])
+def get_admission_stats():
+    """API endpoint exposing chat admission control limits and slot usage"""
+    denied = _admin_denied()
+    if denied:
+        return denied
+    return jsonify(get_admission_controller().stats())
+
+@app.route('/api/admin/history-cache', methods=['GET'])
+def get_history_cache_stats():
+    """API endpoint exposing recent-turns cache occupancy and hit rate"""
+    denied = _admin_denied()
+    if denied:
+        return denied
+    return jsonify(get_history_cache().stats())
+
+@app.route('/api/admin/interaction-writer', methods=['GET'])
+def get_interaction_writer_stats():
+    """API endpoint exposing the interaction write-behind queue depth and flush latency"""
+    denied = _admin_denied()
+    if denied:
+        return denied
+    return jsonify(get_interaction_writer().stats())
+
+@app.route('/api/admin/knowledge-base', methods=['GET'])
+def get_knowledge_base_status():
+    """API endpoint describing the loaded knowledge-base snapshot"""
+    denied = _admin_denied()
+    if denied:
+        return denied
+    
+    snapshot = get_knowledge_base().snapshot
+    if snapshot is None:
+        return jsonify({"loaded": False})
+    return jsonify({"loaded": True, **snapshot.summary()})
+
+@app.route('/api/admin/knowledge-base/reload', methods=['POST'])
+def reload_knowledge_base():
+    """API endpoint forcing a knowledge-base reload after the tables were edited"""
+    denied = _admin_denied()
+    if denied:
+        return denied
     
-    return jsonify(symptoms)
+    knowledge_base = get_knowledge_base()
+    force = request.args.get('force', 'true').lower() != 'false'
+    reloaded = knowledge_base.refresh(force=force)
+    snapshot = knowledge_base.snapshot
+    if snapshot is None:
+        return jsonify({"error": "Knowledge base could not be loaded"}), 503
+    return jsonify({"reloaded": reloaded, **snapshot.summary()})
 
 # Part 7: Setup and Run
-def main():
-    """Main function to set up and run the application"""
-    print("Setting up medical chatbot system...")
+def warm_up():
+    """Load what every worker shares; starts no threads and leaves no connection open, so it can run before fork"""
+    # Load NLTK corpora now so missing data fails at startup, not on the first request
+    prewarm_nlp()
     
-    # Set up database
-    setup_database()
+    # Knowledge-base snapshot with its scoring matrices, then the symptom automaton and fuzzy index
+    knowledge_base = get_knowledge_base()
+    if knowledge_base.snapshot is None:
+        knowledge_base.refresh(force=True)
+    NLPProcessor().current_matcher()
     
-    # Populate with sample data
-    populate_sample_data()
+    # Forked workers must open their own connections
+    get_storage().dispose()
+
+def initialize():
+    """Warm up shared state and create the global chatbot (schema setup is not included)"""
+    warm_up()
     
     # Get API key from environment
     gemini_api_key = os.getenv("GEMINI_API_KEY")
     
     # Create a global chatbot instance with the API key
-    global chatbot
+    global chatbot, ready
     chatbot = MedicalChatbot(gemini_api_key=gemini_api_key)
+    ready = True
+    return chatbot
+
+def create_app():
+    """Return the WSGI app with shared state loaded, for wsgi.py and multi-worker servers
+
+    Schema migrations are not run here; apply them once per deploy with `python migrations.py`.
+    """
+    if not ready:
+        initialize()
+        # Keep the collector from writing to (and so copying) the warmed-up objects in forked workers
+        gc.freeze()
+    return app
+
+def main():
+    """Main function to set up and run the application"""
+    print("Setting up medical chatbot system...")
+    
+    # Set up database (MySQL, or the SQLite file with STORAGE_BACKEND=sqlite)
+    get_storage().setup()
+    
+    # Populate with sample data
+    populate_sample_data()
+    
+    initialize()
+    get_knowledge_base().start()
     
     # Run Flask app
     print("Starting web server...")
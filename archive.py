@@ -0,0 +1,323 @@
+import os
+import json
+import gzip
+import zlib
+import heapq
+import shutil
+import hashlib
+import threading
+from datetime import datetime
+from functools import lru_cache
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Rows per gzip member of a shard file; a history read decompresses only the blocks holding the user's rows
+BLOCK_ROWS = 256
+
+# Bloom filter of the user ids in each block: 10 bits per row for ~1% false positives
+BLOCK_BLOOM_BITS = BLOCK_ROWS * 10
+BLOOM_HASHES = 7
+
+def shard_of(user_id, shards):
+    """Stable shard number of a user id"""
+    digest = hashlib.blake2b(str(user_id).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % shards
+
+def _bloom_positions(user_id, bits, hashes):
+    digest = hashlib.blake2b(str(user_id).encode('utf-8'), digest_size=16, person=b'bloom').digest()
+    first, second = int.from_bytes(digest[:8], 'big'), int.from_bytes(digest[8:], 'big') | 1
+    return [(first + i * second) % bits for i in range(hashes)]
+
+def _fsync_write(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+class _ShardFile:
+    """One shard being written: a gzip member per block of BLOCK_ROWS rows
+
+    As each block ends, its offset and a Bloom filter of its user ids are appended to the
+    shard's index file, so only the block being written is held in memory.
+    """
+    __slots__ = ('file', 'index', 'compressor', 'block_rows', 'offset', 'bloom')
+    
+    def __init__(self, path, index_path):
+        self.file = open(path, 'wb')
+        self.index = open(index_path, 'wb')
+        self.compressor = None
+        self.block_rows = 0
+        self.offset = 0
+        self.bloom = None
+    
+    def write(self, user_id, line):
+        if self.compressor is None:
+            self.offset = self.file.tell()
+            self.compressor = zlib.compressobj(wbits=31)
+            self.bloom = bytearray(BLOCK_BLOOM_BITS // 8)
+        self.file.write(self.compressor.compress(line.encode('utf-8')))
+        for position in _bloom_positions(user_id, BLOCK_BLOOM_BITS, BLOOM_HASHES):
+            self.bloom[position >> 3] |= 1 << (position & 7)
+        self.block_rows += 1
+        if self.block_rows >= BLOCK_ROWS:
+            self.end_block()
+    
+    def end_block(self):
+        if self.compressor is not None:
+            self.file.write(self.compressor.flush())
+            self.index.write(self.offset.to_bytes(8, 'big') + bytes(self.bloom))
+            self.compressor = None
+            self.block_rows = 0
+    
+    def close(self, sync=False):
+        self.end_block()
+        for f in (self.file, self.index):
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+            f.close()
+
+class ArchiveBatchWriter:
+    """Writes one export of a month as user-sharded JSONL.gz files plus a manifest
+
+    Files go to a hidden directory that is renamed into place by commit(), so
+    readers only ever see complete batches. Memory is one compressor and one
+    block's Bloom filter per shard, however many rows are written.
+    """
+    
+    def __init__(self, archive, month, source):
+        self.archive = archive
+        self.month = month
+        self.source = source
+        self.batch = datetime.now().strftime('%Y%m%dT%H%M%S%f')
+        self.directory = os.path.join(archive.directory, month, '.tmp-' + self.batch)
+        os.makedirs(self.directory)
+        
+        self._streams = {}
+        self.rows = 0
+        self.min_id = None
+        self.max_id = None
+    
+    def write(self, row):
+        """Append one (id, user_id, message, response, timestamp) row; rows arrive in id order per shard"""
+        row_id, user_id, message, response, timestamp = row
+        shard = shard_of(user_id, self.archive.shards)
+        stream = self._streams.get(shard)
+        if stream is None:
+            stream = self._streams[shard] = _ShardFile(os.path.join(self.directory, f"shard-{shard:03d}.jsonl.gz"),
+                                                       os.path.join(self.directory, f"shard-{shard:03d}.idx"))
+        stream.write(user_id, json.dumps({
+            'id': row_id,
+            'user_id': user_id,
+            'message': message,
+            'response': response,
+            'timestamp': timestamp.isoformat(' ') if timestamp else None
+        }) + '\n')
+        
+        self.rows += 1
+        self.min_id = row_id if self.min_id is None else min(self.min_id, row_id)
+        self.max_id = row_id if self.max_id is None else max(self.max_id, row_id)
+    
+    def commit(self):
+        """Flush every file to disk and publish the batch; returns its manifest"""
+        for stream in self._streams.values():
+            stream.close(sync=True)
+        
+        manifest = {
+            'month': self.month,
+            'source': self.source,
+            'rows': self.rows,
+            'min_id': self.min_id,
+            'max_id': self.max_id,
+            'shards': self.archive.shards,
+            'block_rows': BLOCK_ROWS,
+            'block_bloom_bits': BLOCK_BLOOM_BITS,
+            'bloom_hashes': BLOOM_HASHES,
+            'created_at': datetime.now().replace(microsecond=0).isoformat(' ')
+        }
+        _fsync_write(os.path.join(self.directory, 'manifest.json'), json.dumps(manifest, indent=2).encode('utf-8'))
+        os.replace(self.directory, os.path.join(self.archive.directory, self.month, self.batch))
+        return manifest
+    
+    def abort(self):
+        for stream in self._streams.values():
+            stream.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is not None:
+            self.abort()
+        return False
+
+def _parse_row(line):
+    row = json.loads(line)
+    if row['timestamp']:
+        row['timestamp'] = datetime.fromisoformat(row['timestamp'])
+    return row
+
+class InteractionArchive:
+    """user_interactions rows exported by retention.py: <directory>/<YYYY-MM>/<batch>/shard-NNN.jsonl.gz
+
+    Each batch holds one export of a month, split into shards by user id. Every shard
+    has an index with a Bloom filter of the users in each of its gzip members, so a
+    history read decompresses only the members that may hold the user's rows.
+    """
+    
+    def __init__(self, directory, shards=16):
+        self.directory = directory
+        self.shards = shards
+        self._manifests = {}
+        self._lock = threading.Lock()
+    
+    def writer(self, month, source):
+        """ArchiveBatchWriter for a new batch of month ('YYYY-MM') exported from source"""
+        return ArchiveBatchWriter(self, month, source)
+    
+    def months(self):
+        """Archived months, oldest first"""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(name for name in names if len(name) == 7 and name[4] == '-')
+    
+    def batches(self, month):
+        """(path, manifest) of the month's committed batches, oldest id range first"""
+        month_directory = os.path.join(self.directory, month)
+        try:
+            names = sorted(name for name in os.listdir(month_directory) if not name.startswith('.'))
+        except FileNotFoundError:
+            return []
+        
+        batches = []
+        for name in names:
+            path = os.path.join(month_directory, name)
+            manifest = self._manifest(path)
+            if manifest is not None:
+                batches.append((path, manifest))
+        return sorted(batches, key=lambda batch: batch[1]['min_id'] or 0)
+    
+    def _manifest(self, path):
+        # Committed batches never change, so their manifests are read once
+        with self._lock:
+            if path in self._manifests:
+                return self._manifests[path]
+        try:
+            with open(os.path.join(path, 'manifest.json'), encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        with self._lock:
+            self._manifests[path] = manifest
+        return manifest
+    
+    def archived_through(self, month, source):
+        """Highest id already archived for month from source, or None"""
+        ids = [manifest['max_id'] for _, manifest in self.batches(month)
+               if manifest['source'] == source and manifest['max_id'] is not None]
+        return max(ids) if ids else None
+    
+    def archived_rows(self, month, source):
+        """Rows archived for month from source, over every batch"""
+        return sum(manifest['rows'] for _, manifest in self.batches(month) if manifest['source'] == source)
+    
+    def _read_shard(self, path, shard):
+        shard_path = os.path.join(path, f"shard-{shard:03d}.jsonl.gz")
+        if not os.path.exists(shard_path):
+            return
+        with gzip.open(shard_path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                yield _parse_row(line)
+    
+    def _user_rows(self, path, manifest, shard, user_id):
+        """A user's rows in one shard of a batch, newest first, decompressing only the blocks whose filter has the user"""
+        shard_path = os.path.join(path, f"shard-{shard:03d}.jsonl.gz")
+        index = _read_index(os.path.join(path, f"shard-{shard:03d}.idx")) if 'block_bloom_bits' in manifest else None
+        if index is None:
+            # Batches written without block filters are read whole
+            rows = [row for row in self._read_shard(path, shard) if row['user_id'] == user_id]
+            yield from reversed(rows)
+            return
+        
+        bits = manifest['block_bloom_bits']
+        record = 8 + bits // 8
+        offsets = [int.from_bytes(index[start:start + 8], 'big') for start in range(0, len(index), record)]
+        positions = _bloom_positions(user_id, bits, manifest['bloom_hashes'])
+        # Other users' lines in a block are skipped without parsing them
+        marker = f'"user_id": {json.dumps(user_id)},'
+        with open(shard_path, 'rb') as f:
+            for block in reversed(range(len(offsets))):
+                bloom = index[block * record + 8:(block + 1) * record]
+                if not all(bloom[position >> 3] & (1 << (position & 7)) for position in positions):
+                    continue
+                f.seek(offsets[block])
+                data = f.read(offsets[block + 1] - offsets[block]) if block + 1 < len(offsets) else f.read()
+                for line in reversed(zlib.decompress(data, wbits=31).decode('utf-8').splitlines()):
+                    if marker in line:
+                        row = _parse_row(line)
+                        if row['user_id'] == user_id:
+                            yield row
+    
+    def fetch_turns(self, user_id, limit, before_id=None):
+        """Newest-first archived turns (dicts, like Storage.fetch_turns) older than before_id"""
+        turns = []
+        for month in reversed(self.months()):
+            candidates = []
+            for path, manifest in self.batches(month):
+                if not manifest['rows'] or (before_id is not None and manifest['min_id'] >= before_id):
+                    continue
+                shard = shard_of(user_id, manifest['shards'])
+                taken = 0
+                for row in self._user_rows(path, manifest, shard, user_id):
+                    if before_id is None or row['id'] < before_id:
+                        candidates.append({column: row[column] for column in ('id', 'message', 'response', 'timestamp')})
+                        taken += 1
+                        # Rows come newest first, so older ones of this batch cannot make the page
+                        if taken >= limit:
+                            break
+            
+            candidates.sort(key=lambda turn: turn['id'], reverse=True)
+            turns.extend(candidates[:limit - len(turns)])
+            if len(turns) >= limit:
+                break
+        return turns
+    
+    def stream_messages(self, after_id=0):
+        """Yield archived (id, message) rows with id > after_id, month by month in id order"""
+        for month in self.months():
+            for path, manifest in self.batches(month):
+                if not manifest['rows'] or manifest['max_id'] <= after_id:
+                    continue
+                # Shards are each in id order; merge them holding one row per shard
+                shards = [self._read_shard(path, shard) for shard in range(manifest['shards'])]
+                for row in heapq.merge(*shards, key=lambda row: row['id']):
+                    if row['id'] > after_id:
+                        yield row['id'], row['message']
+
+@lru_cache(maxsize=64)
+def _read_index(path):
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+_archive = None
+_archive_lock = threading.Lock()
+
+def get_archive():
+    """The process-wide archive from INTERACTION_ARCHIVE_DIR, or None when archiving is not configured"""
+    global _archive
+    directory = os.getenv('INTERACTION_ARCHIVE_DIR', '')
+    if not directory:
+        return None
+    if _archive is None:
+        with _archive_lock:
+            if _archive is None:
+                _archive = InteractionArchive(directory, shards=int(os.getenv('INTERACTION_ARCHIVE_SHARDS', '16')))
+    return _archive
@@ -0,0 +1,125 @@
+"""ASGI entry point: async /api/chat, every other route served by the Flask app.
+
+Run with an ASGI server, for example:
+
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+
+In this mode Gemini calls go through the async client behind the
+GEMINI_MAX_CONCURRENCY limit and the GEMINI_TIMEOUT deadline, so one
+process keeps many conversations in flight instead of one per worker.
+"""
+import json
+import asyncio
+from asgiref.wsgi import WsgiToAsgi
+import app as flask_app
+from admission import DEGRADED, SHED, get_admission_controller, shed_response
+from metrics import end_trace, finish_request, stage, stage_timing_header_enabled, start_trace
+
+# Requests larger than this are rejected before being parsed
+MAX_BODY_BYTES = 1024 * 1024
+
+wsgi_application = WsgiToAsgi(flask_app.app)
+
+async def application(scope, receive, send):
+    """ASGI callable dispatching /api/chat natively and the rest to Flask"""
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+    elif scope['type'] == 'http' and scope['path'] == '/api/chat' and scope['method'] == 'POST':
+        await chat(scope, receive, send)
+    else:
+        await wsgi_application(scope, receive, send)
+
+async def chat(scope, receive, send):
+    """Async counterpart of app.chat()"""
+    request_id = dict(scope.get('headers') or []).get(b'x-request-id', b'').decode('latin-1')
+    trace, token = start_trace(request_id or None, 'chat')
+    try:
+        status, payload, headers = await _chat(scope, receive)
+    finally:
+        end_trace(token)
+    
+    finish_request(trace, status)
+    headers.append((b'x-request-id', trace.request_id.encode('ascii')))
+    if stage_timing_header_enabled() and trace.stages:
+        headers.append((b'server-timing', trace.server_timing().encode('ascii')))
+    await _send_json(send, status, payload, headers)
+
+async def _chat(scope, receive):
+    body = await _read_body(receive)
+    if body is None:
+        return 413, {"error": "Request body too large"}, []
+    
+    try:
+        data = json.loads(body or b'{}')
+    except ValueError:
+        return 400, {"error": "Invalid JSON"}, []
+    
+    user_id = data.get('user_id', 'anonymous')
+    message = data.get('message', '')
+    
+    if not message:
+        return 400, {"error": "No message provided"}, []
+    
+    # Waiting for a slot suspends this request without holding a thread
+    admission = get_admission_controller()
+    client = scope.get('client') or ('unknown',)
+    with stage('admission'):
+        decision = await admission.admit_async(data.get('user_id') or f"addr:{client[0]}")
+    if decision.outcome == SHED:
+        status, payload, retry_after = shed_response(decision)
+        return status, payload, [(b'retry-after', str(retry_after).encode('ascii'))]
+    
+    # Stages run in worker threads via asyncio.to_thread, which copies the trace context
+    try:
+        result = await flask_app.chatbot.process_message_async(user_id, message,
+                                                               degraded=decision.outcome == DEGRADED)
+    finally:
+        admission.release(decision)
+    return 200, result, []
+
+async def _lifespan(receive, send):
+    while True:
+        event = await receive()
+        if event['type'] == 'lifespan.startup':
+            try:
+                flask_app.initialize()
+                flask_app.get_knowledge_base().ensure_refreshing()
+            except Exception as e:
+                await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                return
+            await send({'type': 'lifespan.startup.complete'})
+        elif event['type'] == 'lifespan.shutdown':
+            flask_app.get_knowledge_base().stop()
+            # Flush buffered interactions before the process exits
+            await asyncio.to_thread(flask_app.get_interaction_writer().stop)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def _read_body(receive):
+    chunks = []
+    size = 0
+    while True:
+        event = await receive()
+        chunk = event.get('body', b'')
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            return None
+        chunks.append(chunk)
+        if not event.get('more_body', False):
+            return b''.join(chunks)
+
+async def _send_json(send, status, payload, extra_headers=()):
+    body = json.dumps(payload).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode('ascii')),
+            # Matches flask_cors' default for the WSGI routes
+            (b'access-control-allow-origin', b'*'),
+            (b'access-control-expose-headers', b'X-Request-ID, Server-Timing, Retry-After'),
+            *extra_headers
+        ]
+    })
+    await send({'type': 'http.response.body', 'body': body})
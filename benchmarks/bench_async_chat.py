@@ -0,0 +1,93 @@
+"""Drive the ASGI /api/chat endpoint with many concurrent requests against a stubbed Gemini.
+
+The ASGI application is called in-process, so no server or network is
+involved; database writes go to a no-op connection. Run from the
+repository root:
+
+    python -m benchmarks.bench_async_chat --requests 500 --latency 0.2
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+
+async def call_chat(application, message, user_id):
+    """Send one POST /api/chat through the ASGI callable; returns (status, payload)"""
+    body = json.dumps({"user_id": user_id, "message": message}).encode('utf-8')
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': 'POST', 'path': '/api/chat', 'raw_path': b'/api/chat',
+        'query_string': b'', 'headers': [(b'content-type', b'application/json')],
+        'client': ('127.0.0.1', 0), 'server': ('127.0.0.1', 5000), 'scheme': 'http'
+    }
+    received = False
+    
+    async def receive():
+        nonlocal received
+        if received:
+            await asyncio.sleep(3600)
+        received = True
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+    
+    response = {}
+    
+    async def send(event):
+        if event['type'] == 'http.response.start':
+            response['status'] = event['status']
+        elif event['type'] == 'http.response.body':
+            response['body'] = response.get('body', b'') + event.get('body', b'')
+    
+    await application(scope, receive, send)
+    return response['status'], json.loads(response['body'])
+
+async def run(requests, concurrency_limit, latency, timeout):
+    os.environ["GEMINI_MAX_CONCURRENCY"] = str(concurrency_limit)
+    os.environ["GEMINI_TIMEOUT"] = str(timeout)
+    
+    import app as flask_app
+    import asgi
+    from admission import AdmissionController, configure_admission_controller
+    from database import ConnectionPool, configure_pool
+    from openai_processor import OpenAIProcessor
+    from benchmarks.stubs import FakeGeminiModel, NullConnection
+    
+    configure_pool(ConnectionPool(NullConnection, size=8, max_overflow=0))
+    model = FakeGeminiModel(latency=latency)
+    processor = OpenAIProcessor(api_key="stub", model_factory=lambda: model)
+    flask_app.chatbot = flask_app.MedicalChatbot(openai_processor=processor)
+    # Measures the handler itself, so nothing is shed or degraded
+    configure_admission_controller(AdmissionController(user_rate=0, max_in_flight=0))
+    
+    latencies = []
+    
+    async def one(i):
+        start = time.perf_counter()
+        status, payload = await call_chat(asgi.application, "I have a fever and a cough", f"user-{i}")
+        latencies.append(time.perf_counter() - start)
+        return status == 200 and payload["response"] == model.text
+    
+    start = time.perf_counter()
+    results = await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+    
+    latencies.sort()
+    print(f"requests={requests} llm_latency={latency}s concurrency_limit={concurrency_limit}")
+    print(f"completed={sum(results)} failed={requests - sum(results)} llm_calls={model.calls}")
+    print(f"wall={elapsed:.2f}s throughput={requests / elapsed:.1f} req/s")
+    print(f"p50={statistics.median(latencies) * 1000:.0f}ms "
+          f"p99={latencies[int(len(latencies) * 0.99) - 1] * 1000:.0f}ms")
+    print(f"sync worker equivalent: {1 / latency:.1f} req/s per worker")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency-limit", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.2, help="Stubbed Gemini latency in seconds")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    args = parser.parse_args()
+    asyncio.run(run(args.requests, args.concurrency_limit, args.latency, args.timeout))
+
+if __name__ == "__main__":
+    main()
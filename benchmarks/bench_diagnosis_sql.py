@@ -0,0 +1,179 @@
+"""Compare the legacy and set-based diagnosis SQL on a seeded MySQL database.
+
+Seeds a throwaway database (MYSQL_BENCH_DATABASE, default
+medical_chatbot_bench) with synthetic diseases and relationships, applies
+the schema migrations and times both query shapes. Run from the
+repository root against a MySQL server configured through the usual
+MYSQL_* variables:
+
+    python -m benchmarks.bench_diagnosis_sql --diseases 10000 --relationships 100000
+    python -m benchmarks.bench_diagnosis_sql --explain
+
+The plan of the set-based query is checked before timing: the run exits
+non-zero if any base table (symptoms_diseases above all) is read with a
+full scan. --explain prints the plan and stops after that check.
+benchmarks/check_query_plans.py runs the same check without timing.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+import mysql.connector
+from dotenv import load_dotenv
+from migrations import apply_migrations
+from schema import create_table_statements
+from storage import diagnosis_query
+
+load_dotenv()
+
+BASE_TABLES = ("symptoms", "diseases", "symptoms_diseases")
+
+def connect(database=None):
+    params = {
+        'host': os.getenv('MYSQL_HOST', 'localhost'),
+        'user': os.getenv('MYSQL_USER', 'root'),
+        'password': os.getenv('MYSQL_PASSWORD', '')
+    }
+    if database:
+        params['database'] = database
+    return mysql.connector.connect(**params)
+
+def seed(database, symptom_count, disease_count, relationship_count, seed_value):
+    """Recreate the bench database and fill it with random relationships"""
+    server = connect()
+    cursor = server.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS `{database}`")
+    cursor.execute(f"CREATE DATABASE `{database}`")
+    cursor.close()
+    server.close()
+
+    connection = connect(database)
+    cursor = connection.cursor()
+    for statement in create_table_statements('mysql'):
+        cursor.execute(statement)
+
+    rng = random.Random(seed_value)
+    cursor.executemany("INSERT INTO symptoms (name, description) VALUES (%s, %s)",
+                       [(f"symptom {i}", "synthetic") for i in range(symptom_count)])
+    cursor.executemany("INSERT INTO diseases (name, description, treatment) VALUES (%s, %s, %s)",
+                       [(f"disease {i}", "synthetic", "synthetic") for i in range(disease_count)])
+
+    pairs = set()
+    while len(pairs) < relationship_count:
+        pairs.add((rng.randint(1, symptom_count), rng.randint(1, disease_count)))
+    rows = [(symptom_id, disease_id, round(rng.uniform(0.1, 0.9), 2)) for symptom_id, disease_id in pairs]
+    for start in range(0, len(rows), 5000):
+        cursor.executemany(
+            "INSERT INTO symptoms_diseases (symptom_id, disease_id, correlation_strength) VALUES (%s, %s, %s)",
+            rows[start:start + 5000]
+        )
+    connection.commit()
+    cursor.close()
+
+    apply_migrations(connection)
+    cursor = connection.cursor()
+    for table in BASE_TABLES:
+        cursor.execute(f"ANALYZE TABLE {table}")
+        cursor.fetchall()
+    cursor.close()
+    return connection
+
+def legacy_query(cursor, symptoms):
+    """The per-symptom lookups and correlated subquery the set-based query replaced"""
+    symptom_ids = []
+    for symptom in symptoms:
+        cursor.execute("SELECT id FROM symptoms WHERE name = %s", (symptom,))
+        result = cursor.fetchone()
+        if result:
+            symptom_ids.append(result[0])
+    if not symptom_ids:
+        return []
+
+    placeholders = ','.join(['%s'] * len(symptom_ids))
+    cursor.execute(f"""
+    SELECT d.id, d.name, d.description, d.treatment,
+           SUM(sd.correlation_strength) as total_correlation,
+           COUNT(sd.symptom_id) as matching_symptoms,
+           (SELECT COUNT(*) FROM symptoms_diseases WHERE disease_id = d.id) as total_symptoms
+    FROM diseases d
+    JOIN symptoms_diseases sd ON d.id = sd.disease_id
+    WHERE sd.symptom_id IN ({placeholders})
+    GROUP BY d.id
+    ORDER BY total_correlation DESC, matching_symptoms DESC
+    """, tuple(symptom_ids))
+    return cursor.fetchall()
+
+def set_based_query(cursor, symptoms, top_k):
+    cursor.execute(*diagnosis_query(symptoms, top_k))
+    return cursor.fetchall()
+
+def explain(connection, symptoms, top_k):
+    """Print the set-based plan; returns the base tables read with a full scan"""
+    query, params = diagnosis_query(symptoms, top_k)
+    cursor = connection.cursor(dictionary=True)
+    cursor.execute("EXPLAIN " + query, params)
+    plan = cursor.fetchall()
+    cursor.close()
+
+    full_scans = []
+    print(f"{'table':<20} {'type':<8} {'key':<36} {'rows':>8}")
+    for row in plan:
+        print(f"{row['table'] or '':<20} {row['type'] or '':<8} {row['key'] or '':<36} {row['rows'] or 0:>8}")
+        if row['type'] == 'ALL' and row['table'] in BASE_TABLES + ('s', 'sd', 'd'):
+            full_scans.append(row['table'])
+    return full_scans
+
+def time_query(function, cursor, workload, *args):
+    samples = []
+    for symptoms in workload:
+        start = time.perf_counter()
+        function(cursor, symptoms, *args)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database", default=os.getenv('MYSQL_BENCH_DATABASE', 'medical_chatbot_bench'))
+    parser.add_argument("--symptoms", type=int, default=2000)
+    parser.add_argument("--diseases", type=int, default=10000)
+    parser.add_argument("--relationships", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--symptoms-per-query", type=int, default=4)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--explain", action="store_true", help="Only check the query plan, without timing")
+    args = parser.parse_args()
+
+    connection = seed(args.database, args.symptoms, args.diseases, args.relationships, args.seed)
+    rng = random.Random(args.seed)
+    workload = [
+        [f"symptom {rng.randrange(args.symptoms)}" for _ in range(args.symptoms_per_query)]
+        for _ in range(args.queries)
+    ]
+
+    try:
+        # A dropped or bypassed index fails the benchmark instead of just slowing it down
+        full_scans = explain(connection, workload[0], args.top_k)
+        if full_scans:
+            print(f"FAIL: full table scan on {', '.join(full_scans)}")
+            return 1
+        print("OK: every base table is read through an index")
+        if args.explain:
+            return 0
+
+        cursor = connection.cursor()
+        print(f"{args.diseases} diseases, {args.relationships} relationships, {args.queries} queries")
+        print(f"{'query':<12} {'median ms':>10} {'p95 ms':>8}")
+        for label, function, extra in (("legacy", legacy_query, ()), ("set-based", set_based_query, (args.top_k,))):
+            samples = sorted(time_query(function, cursor, workload, *extra))
+            p95 = samples[int(len(samples) * 0.95) - 1]
+            print(f"{label:<12} {statistics.median(samples) * 1000:>10.2f} {p95 * 1000:>8.2f}")
+        cursor.close()
+    finally:
+        connection.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""Measure typo lookups in the fuzzy symptom index as the vocabulary grows.
+
+Each vocabulary size gets random misspellings (one or two edits) of its
+words plus unrelated tokens, and reports the index build time, the
+per-token lookup cost and how often the intended word came back. The
+naive per-token edit-distance scan is timed alongside it for comparison
+(skipped above --naive-limit words). Run from the repository root:
+
+    python -m benchmarks.bench_fuzzy_index
+    python -m benchmarks.bench_fuzzy_index --sizes 1000 100000 --max-distance 1
+"""
+import argparse
+import random
+import string
+import sys
+import timeit
+from fuzzy_index import FuzzyIndex, edit_distance
+
+def synthetic_words(count, rng):
+    """Distinct pseudo-words of five to twelve letters"""
+    words = set()
+    while len(words) < count:
+        words.add(''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(5, 12))))
+    return sorted(words)
+
+def misspell(word, edits, rng):
+    """Apply random deletions, insertions, substitutions or adjacent transpositions"""
+    for _ in range(edits):
+        i = rng.randrange(len(word))
+        kind = rng.choice(('delete', 'insert', 'substitute', 'transpose'))
+        if kind == 'delete' and len(word) > 5:
+            word = word[:i] + word[i + 1:]
+        elif kind == 'insert':
+            word = word[:i] + rng.choice(string.ascii_lowercase) + word[i:]
+        elif kind == 'transpose' and i < len(word) - 1:
+            word = word[:i] + word[i + 1] + word[i] + word[i + 2:]
+        else:
+            word = word[:i] + rng.choice(string.ascii_lowercase) + word[i + 1:]
+    return word
+
+def naive_lookup(token, words, max_distance):
+    """The scan the index replaces: edit distance against every vocabulary word"""
+    best = None
+    for word in words:
+        distance = edit_distance(token, word, max_distance)
+        if distance <= max_distance and (best is None or distance < best[1]):
+            best = (word, distance)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs='+', default=[1000, 10000, 100000], help="Vocabulary sizes")
+    parser.add_argument("--max-distance", type=int, default=2)
+    parser.add_argument("--queries", type=int, default=2000, help="Lookups per vocabulary size")
+    parser.add_argument("--naive-limit", type=int, default=10000, help="Largest vocabulary timed with the naive scan")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'words':>8} {'entries':>10} {'build s':>8} {'lookup us':>10} {'naive us':>10} {'recall':>7} {'rejected':>8}")
+    for size in args.sizes:
+        words = synthetic_words(size, rng)
+
+        build_start = timeit.default_timer()
+        index = FuzzyIndex(words, max_distance=args.max_distance)
+        build_time = timeit.default_timer() - build_start
+
+        # Two thirds typos of real words, one third tokens that should not match anything
+        typos = []
+        for _ in range(args.queries * 2 // 3):
+            word = rng.choice(words)
+            typos.append((misspell(word, rng.randint(1, index.allowed_distance(word)), rng), word))
+        unrelated = [''.join(rng.choice('xyzqj') for _ in range(rng.randint(6, 10)))
+                     for _ in range(args.queries - len(typos))]
+        tokens = [token for token, _ in typos] + unrelated
+
+        # Uncached cost: the index remembers recent lookups
+        lookup = min(timeit.repeat(lambda: [index.lookup(token) for token in tokens],
+                                   setup=index.clear_cache, number=1, repeat=3)) / len(tokens)
+
+        # A lookup is right when it returns the intended word or another word at least as close;
+        # typos beyond the distance allowed for their length are not expected to be found
+        reachable = correct = 0
+        for token, word in typos:
+            distance = edit_distance(token, word, args.max_distance)
+            if distance > index.allowed_distance(token):
+                continue
+            reachable += 1
+            result = index.lookup(token)
+            if result is not None and result[1] <= distance:
+                correct += 1
+        rejected = sum(1 for token in unrelated if index.lookup(token) is None)
+
+        naive = ''
+        if size <= args.naive_limit:
+            sample = tokens[:max(20, 200000 // size)]
+            seconds = timeit.timeit(lambda: [naive_lookup(token, words, 1 if len(token) <= 6 else args.max_distance)
+                                             for token in sample], number=1)
+            naive = f"{seconds / len(sample) * 1e6:.1f}"
+
+        print(f"{size:>8} {index.entry_count:>10} {build_time:>8.2f} {lookup * 1e6:>10.1f} {naive:>10} "
+              f"{correct / reachable:>7.1%} {rejected / len(unrelated):>8.1%}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
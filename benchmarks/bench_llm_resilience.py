@@ -0,0 +1,178 @@
+"""Exercise the Gemini client's deadline, retries, hedging and circuit breaker against the fake model.
+
+Each scenario drives OpenAIProcessor.generate_response (or the async or
+streaming variant) from concurrent callers against FakeGeminiModel with injected
+latency and errors, then reports latency percentiles, how many answers
+fell back to the local summary and how many model calls were made. The
+closing checks exit non-zero when a guarantee does not hold. Run from
+the repository root:
+
+    python -m benchmarks.bench_llm_resilience
+    python -m benchmarks.bench_llm_resilience --requests 1000 --concurrency 32
+"""
+import argparse
+import asyncio
+import contextlib
+import math
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks.stubs import FakeGeminiModel
+
+SYMPTOMS = ["fever", "cough"]
+DIAGNOSES = [{'disease': "Influenza", 'confidence': 80.0, 'description': "A viral infection", 'treatment': "Rest"}]
+
+def make_processor(model, timeout=30.0, max_retries=0, hedge_delay=0.0, breaker_failures=5, breaker_cooldown=30.0):
+    from circuit_breaker import CircuitBreaker
+    from openai_processor import OpenAIProcessor
+
+    # Every call must reach the fake model
+    os.environ['RESPONSE_CACHE_BACKEND'] = 'none'
+    processor = OpenAIProcessor(api_key="stub", model_factory=lambda: model)
+    processor.timeout = timeout
+    processor.max_retries = max_retries
+    processor.retry_backoff = 0.05
+    processor.hedge_delay = hedge_delay
+    processor.breaker = CircuitBreaker(failure_threshold=breaker_failures, cooldown=breaker_cooldown)
+    return processor
+
+def percentile(sorted_samples, fraction):
+    return sorted_samples[min(int(len(sorted_samples) * fraction), len(sorted_samples) - 1)]
+
+def drive(processor, model, requests, concurrency, stream=False):
+    """Run requests concurrent generate_response (or stream_response) calls; returns a result row"""
+    latencies = []
+    fallbacks = 0
+
+    def one(i):
+        start = time.perf_counter()
+        if stream:
+            text = ''.join(processor.stream_response(f"message {i}", SYMPTOMS, DIAGNOSES))
+        else:
+            text = processor.generate_response(f"message {i}", SYMPTOMS, DIAGNOSES)
+        return time.perf_counter() - start, text != model.text
+
+    calls_before = model.calls
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for elapsed, fell_back in executor.map(one, range(requests)):
+            latencies.append(elapsed)
+            fallbacks += fell_back
+    return summarize(latencies, fallbacks, model.calls - calls_before, processor, time.perf_counter() - start)
+
+def drive_async(processor, model, requests, concurrency):
+    """Same as drive() through generate_response_async on one event loop"""
+    async def run():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(i):
+            async with semaphore:
+                start = time.perf_counter()
+                text = await processor.generate_response_async(f"message {i}", SYMPTOMS, DIAGNOSES)
+                return time.perf_counter() - start, text != model.text
+
+        return await asyncio.gather(*(one(i) for i in range(requests)))
+
+    calls_before = model.calls
+    start = time.perf_counter()
+    results = asyncio.run(run())
+    return summarize([elapsed for elapsed, _ in results], sum(fell_back for _, fell_back in results),
+                     model.calls - calls_before, processor, time.perf_counter() - start)
+
+def summarize(latencies, fallbacks, calls, processor, seconds):
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'seconds': seconds,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'max_ms': latencies[-1] * 1000,
+        'fallbacks': fallbacks,
+        'model_calls': calls,
+        'breaker': processor.breaker.state
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    n, c = args.requests, args.concurrency
+
+    rows = []
+    checks = []
+
+    def scenario(name, result):
+        rows.append((name, result))
+        return result
+
+    # The processor prints every failure; keep the report readable
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        # Slow tail: 5% of calls take 2 s; a hedge after 150 ms races a second call against them
+        tail = dict(latency=0.05, slow_rate=0.05, slow_latency=2.0, seed=args.seed)
+        model = FakeGeminiModel(**tail)
+        plain = scenario("slow tail, no hedging", drive(make_processor(model), model, n, c))
+        model = FakeGeminiModel(**tail)
+        hedged = scenario("slow tail, hedge 150ms", drive(make_processor(model, hedge_delay=0.15), model, n, c))
+        model = FakeGeminiModel(**tail)
+        hedged_async = scenario("slow tail, hedge (async)",
+                                drive_async(make_processor(model, hedge_delay=0.15), model, n, c * 4))
+        checks.append(("hedging cuts p99 below half", hedged['p99_ms'] < plain['p99_ms'] / 2
+                       and hedged_async['p99_ms'] < plain['p99_ms'] / 2))
+
+        # Flaky: 20% of calls fail; one jittered retry recovers most of them
+        model = FakeGeminiModel(latency=0.02, error_rate=0.2, seed=args.seed)
+        no_retry = scenario("20% errors, no retry", drive(make_processor(model, breaker_failures=10 ** 6), model, n, c))
+        model = FakeGeminiModel(latency=0.02, error_rate=0.2, seed=args.seed)
+        retried = scenario("20% errors, 1 retry", drive(make_processor(model, max_retries=1, breaker_failures=10 ** 6),
+                                                         model, n, c))
+        checks.append(("a retry halves fallbacks", retried['fallbacks'] < no_retry['fallbacks'] / 2))
+
+        # Hung API: every call takes 10 s; the deadline caps waiting, and the breaker stops calling
+        model = FakeGeminiModel(latency=10.0, seed=args.seed)
+        hung = scenario("hung API, 0.5s deadline", drive(make_processor(model, timeout=0.5), model, n, c))
+        checks.append(("deadline bounds latency", hung['max_ms'] < 1000))
+        checks.append(("breaker stops calling a hung API", hung['model_calls'] < c + 10 and hung['breaker'] == 'open'))
+
+        # Hung stream: chunks never arrive in time; the deadline covers the first chunk and the gaps after it
+        model = FakeGeminiModel(latency=10.0, seed=args.seed)
+        hung_stream = scenario("hung stream, 0.5s deadline", drive(make_processor(model, timeout=0.5), model, n, c,
+                                                                    stream=True))
+        checks.append(("deadline bounds a stalled stream", hung_stream['max_ms'] < 1000
+                       and hung_stream['fallbacks'] == n and hung_stream['breaker'] == 'open'))
+
+        # Outage with and without the breaker: failures take 300 ms each
+        model = FakeGeminiModel(latency=0.3, error_rate=1.0, seed=args.seed)
+        no_breaker = scenario("outage, breaker off", drive(make_processor(model, breaker_failures=10 ** 6), model, n, c))
+        model = FakeGeminiModel(latency=0.3, error_rate=1.0, seed=args.seed)
+        breaker_failures, breaker_cooldown = 5, 0.5
+        processor = make_processor(model, breaker_failures=breaker_failures, breaker_cooldown=breaker_cooldown)
+        outage = scenario("outage, breaker on", drive(processor, model, n, c))
+        # Calls in flight when the circuit opens, then one probe per cool-down
+        allowed_calls = c + breaker_failures + math.ceil(outage['seconds'] / breaker_cooldown)
+        checks.append(("breaker answers locally during an outage",
+                       outage['p50_ms'] < 5 and outage['model_calls'] <= allowed_calls
+                       and outage['model_calls'] < no_breaker['model_calls']))
+
+        # Recovery: once the API is back, one half-open probe after the cooldown closes the circuit;
+        # callers arriving while it is in flight still get the local answer
+        model.error_rate = 0.0
+        time.sleep(0.6)
+        probing = scenario("outage over, probe in flight", drive(processor, model, n, c))
+        recovered = scenario("outage over, circuit closed", drive(processor, model, n, c))
+        checks.append(("breaker sends a single probe", probing['model_calls'] == 1))
+        checks.append(("breaker closes after recovery", recovered['breaker'] == 'closed' and recovered['fallbacks'] == 0))
+
+    print(f"{'scenario':<30} {'requests':>8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'fallbacks':>9} {'calls':>6} breaker")
+    for name, row in rows:
+        print(f"{name:<30} {row['requests']:>8} {row['p50_ms']:>8.1f} {row['p99_ms']:>8.1f} {row['max_ms']:>8.1f} "
+              f"{row['fallbacks']:>9} {row['model_calls']:>6} {row['breaker']}")
+    print()
+    for description, passed in checks:
+        print(f"{'PASS' if passed else 'FAIL'} {description}")
+    return 0 if all(passed for _, passed in checks) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+"""Measure lemma normalization in symptom extraction: recall, per-message cost and cache hit rate.
+
+Messages mimic chat traffic: filler words drawn from a Zipf distribution
+over --vocabulary word types, with two to four symptoms mentioned in an
+inflected form ("coughs", "aching joints"). Each run reports how many of
+the mentioned symptoms were found, the cost per message and the lemma
+cache hit rate, for the matcher without normalization, with it but no
+cache, and with LRU caches of each --cache-sizes. Run from the repository
+root:
+
+    python -m benchmarks.bench_normalizer
+    python -m benchmarks.bench_normalizer --messages 50000 --cache-sizes 1000 50000 --lemmatizer porter
+"""
+import argparse
+import random
+import string
+import time
+from itertools import accumulate
+from nlp_processor import build_vocabulary
+from symptom_matcher import SymptomMatcher
+from text_normalizer import TokenNormalizer, porter_stemmer, wordnet_lemmatizer
+from benchmarks.stubs import synthetic_knowledge_base
+
+# Everyday words that dominate chat messages, most frequent first
+COMMON_WORDS = (
+    "i", "my", "and", "have", "the", "a", "been", "is", "it", "since", "feel", "with", "of", "for", "days",
+    "really", "also", "some", "bad", "yesterday", "night", "morning", "when", "after", "worse", "now",
+    "doctor", "should", "what", "can", "today", "started", "getting", "lot", "week", "keep", "having"
+)
+
+# Inflected mentions of the common symptoms, as users write them
+INFLECTED_MENTIONS = (
+    "coughs", "coughing", "coughed", "headaches", "fevers", "aching joints", "joints ache", "sore joints",
+    "feeling tired", "tiredness", "nauseas", "sore throats", "chest pains", "runny noses"
+)
+
+def _pseudo_word(rng):
+    return ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 10)))
+
+def inflect(name, rng):
+    """name with its last word pluralized or turned into a verb form"""
+    words = name.split()
+    words[-1] += rng.choice(('s', 'es', 'ing', 'ed'))
+    return ' '.join(words)
+
+def synthetic_traffic(symptom_names, count, vocabulary_size, seed=0):
+    """(message, mentioned symptoms) pairs with Zipf-distributed filler words"""
+    rng = random.Random(seed)
+    words = list(COMMON_WORDS)
+    seen = set(words)
+    while len(words) < vocabulary_size:
+        word = _pseudo_word(rng)
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    weights = list(accumulate(1.0 / rank ** 1.1 for rank in range(1, len(words) + 1)))
+
+    traffic = []
+    for _ in range(count):
+        filler = rng.choices(words, cum_weights=weights, k=rng.randint(6, 24))
+        mentioned = []
+        for _ in range(rng.randint(2, 4)):
+            if rng.random() < 0.3:
+                filler.insert(rng.randrange(len(filler) + 1), rng.choice(INFLECTED_MENTIONS))
+            else:
+                name = rng.choice(symptom_names)
+                mentioned.append(name)
+                filler.insert(rng.randrange(len(filler) + 1), inflect(name, rng))
+        traffic.append((' '.join(filler), mentioned))
+    return traffic
+
+def run(matcher, traffic):
+    """(seconds per message, share of mentioned database symptoms found)"""
+    found = expected = 0
+    start = time.perf_counter()
+    results = [matcher.find(message) for message, _ in traffic]
+    elapsed = time.perf_counter() - start
+    for detected, (_, mentioned) in zip(results, traffic):
+        detected = set(detected)
+        expected += len(mentioned)
+        found += sum(1 for name in mentioned if name in detected)
+    return elapsed / len(traffic), found / expected if expected else 0.0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--diseases", type=int, default=5000, help="Knowledge-base size (symptoms = diseases / 5)")
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--vocabulary", type=int, default=20000, help="Distinct filler words")
+    parser.add_argument("--cache-sizes", type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument("--lemmatizer", choices=('wordnet', 'porter'), default='wordnet')
+    parser.add_argument("--max-distance", type=int, default=2, help="FUZZY_MAX_DISTANCE of the matcher")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    name = args.lemmatizer
+    if name == 'wordnet':
+        try:
+            lemmatize = wordnet_lemmatizer()
+        except LookupError:
+            parser.error("WordNet data is missing; install it or pass --lemmatizer porter")
+    else:
+        lemmatize = porter_stemmer()
+
+    symptom_rows, _, _ = synthetic_knowledge_base(args.diseases, seed=args.seed)
+    symptom_names = [row[1] for row in symptom_rows]
+    vocabulary = build_vocabulary(symptom_names)
+    # Mentions of database symptoms only; the common ones are scored by presence in the report below
+    traffic = synthetic_traffic(symptom_names[10:], args.messages, args.vocabulary, args.seed)
+
+    print(f"{len(symptom_names)} symptoms, {args.messages} messages, {args.vocabulary} filler words, "
+          f"lemmatizer: {name}")
+    print(f"{'configuration':<22} {'build s':>8} {'us/msg':>8} {'recall':>7} {'hit rate':>9} {'cached':>7}")
+
+    configurations = [('no normalization', None), ('uncached lemmas', 0)]
+    configurations += [(f"LRU {size}", size) for size in args.cache_sizes]
+    for label, cache_size in configurations:
+        normalizer = TokenNormalizer(lemmatize, cache_size, name) if cache_size is not None else None
+        start = time.perf_counter()
+        matcher = SymptomMatcher(vocabulary, args.max_distance, normalizer=normalizer)
+        build = time.perf_counter() - start
+        if normalizer is not None:
+            # Hit rate on traffic alone, not on the alias lemmas computed at build time
+            normalizer.clear_cache()
+
+        per_message, recall = run(matcher, traffic)
+        hit_rate, cached = '-', '-'
+        if cache_size:
+            stats = normalizer.stats()
+            hit_rate, cached = f"{stats['hit_rate']:.1%}", stats['size']
+        print(f"{label:<22} {build:>8.2f} {per_message * 1e6:>8.1f} {recall:>7.1%} {hit_rate:>9} {cached:>7}")
+
+    # Without spelling correction, which also catches some inflections ("joints" is one edit from "joint")
+    matcher = SymptomMatcher(vocabulary, normalizer=TokenNormalizer(lemmatize, 50000, name))
+    raw = SymptomMatcher(vocabulary)
+    print("\nInflected mentions of the common symptoms (exact aliases, no spelling correction):")
+    for mention in INFLECTED_MENTIONS:
+        print(f"  {mention:<16} without: {', '.join(raw.find(mention)) or '-':<22} "
+              f"with: {', '.join(matcher.find(mention)) or '-'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""Compare startup time and memory of pre-forked workers with and without a warmed-up master.
+
+"preload" warms up once (app.warm_up: NLTK corpora, knowledge-base
+snapshot, compiled matchers), freezes the collector and then forks the
+workers, as gunicorn does with preload_app. "per-worker" forks first and
+lets every worker warm up on its own. Each worker then analyses a few
+messages and stays alive while its /proc/<pid>/smaps_rollup is read, so
+proportional (PSS) and private (USS) memory reflect the pages the workers
+really share. Linux only; run from the repository root:
+
+    python -m benchmarks.bench_prefork --workers 4 --diseases 5000
+"""
+import argparse
+import contextlib
+import gc
+import json
+import os
+import sys
+import time
+from benchmarks.stubs import FakeDatabase, synthetic_knowledge_base, synthetic_messages
+
+def memory_kb(pid):
+    """(rss, pss, uss) in kB from /proc/<pid>/smaps_rollup"""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup", encoding='ascii') as rollup:
+        for line in rollup:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1])
+    return fields['Rss'], fields['Pss'], fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0)
+
+def serve(flask_app, database, messages):
+    """Worker body: warm up unless inherited, touch the request path, report readiness"""
+    from database import ConnectionPool, configure_pool
+    configure_pool(ConnectionPool(database.connect, size=2, max_overflow=0))
+    if not flask_app.ready:
+        flask_app.warm_up()
+        flask_app.ready = True
+    chatbot = flask_app.MedicalChatbot(openai_processor=flask_app.OpenAIProcessor(api_key=None))
+    for message in messages:
+        chatbot.analyze(message)
+
+def run(mode, workers, database, messages):
+    """Fork the workers for one mode; returns the measurements"""
+    import app as flask_app
+    start = time.perf_counter()
+    if mode == 'preload':
+        flask_app.warm_up()
+        flask_app.ready = True
+        gc.freeze()
+    warmed = time.perf_counter() - start
+
+    children = []
+    for _ in range(workers):
+        ready_read, ready_write = os.pipe()
+        exit_read, exit_write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(ready_read)
+            os.close(exit_write)
+            # Earlier workers' pipe ends would keep them from seeing EOF
+            for _, other_ready, other_exit in children:
+                os.close(other_ready)
+                os.close(other_exit)
+            try:
+                with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                    serve(flask_app, database, messages)
+                os.write(ready_write, b'1')
+                # Stay alive until the parent has read our memory
+                os.read(exit_read, 1)
+            finally:
+                os._exit(0)
+        os.close(ready_write)
+        os.close(exit_read)
+        children.append((pid, ready_read, exit_write))
+
+    for _, ready_read, _ in children:
+        if os.read(ready_read, 1) != b'1':
+            raise RuntimeError("a worker failed to start")
+    ready_seconds = time.perf_counter() - start
+
+    samples = [memory_kb(pid) for pid, _, _ in children]
+    for pid, ready_read, exit_write in children:
+        os.close(exit_write)
+        os.close(ready_read)
+        os.waitpid(pid, 0)
+
+    return {
+        'mode': mode,
+        'workers': workers,
+        'master_warm_up_s': round(warmed, 3),
+        'all_ready_s': round(ready_seconds, 3),
+        'avg_rss_mb': round(sum(sample[0] for sample in samples) / len(samples) / 1024, 1),
+        'total_pss_mb': round(sum(sample[1] for sample in samples) / 1024, 1),
+        'total_uss_mb': round(sum(sample[2] for sample in samples) / 1024, 1)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--diseases", type=int, default=5000, help="Synthetic knowledge-base size")
+    parser.add_argument("--mode", choices=('preload', 'per-worker'), help="Run one mode only (each needs a fresh process)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    if args.mode is None:
+        # The master's own state must start cold for each mode, so run them in separate interpreters
+        import subprocess
+        results = []
+        for mode in ('per-worker', 'preload'):
+            output = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.bench_prefork', '--mode', mode, '--workers', str(args.workers),
+                 '--diseases', str(args.diseases), '--seed', str(args.seed)],
+                check=True, capture_output=True, text=True
+            ).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+        print(f"{'mode':<11} {'workers':>7} {'warm-up s':>9} {'ready s':>8} {'avg RSS MB':>10} {'total PSS MB':>12} {'total USS MB':>12}")
+        for result in results:
+            print(f"{result['mode']:<11} {result['workers']:>7} {result['master_warm_up_s']:>9.2f} "
+                  f"{result['all_ready_s']:>8.2f} {result['avg_rss_mb']:>10.1f} "
+                  f"{result['total_pss_mb']:>12.1f} {result['total_uss_mb']:>12.1f}")
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as output:
+                json.dump({'args': vars(args), 'results': results}, output, indent=2)
+        return 0
+
+    import app as flask_app
+    from database import ConnectionPool, configure_pool
+    from nlp_processor import NLTKResourceError, prewarm
+
+    symptoms, diseases, relationships = synthetic_knowledge_base(args.diseases, seed=args.seed)
+    database = FakeDatabase()
+    database.load(symptoms, diseases, relationships)
+    configure_pool(ConnectionPool(database.connect, size=2, max_overflow=0))
+    messages = synthetic_messages(symptoms, 50, seed=args.seed)
+
+    try:
+        prewarm()
+    except NLTKResourceError:
+        print("NLTK data is not installed; measuring without the corpora", file=sys.stderr)
+        flask_app.prewarm_nlp = lambda: None
+
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            result = run(args.mode, args.workers, database, messages)
+    finally:
+        database.close()
+    print(json.dumps(result))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
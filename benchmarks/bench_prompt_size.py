@@ -0,0 +1,98 @@
+"""Compare the size of Gemini prompts built the old way and by the compact prompt builder.
+
+The old prompt inlined the full multi-line system prompt and json.dumps of
+every diagnosis with its complete description and treatment. The builder
+sends the condensed instruction once per model handle (or once at the top
+of the prompt for models without system instructions) and encodes only the
+top diagnoses, one line each, within the token budget. Tokens are
+estimated at four characters per token. Afterwards a few responses go
+through OpenAIProcessor against the fake model to show the counts landing
+in chatbot_llm_tokens. Run from the repository root:
+
+    python -m benchmarks.bench_prompt_size
+    python -m benchmarks.bench_prompt_size --diagnoses 1 5 20 100 --budget 200 --top-k 5
+"""
+import argparse
+import json
+import os
+import random
+import sys
+from benchmarks.stubs import FakeGeminiModel
+
+# The prompt generate_response sent before the builder, kept here for comparison
+LEGACY_SYSTEM_PROMPT = """
+You are a medical chatbot assistant designed to provide general health information.
+Important disclaimers:
+1. You are not a licensed medical professional.
+2. Your responses are for informational purposes only and do not constitute medical advice.
+3. Always advise users to consult with a healthcare professional for proper diagnosis and treatment.
+
+Based on the user's message and the symptoms and potential diagnoses detected,
+provide a helpful, informative response that:
+1. Acknowledges the symptoms they've described
+2. Provides general information about possible conditions
+3. Offers general self-care tips if appropriate
+4. Always emphasizes the importance of consulting a healthcare professional
+5. Never make definitive diagnoses or prescribe treatments
+"""
+
+MESSAGE = "I've had a fever and a bad cough for three days, and now my head hurts too"
+SYMPTOMS = ["fever", "cough", "headache"]
+WORDS = ("infection", "viral", "inflammation", "airways", "chronic", "symptoms", "usually", "resolves",
+         "rest", "fluids", "medication", "pain", "relief", "doctor", "persistent", "severe", "caused", "by")
+
+def legacy_prompt(user_message, detected_symptoms, diagnoses):
+    context = {"detected_symptoms": detected_symptoms, "possible_diagnoses": diagnoses}
+    return f"{LEGACY_SYSTEM_PROMPT}\n\nUser message: {user_message}\n\nAdditional context: {json.dumps(context)}"
+
+def synthetic_diagnoses(count, rng):
+    """Diagnoses shaped like the scoring engine's output, best first, with sample-data length text"""
+    diagnoses = []
+    for i in range(count):
+        diagnoses.append({
+            'disease': f"Condition {i + 1}",
+            'confidence': round(90.0 - i * 80.0 / max(count, 1), 2),
+            'description': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(12, 30))).capitalize() + '.',
+            'treatment': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(6, 20))).capitalize() + '.'
+        })
+    return diagnoses
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--diagnoses", type=int, nargs='+', default=[1, 3, 10, 50], help="Matched diagnoses per request")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--budget", type=int, default=300, help="Context token budget")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    from prompt_builder import PromptBuilder, estimate_tokens
+
+    rng = random.Random(args.seed)
+    builder = PromptBuilder(top_k=args.top_k, context_tokens=args.budget)
+    print(f"{'diagnoses':>9} {'legacy tok':>10} {'inline tok':>10} {'handle tok':>10} {'saved':>7} {'kept':>5}")
+    for count in args.diagnoses:
+        diagnoses = synthetic_diagnoses(count, rng)
+        legacy = estimate_tokens(legacy_prompt(MESSAGE, SYMPTOMS, diagnoses))
+        inline = estimate_tokens(builder.build(MESSAGE, SYMPTOMS, diagnoses))
+        handle = estimate_tokens(builder.build(MESSAGE, SYMPTOMS, diagnoses, include_instruction=False))
+        kept = len(builder.context_lines(SYMPTOMS, diagnoses)) - 2
+        print(f"{count:>9} {legacy:>10} {inline:>10} {handle:>10} {1 - inline / legacy:>7.1%} {kept:>5}")
+
+    # Token counts recorded per response (estimated: the fake model reports no usage)
+    import metrics
+    from openai_processor import OpenAIProcessor
+    os.environ['RESPONSE_CACHE_BACKEND'] = 'none'
+    processor = OpenAIProcessor(api_key="stub", model_factory=lambda: FakeGeminiModel(latency=0.0))
+    processor.prompt_builder = builder
+    diagnoses = synthetic_diagnoses(max(args.diagnoses), rng)
+    responses = 20
+    for i in range(responses):
+        processor.generate_response(f"{MESSAGE} ({i})", SYMPTOMS, diagnoses)
+    print()
+    for sample_name, labels, value in metrics.LLM_TOKENS.samples():
+        if sample_name.endswith('_sum'):
+            print(f"chatbot_llm_tokens {labels['kind']}: {value / responses:.0f} per response")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
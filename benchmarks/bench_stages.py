@@ -0,0 +1,122 @@
+"""Micro-benchmarks of the request stages on synthetic knowledge bases of growing size.
+
+Times NLPProcessor.extract_symptoms, MedicalDiagnosisSystem.get_possible_diagnoses
+and OpenAIProcessor._generate_fallback_response against an in-process
+SQLite stand-in for MySQL, both with the knowledge-base snapshot loaded
+and on the SQL path. Run from the repository root:
+
+    python -m benchmarks.bench_stages --sizes 100 1000 10000 --json results.json
+    python -m benchmarks.bench_stages --baseline results.json
+
+Results are deterministic for a given --seed, so JSON files from two
+commits can be compared with --baseline.
+"""
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import sys
+import time
+from benchmarks.stubs import FakeDatabase, synthetic_knowledge_base, synthetic_messages
+from database import ConnectionPool, configure_pool
+from diagnosis_system import MedicalDiagnosisSystem
+from knowledge_base import get_knowledge_base
+from openai_processor import OpenAIProcessor
+
+def time_calls(function, inputs, repeat):
+    """Per-call seconds over `repeat` passes through inputs"""
+    samples = []
+    for _ in range(repeat):
+        for item in inputs:
+            start = time.perf_counter()
+            function(item)
+            samples.append(time.perf_counter() - start)
+    return samples
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        'calls': len(samples),
+        'median_us': statistics.median(samples) * 1e6,
+        'p95_us': samples[max(int(len(samples) * 0.95) - 1, 0)] * 1e6,
+        'ops_per_s': len(samples) / sum(samples) if sum(samples) else 0.0
+    }
+
+def bench_size(diseases, messages_count, repeat, seed):
+    """Results for one knowledge-base size, keyed by stage name"""
+    symptoms, disease_rows, relationships = synthetic_knowledge_base(diseases, seed=seed)
+    messages = synthetic_messages(symptoms, messages_count, seed=seed)
+    
+    database = FakeDatabase()
+    database.load(symptoms, disease_rows, relationships)
+    configure_pool(ConnectionPool(database.connect, size=4, max_overflow=0))
+    
+    diagnosis_system = MedicalDiagnosisSystem()
+    nlp = diagnosis_system.nlp_processor
+    processor = OpenAIProcessor(api_key="stub", model_factory=lambda: None)
+    knowledge_base = get_knowledge_base()
+    results = {}
+    
+    try:
+        for mode in ('snapshot', 'sql'):
+            if mode == 'snapshot':
+                knowledge_base.refresh(force=True)
+            else:
+                knowledge_base.swap(None)
+            
+            # Also warms the matcher cache so construction is not counted as a call
+            symptom_lists = [nlp.extract_symptoms(message) for message in messages]
+            
+            results[f'extract_symptoms[{mode}]'] = summarize(
+                time_calls(nlp.extract_symptoms, messages, repeat))
+            results[f'get_possible_diagnoses[{mode}]'] = summarize(
+                time_calls(diagnosis_system.get_possible_diagnoses, symptom_lists, repeat))
+        
+        knowledge_base.refresh(force=True)
+        pairs = [(symptoms, diagnosis_system.get_possible_diagnoses(symptoms)) for symptoms in symptom_lists]
+        results['generate_fallback_response'] = summarize(
+            time_calls(lambda pair: processor._generate_fallback_response(*pair), pairs, repeat))
+    finally:
+        knowledge_base.swap(None)
+        configure_pool(ConnectionPool(database.connect, size=1, max_overflow=0))
+        database.close()
+    
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs='+', default=[100, 1000, 10000],
+                        help="Disease counts to benchmark (symptoms scale at one per five diseases)")
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--baseline", help="Compare medians against a previous --json file")
+    args = parser.parse_args()
+    
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)['results']
+    
+    all_results = {}
+    print(f"{'diseases':>8} {'stage':<36} {'median us':>10} {'p95 us':>10} {'ops/s':>10} {'vs base':>8}")
+    for size in args.sizes:
+        # The stages print per call; keep that out of the table (and mostly out of the timings)
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            results = bench_size(size, args.messages, args.repeat, args.seed)
+        all_results[str(size)] = results
+        for stage, summary in results.items():
+            previous = baseline.get(str(size), {}).get(stage)
+            change = f"{summary['median_us'] / previous['median_us']:>7.2f}x" if previous else ''
+            print(f"{size:>8} {stage:<36} {summary['median_us']:>10.1f} {summary['p95_us']:>10.1f} "
+                  f"{summary['ops_per_s']:>10.0f} {change:>8}")
+    
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as output:
+            json.dump({'args': vars(args), 'python': sys.version.split()[0], 'results': all_results}, output, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
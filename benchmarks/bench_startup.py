@@ -0,0 +1,57 @@
+"""Measure cold-start import time of the application modules.
+
+Each sample runs a fresh interpreter, so module caches and NLTK corpora
+are loaded from scratch. Run from the repository root:
+
+    python -m benchmarks.bench_startup --runs 10
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+DEFAULT_STATEMENTS = (
+    "import app",
+    "import nlp_processor",
+    "import nlp_processor; nlp_processor.prewarm()",
+)
+
+def time_statement(statement, runs, cwd):
+    """Wall-clock seconds for `python -c statement`, one fresh process per run"""
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        completed = subprocess.run(
+            [sys.executable, "-c", statement],
+            cwd=cwd,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True
+        )
+        samples.append(time.perf_counter() - start)
+        if completed.returncode != 0:
+            error = completed.stderr.strip().splitlines()
+            return samples, error[-1] if error else f"exit status {completed.returncode}"
+    return samples, None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--statement", action="append",
+                        help="Python statement to time (repeatable); defaults to the app imports")
+    parser.add_argument("--cwd", default=os.getcwd(), help="Checkout to measure (default: current directory)")
+    args = parser.parse_args()
+
+    print(f"{'statement':<48} {'median s':>9} {'min s':>7} {'max s':>7}")
+    for statement in args.statement or DEFAULT_STATEMENTS:
+        samples, error = time_statement(statement, args.runs, args.cwd)
+        line = (f"{statement:<48} {statistics.median(samples):>9.3f} "
+                f"{min(samples):>7.3f} {max(samples):>7.3f}")
+        if error:
+            line += f"  (failed: {error})"
+        print(line)
+
+if __name__ == "__main__":
+    main()
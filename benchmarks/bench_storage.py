@@ -0,0 +1,154 @@
+"""Compare per-message storage latency of the MySQL and SQLite backends on one synthetic knowledge base.
+
+Both backends are filled through kb_importer from the same synthetic
+knowledge base. Every simulated chat message then does the storage work
+of a request served without the in-memory snapshot and with
+INTERACTION_WRITE_MODE=sync: rank diseases for its symptoms, insert the
+interaction and read the user's first history page. Snapshot loads and
+version checks are timed separately. SQLite always runs (in a temporary
+file). MySQL runs with --mysql, which recreates MYSQL_BENCH_DATABASE
+(default medical_chatbot_bench) on the server from the MYSQL_*
+variables. Run from the repository root:
+
+    python -m benchmarks.bench_storage --diseases 5000
+    python -m benchmarks.bench_storage --diseases 5000 --mysql
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from benchmarks.stubs import synthetic_knowledge_base
+from kb_importer import KnowledgeBaseImporter
+from schema import create_index_statements, create_table_statements
+from storage import MySQLStorage, SQLiteStorage
+
+def fill(connection, dialect, symptoms, diseases, relationships):
+    """Load synthetic_knowledge_base() rows by name, as kb_importer would from files"""
+    importer = KnowledgeBaseImporter(connection, chunk_size=5000, progress_interval=0, dialect=dialect)
+    importer.import_symptoms({'name': name, 'description': description} for _, name, description in symptoms)
+    importer.import_diseases({'name': name, 'description': description, 'treatment': treatment}
+                             for _, name, description, treatment in diseases)
+    symptom_names = {symptom_id: name for symptom_id, name, _ in symptoms}
+    disease_names = {disease_id: name for disease_id, name, _, _ in diseases}
+    importer.import_relationships({'symptom': symptom_names[symptom_id], 'disease': disease_names[disease_id],
+                                   'correlation_strength': strength}
+                                  for symptom_id, disease_id, strength in relationships)
+
+def sqlite_backend(path):
+    storage = SQLiteStorage(path)
+    return storage, storage.connect()
+
+def mysql_backend(database):
+    import mysql.connector
+    from database import ConnectionPool, _connection_params
+
+    server = mysql.connector.connect(**_connection_params(with_database=False))
+    cursor = server.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS `{database}`")
+    cursor.execute(f"CREATE DATABASE `{database}`")
+    cursor.close()
+    server.close()
+
+    params = {**_connection_params(with_database=False), 'database': database}
+    connection = mysql.connector.connect(**params)
+    cursor = connection.cursor()
+    # The state setup_database() plus the migrations leave behind
+    for statement in create_table_statements('mysql') + create_index_statements('mysql'):
+        cursor.execute(statement)
+    cursor.close()
+    pool = ConnectionPool(lambda: mysql.connector.connect(**params), size=2, max_overflow=0)
+    return MySQLStorage(pool), connection
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+def run(storage, workload, top_k, repeat):
+    """Time snapshot loads, version checks and the per-message operations; milliseconds"""
+    load = min(timed(storage.load_knowledge_base) for _ in range(repeat))
+    version = statistics.median(timed(storage.knowledge_base_version) for _ in range(50))
+
+    rank, write, history, message = [], [], [], []
+    for user_id, symptoms in workload:
+        start = time.perf_counter()
+        storage.rank_diseases(symptoms, top_k)
+        ranked = time.perf_counter()
+        storage.insert_interactions([(user_id, ' and '.join(symptoms), "stub response",
+                                      datetime.now().replace(microsecond=0))])
+        written = time.perf_counter()
+        storage.fetch_turns(user_id, 21)
+        done = time.perf_counter()
+        rank.append(ranked - start)
+        write.append(written - ranked)
+        history.append(done - written)
+        message.append(done - start)
+
+    return {
+        'load_ms': load * 1000,
+        'version_ms': version * 1000,
+        'rank_p50_ms': statistics.median(rank) * 1000,
+        'write_p50_ms': statistics.median(write) * 1000,
+        'history_p50_ms': statistics.median(history) * 1000,
+        'message_p50_ms': statistics.median(message) * 1000,
+        'message_p99_ms': percentile(message, 0.99) * 1000
+    }
+
+def timed(function):
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--diseases", type=int, default=5000, help="Synthetic knowledge-base size")
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3, help="Snapshot loads timed (best is reported)")
+    parser.add_argument("--mysql", action="store_true", help="Also benchmark the MySQL server from MYSQL_*")
+    parser.add_argument("--mysql-database", default=os.getenv('MYSQL_BENCH_DATABASE', 'medical_chatbot_bench'))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    symptoms, diseases, relationships = synthetic_knowledge_base(args.diseases, seed=args.seed)
+    rng = random.Random(args.seed)
+    names = [name for _, name, _ in symptoms]
+    workload = [(f"user-{rng.randrange(args.users)}", rng.sample(names, rng.randint(1, 4)))
+                for _ in range(args.messages)]
+
+    handle, path = tempfile.mkstemp(prefix='bench-storage-', suffix='.sqlite3')
+    os.close(handle)
+    os.remove(path)
+    backends = [('sqlite', lambda: sqlite_backend(path))]
+    if args.mysql:
+        backends.append(('mysql', lambda: mysql_backend(args.mysql_database)))
+
+    print(f"{args.diseases} diseases, {len(symptoms)} symptoms, {len(relationships)} relationships, "
+          f"{args.messages} messages")
+    print(f"{'backend':<8} {'fill s':>7} {'kb load ms':>10} {'version ms':>10} {'rank ms':>8} {'write ms':>8} "
+          f"{'history ms':>10} {'message p50':>11} {'message p99':>11}")
+    try:
+        for name, open_backend in backends:
+            storage, connection = open_backend()
+            start = time.perf_counter()
+            fill(connection, storage.dialect, symptoms, diseases, relationships)
+            filled = time.perf_counter() - start
+            connection.close()
+
+            result = run(storage, workload, args.top_k, args.repeat)
+            storage.dispose()
+            print(f"{name:<8} {filled:>7.2f} {result['load_ms']:>10.1f} {result['version_ms']:>10.3f} "
+                  f"{result['rank_p50_ms']:>8.3f} {result['write_p50_ms']:>8.3f} {result['history_p50_ms']:>10.3f} "
+                  f"{result['message_p50_ms']:>11.3f} {result['message_p99_ms']:>11.3f}")
+    finally:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
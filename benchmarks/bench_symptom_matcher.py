@@ -0,0 +1,68 @@
+"""Compare the Aho-Corasick symptom matcher with the old per-alias substring scan.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_symptom_matcher
+"""
+import random
+import string
+import timeit
+from symptom_matcher import SymptomMatcher
+
+MESSAGE_LENGTHS = (100, 1000, 10000)
+PATTERN_COUNTS = (10, 1000, 50000)
+
+def legacy_extract(text, vocabulary):
+    """The substring scan extract_symptoms used before the compiled matcher"""
+    text_lower = text.lower()
+    detected = []
+    for symptom, aliases in vocabulary:
+        if any(alias in text_lower for alias in aliases) and symptom not in detected:
+            detected.append(symptom)
+    return detected
+
+def synthetic_vocabulary(count, rng):
+    """Symptom-like phrases of one to three pseudo-words, each with one alias"""
+    def word():
+        return ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 9)))
+
+    vocabulary = []
+    for i in range(count):
+        phrase = ' '.join(word() for _ in range(rng.randint(1, 3)))
+        vocabulary.append((f"symptom-{i}", [phrase, f"{phrase} ache"]))
+    return vocabulary
+
+def synthetic_message(length, vocabulary, rng):
+    """Filler words with a handful of real phrases mixed in"""
+    words = []
+    size = 0
+    while size < length:
+        if rng.random() < 0.05:
+            words.append(rng.choice(vocabulary)[1][0])
+        else:
+            words.append(rng.choice(("i", "have", "been", "feeling", "since", "yesterday", "and", "my")))
+        size += len(words[-1]) + 1
+    return ' '.join(words)[:length]
+
+def main():
+    rng = random.Random(42)
+    print(f"{'patterns':>9} {'msg chars':>10} {'legacy ms':>11} {'matcher ms':>11} {'speedup':>8} {'build s':>8}")
+    for pattern_count in PATTERN_COUNTS:
+        vocabulary = synthetic_vocabulary(pattern_count, rng)
+
+        build_start = timeit.default_timer()
+        matcher = SymptomMatcher(vocabulary)
+        build_time = timeit.default_timer() - build_start
+
+        for length in MESSAGE_LENGTHS:
+            message = synthetic_message(length, vocabulary, rng)
+            runs = max(3, int(20000 / (pattern_count + length)))
+
+            legacy = min(timeit.repeat(lambda: legacy_extract(message, vocabulary), number=runs, repeat=3)) / runs
+            compiled = min(timeit.repeat(lambda: matcher.find(message), number=runs, repeat=3)) / runs
+
+            print(f"{pattern_count:>9} {length:>10} {legacy * 1000:>11.3f} {compiled * 1000:>11.3f} "
+                  f"{legacy / compiled:>7.1f}x {build_time:>8.2f}")
+
+if __name__ == "__main__":
+    main()
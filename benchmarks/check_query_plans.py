@@ -0,0 +1,76 @@
+"""Fail when the diagnosis query stops reading its tables through indexes.
+
+Always checks the SQLite plan (an in-memory database with the shared
+schema), and with --mysql also the MySQL plan on a small seeded database
+(MYSQL_BENCH_DATABASE, see bench_diagnosis_sql.py). Exits non-zero if a
+base table is read with a full scan, so it can run after every schema
+change or in CI. Run from the repository root:
+
+    python -m benchmarks.check_query_plans
+    python -m benchmarks.check_query_plans --mysql
+"""
+import os
+import re
+import sys
+import sqlite3
+import argparse
+from schema import create_index_statements, create_table_statements
+from storage import diagnosis_query
+
+SAMPLE_SYMPTOMS = ["fever", "cough", "headache", "fatigue"]
+
+# Base tables and the aliases the diagnosis query gives them
+SQLITE_TABLES = ("symptoms", "diseases", "symptoms_diseases", "s", "sd", "d")
+
+def sqlite_full_scans(symptoms, top_k):
+    """(plan lines, base tables SQLite scans without an index)"""
+    connection = sqlite3.connect(':memory:')
+    for statement in create_table_statements('sqlite') + create_index_statements('sqlite'):
+        connection.execute(statement)
+    query, params = diagnosis_query(symptoms, top_k)
+    plan = [row[3] for row in connection.execute("EXPLAIN QUERY PLAN " + query.replace('%s', '?'), params)]
+    connection.close()
+
+    full_scans = []
+    for detail in plan:
+        # "SCAN sd" reads every row; "SCAN sd USING COVERING INDEX ..." walks an index
+        match = re.match(r'SCAN (\w+)(.*)', detail)
+        if match and match.group(1) in SQLITE_TABLES and 'INDEX' not in match.group(2):
+            full_scans.append(match.group(1))
+    return plan, full_scans
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mysql", action="store_true", help="Also check MySQL on a seeded bench database")
+    parser.add_argument("--database", default=os.getenv('MYSQL_BENCH_DATABASE', 'medical_chatbot_bench'))
+    parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+
+    failed = False
+    plan, full_scans = sqlite_full_scans(SAMPLE_SYMPTOMS, args.top_k)
+    print("SQLite plan:")
+    for detail in plan:
+        print(f"  {detail}")
+    if full_scans:
+        print(f"FAIL (sqlite): full table scan on {', '.join(full_scans)}")
+        failed = True
+    else:
+        print("OK (sqlite): every base table is read through an index")
+
+    if args.mysql:
+        from benchmarks.bench_diagnosis_sql import explain, seed
+        connection = seed(args.database, 2000, 10000, 100000, 7)
+        try:
+            full_scans = explain(connection, [f"symptom {i}" for i in range(4)], args.top_k)
+        finally:
+            connection.close()
+        if full_scans:
+            print(f"FAIL (mysql): full table scan on {', '.join(full_scans)}")
+            failed = True
+        else:
+            print("OK (mysql): every base table is read through an index")
+
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
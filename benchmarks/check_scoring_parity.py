@@ -0,0 +1,123 @@
+"""Check that the in-memory scoring engine ranks diseases exactly like the SQL diagnosis query.
+
+Loads the sample data (database.populate_sample_data) and a synthetic
+knowledge base into temporary SQLite databases, then scores every symptom
+combination (sample data) or random symptom sets (synthetic) both ways:
+storage.rank_diseases plus the confidence formula of
+MedicalDiagnosisSystem, and DiagnosisScoringEngine. Exits non-zero on any
+difference in the top-k diseases, their order or their confidences. Run
+from the repository root:
+
+    python -m benchmarks.check_scoring_parity
+    python -m benchmarks.check_scoring_parity --diseases 20000 --queries 2000 --top-k 10
+"""
+import os
+import sys
+import random
+import argparse
+import tempfile
+from itertools import combinations
+import numpy as np
+from storage import SQLiteStorage, configure_storage
+from knowledge_base import KnowledgeBaseSnapshot
+from benchmarks.stubs import synthetic_knowledge_base
+
+def sql_ranking(storage, symptoms, top_k):
+    """[(disease_id, correlation, matching, total, confidence)] from the SQL query, as the SQL path computes it"""
+    ranked = []
+    for disease_id, _, _, _, correlation, matching, total in storage.rank_diseases(symptoms, top_k):
+        symptom_coverage = matching / total if total > 0 else 0
+        confidence = (correlation * 0.7 + symptom_coverage * 0.3) * 100
+        ranked.append((disease_id, correlation, matching, total, min(round(confidence, 2), 95.0)))
+    return ranked
+
+def compare(expected, actual, top_k):
+    """Differences between two rankings; diseases tied on (correlation, matching) may come in any order"""
+    def key(row):
+        return round(row[1], 4), row[2]
+
+    problems = []
+    if len(expected) != len(actual):
+        return [f"{len(expected)} diseases from SQL, {len(actual)} from the engine"]
+    if [key(row) for row in expected] != [key(row) for row in actual]:
+        problems.append("ranking keys differ")
+    cutoff = key(expected[-1]) if expected and top_k and len(expected) == top_k else None
+    for row in actual:
+        match = [other for other in expected if other[0] == row[0]]
+        if not match:
+            # A disease tied with the last one kept may be swapped for another at the cut
+            if key(row) != cutoff:
+                problems.append(f"disease {row[0]} only from the engine")
+            continue
+        other = match[0]
+        if key(other) != key(row) or other[3] != row[3] or abs(other[4] - row[4]) > 0.01:
+            problems.append(f"disease {row[0]}: SQL {other[1:]} vs engine {row[1:]}")
+    return problems
+
+def check(label, storage, symptom_sets, top_k):
+    symptoms, diseases, relationships = storage.load_knowledge_base()
+    snapshot = KnowledgeBaseSnapshot('parity', symptoms, diseases, relationships)
+    engine = snapshot.scoring_engine
+
+    failures = 0
+    batch = engine.score_batch([[snapshot.symptom_ids[name.lower()] for name in names] for names in symptom_sets],
+                               top_k=top_k)
+    for names, batched in zip(symptom_sets, batch):
+        expected = sql_ranking(storage, names, top_k)
+        single = engine.score([snapshot.symptom_ids[name.lower()] for name in names], top_k=top_k)
+        problems = compare(expected, single, top_k) + (["score and score_batch differ"] if single != batched else [])
+        if problems:
+            failures += 1
+            if failures <= 5:
+                print(f"  {label} {names}: {'; '.join(problems[:3])}")
+
+    print(f"{label}: {len(symptom_sets)} symptom sets, {len(relationships)} relationships, "
+          f"{engine.nbytes / 1024:.0f} KiB of scoring arrays, {failures} mismatched")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--diseases", type=int, default=2000, help="Synthetic knowledge-base size")
+    parser.add_argument("--queries", type=int, default=500, help="Random symptom sets on the synthetic data")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='parity-')
+    failures = 0
+
+    # The sample data, every combination of up to three symptoms, all diseases and top-k
+    from database import populate_sample_data
+    storage = SQLiteStorage(os.path.join(directory, 'sample.sqlite3'))
+    configure_storage(storage)
+    populate_sample_data()
+    names = [name for _, name, _ in storage.fetch_symptoms()]
+    symptom_sets = [list(combo) for size in (1, 2, 3) for combo in combinations(names, size)]
+    for top_k in (0, 3):
+        failures += check(f"sample top_k={top_k}", storage, symptom_sets, top_k)
+
+    # A synthetic knowledge base at scale
+    storage = SQLiteStorage(os.path.join(directory, 'synthetic.sqlite3'))
+    symptoms, diseases, relationships = synthetic_knowledge_base(args.diseases, seed=args.seed)
+    # Strengths as MySQL's FLOAT column holds them; SQLite would keep doubles and break near-ties differently
+    relationships = [(symptom_id, disease_id, np.float32(strength).item())
+                     for symptom_id, disease_id, strength in relationships]
+    connection = storage.connect()
+    connection.executemany("INSERT INTO symptoms (id, name, description) VALUES (?, ?, ?)", symptoms)
+    connection.executemany("INSERT INTO diseases (id, name, description, treatment) VALUES (?, ?, ?, ?)", diseases)
+    connection.executemany(
+        "INSERT INTO symptoms_diseases (symptom_id, disease_id, correlation_strength) VALUES (?, ?, ?)",
+        relationships
+    )
+    connection.commit()
+    connection.close()
+    rng = random.Random(args.seed)
+    names = [name for _, name, _ in symptoms]
+    symptom_sets = [rng.sample(names, rng.randint(1, 4)) for _ in range(args.queries)]
+    failures += check(f"synthetic top_k={args.top_k}", storage, symptom_sets, args.top_k)
+
+    print("FAIL" if failures else "OK: the engine matches the SQL ranking")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+"""Check symptom extraction on everyday sentences that must match nothing and phrasings that must match.
+
+Builds the matcher exactly as the app does (nlp_processor.create_matcher:
+FUZZY_MAX_DISTANCE, SYMPTOM_LEMMATIZER and the dictionary guard on
+spelling correction) over the sample symptoms, then checks that sentences
+about tires, exhaust pipes, hot drinks or the weather find no symptom and
+that inflected or misspelled mentions still find theirs. Exits non-zero
+on any difference. Needs the NLTK data the app loads. Run from the
+repository root:
+
+    python -m benchmarks.check_symptom_matches
+    FUZZY_MAX_DISTANCE=0 python -m benchmarks.check_symptom_matches
+"""
+import sys
+from nlp_processor import FALLBACK_SYMPTOMS, create_matcher
+
+# Words that are, or lemmatize to, near neighbours of a symptom alias
+NON_SYMPTOMS = (
+    "my car tire is flat",
+    "the tires need air",
+    "the exhaust pipe is loud",
+    "I had a cup of hot coffee",
+    "cold weather all week",
+    "I tried the new cafe",
+    "I could not find my keys",
+    "the heat is on"
+)
+
+# (message, symptoms it must find)
+SYMPTOMS = (
+    ("I have been coughing all night", ["cough"]),
+    ("he coughed twice", ["cough"]),
+    ("my joints ache", ["joint pain"]),
+    ("aching joints in the morning", ["joint pain"]),
+    ("I feel tired and exhausted", ["fatigue"]),
+    ("I think I caught a cold", ["cold"]),
+    ("bad headaches and nausea", ["headache", "nausea"]),
+    ("running a high temperature", ["fever"])
+)
+
+# Only with spelling correction (FUZZY_MAX_DISTANCE > 0)
+MISSPELLINGS = (
+    ("hedache since monday", ["headache"]),
+    ("I have diarhea", ["diarrhea"]),
+    ("couhg and fevr", ["fever", "cough"])
+)
+
+def main():
+    matcher = create_matcher(list(FALLBACK_SYMPTOMS))
+    cases = [(message, []) for message in NON_SYMPTOMS] + list(SYMPTOMS)
+    if matcher.fuzzy_index is not None:
+        cases += list(MISSPELLINGS)
+
+    failures = 0
+    for message, expected in cases:
+        found = matcher.find(message)
+        passed = sorted(found) == sorted(expected)
+        failures += not passed
+        print(f"{'ok  ' if passed else 'FAIL'} {message!r}: {', '.join(found) or '-'}"
+              + ("" if passed else f" (expected {', '.join(expected) or 'nothing'})"))
+
+    normalizer = matcher.normalizer.name if matcher.normalizer is not None else 'none'
+    print(f"\n{len(cases)} sentences, lemmatizer: {normalizer}, "
+          f"spelling correction: {'on' if matcher.fuzzy_index is not None else 'off'}, {failures} failed")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+"""Open-loop load generator for POST /api/chat reporting latency percentiles and throughput.
+
+Requests are issued on a fixed schedule at --rps regardless of how fast
+earlier ones complete, and latency is measured from each request's
+scheduled start, so a stalled server shows up as queueing delay rather
+than as a lower send rate. Without --url the Flask app is served
+in-process on an ephemeral port, backed by the SQLite stand-in for MySQL
+and a stubbed Gemini model with --llm-latency. Admission control is off in
+that mode unless --admission applies the CHAT_* settings; shed (429/503) and
+degraded (answered locally) requests are counted apart from errors. Run from
+the repository root:
+
+    python -m benchmarks.load_test --rps 50 --duration 20 --llm-latency 0.2
+    CHAT_MAX_IN_FLIGHT=20 python -m benchmarks.load_test --rps 100 --llm-latency 0.5 --admission
+    python -m benchmarks.load_test --url http://localhost:5000 --rps 20 --duration 60
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks.stubs import FakeDatabase, FakeGeminiModel, synthetic_knowledge_base, synthetic_messages
+
+def percentile(sorted_samples, fraction):
+    if not sorted_samples:
+        return 0.0
+    return sorted_samples[min(int(len(sorted_samples) * fraction), len(sorted_samples) - 1)]
+
+@contextlib.contextmanager
+def local_server(diseases, llm_latency, llm_error_rate, seed, admission=False):
+    """Serve the app in-process against the stubs; yields (base url, symptom rows)"""
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    import app as flask_app
+    from admission import AdmissionController, configure_admission_controller, create_admission_controller
+    from database import ConnectionPool, configure_pool
+    from openai_processor import OpenAIProcessor
+
+    symptoms, disease_rows, relationships = synthetic_knowledge_base(diseases, seed=seed)
+    database = FakeDatabase()
+    database.load(symptoms, disease_rows, relationships)
+    configure_pool(ConnectionPool(database.connect, size=8, max_overflow=8))
+
+    # Every request must reach the stub, so repeated messages are not served from the cache
+    os.environ['RESPONSE_CACHE_BACKEND'] = 'none'
+    model = FakeGeminiModel(latency=llm_latency, error_rate=llm_error_rate, seed=seed)
+    processor = OpenAIProcessor(api_key="stub", model_factory=lambda: model)
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        flask_app.get_knowledge_base().refresh(force=True)
+    flask_app.chatbot = flask_app.MedicalChatbot(openai_processor=processor)
+    configure_admission_controller(create_admission_controller() if admission
+                                   else AdmissionController(user_rate=0, max_in_flight=0))
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server('127.0.0.1', 0, flask_app.app, threaded=True, request_handler=QuietHandler)
+    thread = threading.Thread(target=server.serve_forever, name='load-test-server', daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}", symptoms
+    finally:
+        server.shutdown()
+        flask_app.get_interaction_writer().stop()
+        flask_app.get_knowledge_base().swap(None)
+        database.close()
+
+def send(url, message, user_id, timeout):
+    """POST one chat message; returns 'ok', 'degraded' (answered locally), 'shed' (429/503) or 'error'"""
+    body = json.dumps({"user_id": user_id, "message": message}).encode('utf-8')
+    request = urllib.request.Request(url + '/api/chat', data=body, headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            payload = json.loads(response.read())
+            if response.status != 200 or 'response' not in payload:
+                return 'error'
+            return 'degraded' if payload.get('degraded') else 'ok'
+    except urllib.error.HTTPError as e:
+        return 'shed' if e.code in (429, 503) and e.headers.get('Retry-After') else 'error'
+    except (urllib.error.URLError, OSError, ValueError):
+        return 'error'
+
+def run(url, messages, rps, duration, concurrency, timeout):
+    """Issue rps * duration requests on schedule; returns (latencies of answered requests, outcome counts, wall seconds)"""
+    total = int(rps * duration)
+    latencies = []
+    outcomes = {'ok': 0, 'degraded': 0, 'shed': 0, 'error': 0}
+    lock = threading.Lock()
+
+    def one(i, scheduled):
+        outcome = send(url, messages[i % len(messages)], f"load-{i % 100}", timeout)
+        elapsed = time.perf_counter() - scheduled
+        with lock:
+            outcomes[outcome] += 1
+            if outcome in ('ok', 'degraded'):
+                latencies.append(elapsed)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for i in range(total):
+            scheduled = start + i / rps
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(one, i, scheduled)
+    return sorted(latencies), outcomes, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="Target a running server instead of the in-process stubbed app")
+    parser.add_argument("--rps", type=float, default=50.0, help="Target requests per second")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds of load")
+    parser.add_argument("--concurrency", type=int, default=200, help="Maximum requests in flight")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--diseases", type=int, default=1000, help="Synthetic knowledge-base size (local mode)")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Stubbed Gemini latency in seconds (local mode)")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--admission", action="store_true",
+                        help="Apply the CHAT_* admission control settings (local mode)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write the summary to this file")
+    args = parser.parse_args()
+
+    with contextlib.ExitStack() as stack:
+        if args.url:
+            url = args.url.rstrip('/')
+            symptoms, _, _ = synthetic_knowledge_base(100, seed=args.seed)
+        else:
+            url, symptoms = stack.enter_context(
+                local_server(args.diseases, args.llm_latency, args.llm_error_rate, args.seed, args.admission))
+        messages = synthetic_messages(symptoms, 1000, seed=args.seed)
+
+        # The app prints per request; keep the report readable
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            latencies, outcomes, wall = run(url, messages, args.rps, args.duration, args.concurrency, args.timeout)
+
+    summary = {
+        'target_rps': args.rps,
+        'requests': sum(outcomes.values()),
+        'errors': outcomes['error'],
+        'shed': outcomes['shed'],
+        'degraded': outcomes['degraded'],
+        'throughput_rps': round(len(latencies) / wall, 2),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 1),
+        'max_ms': round(latencies[-1] * 1000, 1) if latencies else 0.0
+    }
+    print(' '.join(f"{key}={value}" for key, value in summary.items()))
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as output:
+            json.dump({'args': vars(args), 'summary': summary}, output, indent=2)
+    return 1 if outcomes['error'] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,307 @@
+"""Local stand-ins for Gemini and MySQL so benchmarks run offline."""
+import asyncio
+import os
+import random
+import sqlite3
+import string
+import tempfile
+import threading
+import time
+from datetime import datetime
+from schema import create_index_statements, create_table_statements
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+class FakeGeminiModel:
+    """Mimics GenerativeModel with a fixed latency, an optional error rate and an optional slow tail
+
+    A fraction slow_rate of calls takes slow_latency instead of latency; set error_rate to 1.0 to
+    simulate an outage and back to 0.0 to end it.
+    """
+    
+    def __init__(self, latency=0.2, error_rate=0.0, text="This is a stubbed Gemini response.", seed=None,
+                 slow_rate=0.0, slow_latency=5.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.text = text
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+    
+    def _maybe_fail(self):
+        with self._lock:
+            failed = self.error_rate and self._random.random() < self.error_rate
+        if failed:
+            raise RuntimeError("stubbed Gemini failure")
+    
+    def _latency(self):
+        """Count the call and pick its latency"""
+        with self._lock:
+            self.calls += 1
+            slow = self.slow_rate and self._random.random() < self.slow_rate
+        return self.slow_latency if slow else self.latency
+    
+    def generate_content(self, prompt, stream=False, **kwargs):
+        if stream:
+            return self._stream()
+        time.sleep(self._latency())
+        self._maybe_fail()
+        return FakeResponse(self.text)
+    
+    def _stream(self):
+        """Spread the latency over word-sized chunks, like a streamed completion"""
+        words = self.text.split(' ')
+        with self._lock:
+            self.calls += 1
+        self._maybe_fail()
+        for i, word in enumerate(words):
+            time.sleep(self.latency / len(words))
+            yield FakeResponse(word if i == 0 else ' ' + word)
+    
+    async def generate_content_async(self, prompt, **kwargs):
+        await asyncio.sleep(self._latency())
+        self._maybe_fail()
+        return FakeResponse(self.text)
+
+class NullCursor:
+    """Cursor that accepts every statement and returns no rows"""
+    
+    lastrowid = None
+    rowcount = 0
+    
+    def execute(self, query, params=None):
+        pass
+    
+    def executemany(self, query, seq_params):
+        pass
+    
+    def fetchall(self):
+        return []
+    
+    def fetchone(self):
+        return None
+    
+    def close(self):
+        pass
+
+class NullConnection:
+    """Connection whose writes go nowhere, for timing everything but MySQL"""
+    
+    in_transaction = False
+    
+    def cursor(self, *args, **kwargs):
+        return NullCursor()
+    
+    def commit(self):
+        pass
+    
+    def rollback(self):
+        pass
+    
+    def is_connected(self):
+        return True
+    
+    def close(self):
+        pass
+
+# DATETIME columns come back as datetime objects, as they do from mysql.connector
+sqlite3.register_converter('DATETIME', lambda value: datetime.fromisoformat(value.decode('utf-8')))
+
+# The application schema in SQLite's spelling, indexes included
+SQLITE_SCHEMA = ';\n'.join(create_table_statements('sqlite') + create_index_statements('sqlite')) + ';\n'
+
+class FakeCursor:
+    """mysql.connector-style cursor over SQLite: %s placeholders, dictionary rows, CHECKSUM TABLE"""
+    
+    def __init__(self, database, connection, dictionary=False):
+        self._database = database
+        self._cursor = connection.cursor()
+        self._dictionary = dictionary
+        self._rows = None
+        self._columns = ()
+        self.rowcount = 0
+        self.lastrowid = None
+    
+    def execute(self, query, params=None):
+        statement = query.strip()
+        if statement.upper().startswith("CHECKSUM TABLE"):
+            # Tables change only through this fake, so a write counter stands in for checksums
+            tables = statement[len("CHECKSUM TABLE"):].split(',')
+            self._rows = [(table.strip(), self._database.version) for table in tables]
+            self._columns = ('Table', 'Checksum')
+            return
+        
+        self._cursor.execute(self._translate(statement), self._adapt(params or ()))
+        self._after(statement)
+    
+    def executemany(self, query, seq_params):
+        statement = query.strip()
+        if not statement.upper().startswith("INSERT"):
+            self._cursor.executemany(self._translate(statement), [self._adapt(params) for params in seq_params])
+            self._after(statement)
+            return
+        
+        # Row by row so lastrowid is the first inserted id, as after a MySQL multi-row INSERT
+        first_id = None
+        for params in seq_params:
+            self._cursor.execute(self._translate(statement), self._adapt(params))
+            if first_id is None:
+                first_id = self._cursor.lastrowid
+        self._after(statement)
+        self.lastrowid = first_id
+    
+    def fetchall(self):
+        rows, self._rows = self._rows or [], None
+        return [self._row(row) for row in rows]
+    
+    def fetchone(self):
+        if not self._rows:
+            return None
+        return self._row(self._rows.pop(0))
+    
+    def close(self):
+        self._cursor.close()
+    
+    def _after(self, statement):
+        self.rowcount = self._cursor.rowcount
+        self.lastrowid = self._cursor.lastrowid
+        if self._cursor.description is not None:
+            self._columns = tuple(column[0] for column in self._cursor.description)
+            self._rows = self._cursor.fetchall()
+        else:
+            self._rows = None
+            self._database.touch()
+    
+    def _row(self, row):
+        return dict(zip(self._columns, row)) if self._dictionary else tuple(row)
+    
+    @staticmethod
+    def _translate(statement):
+        return statement.replace('%s', '?')
+    
+    @staticmethod
+    def _adapt(params):
+        return tuple(value.isoformat(' ') if isinstance(value, datetime) else value for value in params)
+
+class FakeConnection:
+    """One SQLite connection behaving like a pooled mysql.connector connection"""
+    
+    def __init__(self, database):
+        self._database = database
+        self._connection = sqlite3.connect(database.path, timeout=30, check_same_thread=False,
+                                           detect_types=sqlite3.PARSE_DECLTYPES)
+    
+    @property
+    def in_transaction(self):
+        return self._connection.in_transaction
+    
+    def cursor(self, dictionary=False, **kwargs):
+        return FakeCursor(self._database, self._connection, dictionary=dictionary)
+    
+    def commit(self):
+        self._connection.commit()
+    
+    def rollback(self):
+        self._connection.rollback()
+    
+    def is_connected(self):
+        return True
+    
+    def close(self):
+        self._connection.close()
+
+class FakeDatabase:
+    """SQLite file with the application schema; pass `connect` to ConnectionPool"""
+    
+    def __init__(self, path=None):
+        if path is None:
+            handle, path = tempfile.mkstemp(prefix='bench-', suffix='.sqlite3')
+            os.close(handle)
+            self._owned = True
+        else:
+            self._owned = False
+        self.path = path
+        self.version = 0
+        self._lock = threading.Lock()
+        
+        connection = sqlite3.connect(self.path)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(SQLITE_SCHEMA)
+        connection.close()
+    
+    def connect(self):
+        return FakeConnection(self)
+    
+    def touch(self):
+        with self._lock:
+            self.version += 1
+    
+    def load(self, symptoms, diseases, relationships):
+        """Insert rows shaped like synthetic_knowledge_base() output"""
+        connection = sqlite3.connect(self.path)
+        connection.executemany("INSERT INTO symptoms (id, name, description) VALUES (?, ?, ?)", symptoms)
+        connection.executemany("INSERT INTO diseases (id, name, description, treatment) VALUES (?, ?, ?, ?)", diseases)
+        connection.executemany(
+            "INSERT INTO symptoms_diseases (symptom_id, disease_id, correlation_strength) VALUES (?, ?, ?)",
+            relationships
+        )
+        connection.commit()
+        connection.close()
+        self.touch()
+    
+    def close(self):
+        if self._owned:
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(self.path + suffix):
+                    os.remove(self.path + suffix)
+
+def _pseudo_word(rng):
+    return ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 9)))
+
+def synthetic_knowledge_base(diseases, symptoms=None, symptoms_per_disease=8, seed=0):
+    """Deterministic (symptoms, diseases, relationships) rows; the first symptoms are the real common ones"""
+    from nlp_processor import COMMON_SYMPTOMS
+    
+    rng = random.Random(seed)
+    symptoms = symptoms or max(len(COMMON_SYMPTOMS), diseases // 5)
+    
+    names = list(COMMON_SYMPTOMS)[:symptoms]
+    seen = set(names)
+    while len(names) < symptoms:
+        name = ' '.join(_pseudo_word(rng) for _ in range(rng.randint(1, 2)))
+        if name not in seen:
+            seen.add(name)
+            names.append(name)
+    
+    symptom_rows = [(i + 1, name, f"Synthetic symptom {name}") for i, name in enumerate(names)]
+    disease_rows = [
+        (i + 1, f"disease {i + 1}", "Synthetic disease", "Synthetic treatment")
+        for i in range(diseases)
+    ]
+    relationships = []
+    per_disease = min(symptoms_per_disease, symptoms)
+    for disease_id in range(1, diseases + 1):
+        for symptom_id in rng.sample(range(1, symptoms + 1), per_disease):
+            relationships.append((symptom_id, disease_id, round(rng.uniform(0.1, 0.95), 2)))
+    return symptom_rows, disease_rows, relationships
+
+MESSAGE_TEMPLATES = (
+    "I have had {0} and {1} since yesterday",
+    "My {0} is getting worse and now I also have {1} and {2}",
+    "Feeling awful, mostly {0}",
+    "For three days: {0}, {1}, some {2} and a bit of {3}",
+)
+
+def synthetic_messages(symptom_rows, count, seed=0):
+    """Chat messages that mention two to four known symptoms each"""
+    rng = random.Random(seed)
+    names = [row[1] for row in symptom_rows]
+    messages = []
+    for _ in range(count):
+        template = rng.choice(MESSAGE_TEMPLATES)
+        messages.append(template.format(*(rng.choice(names) for _ in range(4))))
+    return messages
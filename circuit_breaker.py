@@ -0,0 +1,78 @@
+import time
+import threading
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+class CircuitBreaker:
+    """Stops calling a failing dependency after repeated failures and lets one probe through per cooldown"""
+    
+    def __init__(self, failure_threshold=5, cooldown=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._clock = clock
+        
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._probe_started = 0.0
+        
+        # Counters
+        self.rejected = 0
+        self.opened = 0
+    
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+    
+    def allow(self):
+        """True if a call may go out now; in half-open state only a single probe is let through"""
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return True
+            # A probe whose outcome was never recorded (e.g. an abandoned stream) is replaced after a cooldown
+            now = self._clock()
+            if state == HALF_OPEN and (not self._probe_in_flight or now - self._probe_started >= self.cooldown):
+                self._state = HALF_OPEN
+                self._probe_in_flight = True
+                self._probe_started = now
+                return True
+            self.rejected += 1
+            return False
+    
+    def record_success(self):
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+    
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            # A failed probe reopens at once; otherwise trip after failure_threshold in a row
+            if self._state == HALF_OPEN or (self._state == CLOSED and self._failures >= self.failure_threshold):
+                self._state = OPEN
+                self._opened_at = self._clock()
+                self._probe_in_flight = False
+                self.opened += 1
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'state': self._current_state(),
+                'consecutive_failures': self._failures,
+                'failure_threshold': self.failure_threshold,
+                'cooldown': self.cooldown,
+                'opened': self.opened,
+                'rejected': self.rejected
+            }
+    
+    def _current_state(self):
+        if self._state == OPEN and self._clock() - self._opened_at >= self.cooldown:
+            return HALF_OPEN
+        return self._state
@@ -0,0 +1,224 @@
+import os
+import time
+import threading
+import itertools
+from collections import OrderedDict, deque
+from storage import StorageUnavailable, get_storage
+from archive import get_archive
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Rough per-turn cost of the dict, deque slot and timestamp on top of the text
+TURN_OVERHEAD_BYTES = 256
+
+def _turn_size(turn):
+    return len(turn['message'] or '') + len(turn['response'] or '') + TURN_OVERHEAD_BYTES
+
+class _UserTurns:
+    __slots__ = ('turns', 'bytes', 'seeded', 'loaded_at', 'version')
+    
+    def __init__(self, maxlen, version):
+        self.turns = deque(maxlen=maxlen)
+        self.bytes = 0
+        # True once loaded from the database, so the buffer holds every recent turn, not just new ones
+        self.seeded = False
+        self.loaded_at = time.monotonic()
+        # Bumped whenever this process appends or writes out a turn for the user
+        self.version = version
+
+class RecentTurnsCache:
+    """Ring buffer of each active user's latest turns, LRU-evicted across users under a global byte cap"""
+    
+    def __init__(self, turns_per_user=20, max_users=10000, max_bytes=64 * 1024 * 1024, ttl=300):
+        self.turns_per_user = turns_per_user
+        self.max_users = max_users
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        
+        self._users = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # Versions are unique across users and entries, so a recreated entry never matches an old one
+        self._versions = itertools.count(1)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def append(self, user_id, turn):
+        """Record a new turn (a dict with id, message, response and timestamp; id may be filled in later)"""
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None:
+                entry = self._users[user_id] = _UserTurns(self.turns_per_user, next(self._versions))
+            else:
+                self._users.move_to_end(user_id)
+                entry.version = next(self._versions)
+            
+            if len(entry.turns) == entry.turns.maxlen:
+                self._discard(entry, entry.turns.popleft())
+            entry.turns.append(turn)
+            size = _turn_size(turn)
+            entry.bytes += size
+            self._bytes += size
+            self._evict()
+    
+    def version(self, user_id):
+        """The user's current version (0 when nothing is buffered), to pass to seed after a database read"""
+        with self._lock:
+            entry = self._users.get(user_id)
+            return entry.version if entry is not None else 0
+    
+    def mark_written(self, user_id):
+        """Note that one of the user's buffered turns reached the database and got its id"""
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is not None:
+                entry.version = next(self._versions)
+    
+    def seed(self, user_id, turns, version):
+        """Replace a user's buffer with their latest turns from the database (newest first)
+
+        Skipped when the user's version moved since the read started, because a turn appended
+        or written out meanwhile may be missing from the rows read.
+        """
+        with self._lock:
+            previous = self._users.get(user_id)
+            if (previous.version if previous is not None else 0) != version:
+                return
+            pending = []
+            if previous is not None:
+                del self._users[user_id]
+                self._bytes -= previous.bytes
+                # Turns still in the write-behind queue are newer than anything read back
+                pending = [turn for turn in previous.turns if turn['id'] is None]
+            
+            entry = self._users[user_id] = _UserTurns(self.turns_per_user, next(self._versions))
+            entry.turns.extend(list(reversed(turns[:self.turns_per_user])) + pending)
+            entry.bytes = sum(_turn_size(turn) for turn in entry.turns)
+            entry.seeded = True
+            self._bytes += entry.bytes
+            self._evict()
+    
+    def get(self, user_id, limit, stale=False):
+        """Return (newest-first turns, next cursor) for the first page, or None when the database must answer
+
+        With stale=True whatever is buffered is returned, however old or incomplete, for use
+        when the database cannot be reached.
+        """
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            # New turns are contiguous, so any buffer answers pages it can fill; a seeded buffer
+            # that never filled up holds the user's whole history and answers every first page
+            complete = entry.seeded and len(entry.turns) < entry.turns.maxlen
+            # Other workers may have written turns for this user since we loaded it
+            expired = time.monotonic() - entry.loaded_at > self.ttl
+            if not stale and (expired or (len(entry.turns) < limit and not complete)):
+                self.misses += 1
+                return None
+            
+            turns = list(entry.turns)[::-1]
+            page = turns[:limit]
+            next_cursor = None
+            if page and (len(turns) > limit or not complete):
+                next_cursor = page[-1]['id']
+                if next_cursor is None:
+                    # The oldest turn on the page is still queued; page on from the newest written turn below it
+                    older = next((turn['id'] for turn in turns[limit:] if turn['id'] is not None), None)
+                    if older is None and not stale:
+                        self.misses += 1
+                        return None
+                    next_cursor = older + 1 if older is not None else None
+            
+            self._users.move_to_end(user_id)
+            self.hits += 1
+            return page, next_cursor
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'users': len(self._users),
+                'max_users': self.max_users,
+                'turns': sum(len(entry.turns) for entry in self._users.values()),
+                'turns_per_user': self.turns_per_user,
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+    
+    def _discard(self, entry, turn):
+        size = _turn_size(turn)
+        entry.bytes -= size
+        self._bytes -= size
+    
+    def _evict(self):
+        while self._users and (len(self._users) > self.max_users or self._bytes > self.max_bytes):
+            _, entry = self._users.popitem(last=False)
+            self._bytes -= entry.bytes
+            self.evictions += 1
+
+def fetch_turns(user_id, limit, before_id=None):
+    """Newest-first turns older than before_id, read with a keyset seek on (user_id, id)
+
+    A page the database cannot fill continues into months retention.py has archived.
+    """
+    turns = get_storage().fetch_turns(user_id, limit, before_id)
+    archive = get_archive()
+    if archive is not None and len(turns) < limit:
+        older_than = turns[-1]['id'] if turns else before_id
+        turns += archive.fetch_turns(user_id, limit - len(turns), older_than)
+    return turns
+
+def get_history(user_id, limit=20, before_id=None):
+    """One page of a user's turns, newest first; returns (turns, next_cursor, source)"""
+    history_cache = get_history_cache()
+    
+    if before_id is None:
+        cached = history_cache.get(user_id, limit)
+        if cached is not None:
+            turns, next_cursor = cached
+            return turns, next_cursor, 'cache'
+    
+    # One extra row tells whether another page exists without a COUNT(*)
+    fetch_limit = max(limit, history_cache.turns_per_user) if before_id is None else limit
+    version = history_cache.version(user_id)
+    try:
+        turns = fetch_turns(user_id, fetch_limit + 1, before_id)
+    except StorageUnavailable:
+        cached = history_cache.get(user_id, limit, stale=True) if before_id is None else None
+        if cached is None:
+            raise
+        turns, next_cursor = cached
+        return turns, next_cursor, 'cache'
+    has_older = len(turns) > fetch_limit
+    turns = turns[:fetch_limit]
+    if before_id is None:
+        history_cache.seed(user_id, turns, version)
+    
+    page = turns[:limit]
+    more = has_older or len(turns) > limit
+    return page, page[-1]['id'] if more and page else None, 'database'
+
+_history_cache = None
+_history_cache_lock = threading.Lock()
+
+def get_history_cache():
+    """Return the process-wide recent-turns cache, configured from the environment"""
+    global _history_cache
+    if _history_cache is None:
+        with _history_cache_lock:
+            if _history_cache is None:
+                _history_cache = RecentTurnsCache(
+                    turns_per_user=int(os.getenv('HISTORY_CACHE_TURNS', '20')),
+                    max_users=int(os.getenv('HISTORY_CACHE_MAX_USERS', '10000')),
+                    max_bytes=int(os.getenv('HISTORY_CACHE_MAX_BYTES', str(64 * 1024 * 1024))),
+                    ttl=float(os.getenv('HISTORY_CACHE_TTL', '300'))
+                )
+    return _history_cache
@@ -1,30 +1,278 @@
 import os
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
 import mysql.connector
 from mysql.connector import Error
+from mysql.connector.errors import PoolError
 from dotenv import load_dotenv
+from metrics import record_stage
+from schema import create_table_statements
 
 # Load environment variables
 load_dotenv()
 
+def _connection_params(with_database=True):
+    """Build MySQL connection parameters from the environment"""
+    connection_params = {
+        'host': os.getenv('MYSQL_HOST', 'localhost'),
+        'user': os.getenv('MYSQL_USER', 'root'),
+        'password': os.getenv('MYSQL_PASSWORD', '')
+    }
+    
+    # Only add database parameter if requested
+    if with_database:
+        connection_params['database'] = os.getenv('MYSQL_DATABASE', 'medical_chatbot')
+    
+    return connection_params
+
 def create_db_connection(with_database=True):
     """Create database connection to MySQL"""
     try:
-        connection_params = {
-            'host': os.getenv('MYSQL_HOST', 'localhost'),
-            'user': os.getenv('MYSQL_USER', 'root'),
-            'password': os.getenv('MYSQL_PASSWORD', '')
-        }
-        
-        # Only add database parameter if requested
-        if with_database:
-            connection_params['database'] = os.getenv('MYSQL_DATABASE', 'medical_chatbot')
-            
-        connection = mysql.connector.connect(**connection_params)
+        connection = mysql.connector.connect(**_connection_params(with_database))
         return connection
     except Error as e:
         print(f"Error connecting to MySQL: {e}")
         return None
 
+class PoolTimeoutError(PoolError):
+    """Raised when no pooled connection becomes available within the checkout timeout"""
+
+class ConnectionPool:
+    """Thread-safe pool of MySQL connections shared by every request"""
+    
+    def __init__(self, connect, size=5, max_overflow=10, timeout=10.0, recycle=3600, pre_ping=True):
+        self._connect = connect
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+        
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._idle = deque()  # (connection, created_at), most recently used on the right
+        self._created_at = {}
+        self._open = 0
+        self._in_use = 0
+        
+        # Counters for sizing the pool
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._max_wait_time = 0.0
+        self._timeouts = 0
+        self._connect_errors = 0
+        self._recycled = 0
+        self._failed_pings = 0
+    
+    def acquire(self):
+        """Borrow a connection, waiting up to the checkout timeout for one to free up"""
+        start = time.monotonic()
+        deadline = start + self.timeout
+        waited = False
+        
+        with self._available:
+            while True:
+                if self._idle:
+                    connection, created_at = self._idle.pop()
+                    break
+                if self._open < self.size + self.max_overflow:
+                    # Reserve a slot and open the connection outside the lock
+                    self._open += 1
+                    connection, created_at = None, None
+                    break
+                
+                waited = True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    self._record_wait(time.monotonic() - start)
+                    raise PoolTimeoutError(
+                        f"No MySQL connection available after {self.timeout}s "
+                        f"(size={self.size}, max_overflow={self.max_overflow})"
+                    )
+                self._available.wait(remaining)
+            
+            self._in_use += 1
+            self._checkouts += 1
+            if waited:
+                self._record_wait(time.monotonic() - start)
+        
+        try:
+            if connection is not None:
+                connection = self._validate(connection, created_at)
+            if connection is None:
+                connection = self._connect()
+                created_at = time.monotonic()
+        except Exception:
+            with self._available:
+                self._open -= 1
+                self._in_use -= 1
+                self._connect_errors += 1
+                self._available.notify()
+            raise
+        
+        self._created_at[id(connection)] = created_at
+        return connection
+    
+    def release(self, connection):
+        """Return a borrowed connection to the pool"""
+        created_at = self._created_at.pop(id(connection), time.monotonic())
+        reusable = True
+        
+        try:
+            # Never hand out a connection with a half-finished transaction
+            if connection.in_transaction:
+                connection.rollback()
+        except Exception:
+            reusable = False
+        
+        with self._available:
+            self._in_use -= 1
+            if reusable and self._open <= self.size:
+                self._idle.append((connection, created_at))
+                connection = None
+            else:
+                # Overflow connections are closed instead of being kept idle
+                self._open -= 1
+            self._available.notify()
+        
+        if connection is not None:
+            self._close(connection)
+    
+    def dispose(self):
+        """Close all idle connections"""
+        with self._available:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._open -= len(idle)
+            self._available.notify_all()
+        
+        for connection, _ in idle:
+            self._close(connection)
+    
+    def stats(self):
+        """Return a snapshot of pool usage counters"""
+        with self._lock:
+            return {
+                'size': self.size,
+                'max_overflow': self.max_overflow,
+                'open': self._open,
+                'idle': len(self._idle),
+                'in_use': self._in_use,
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'wait_time_total': round(self._wait_time, 6),
+                'wait_time_max': round(self._max_wait_time, 6),
+                'timeouts': self._timeouts,
+                'connect_errors': self._connect_errors,
+                'recycled': self._recycled,
+                'failed_pings': self._failed_pings
+            }
+    
+    def _validate(self, connection, created_at):
+        """Return the connection if it is still usable, otherwise close it and return None"""
+        if self.recycle and time.monotonic() - created_at > self.recycle:
+            with self._lock:
+                self._recycled += 1
+            self._close(connection)
+            return None
+        
+        if self.pre_ping:
+            try:
+                alive = connection.is_connected()
+            except Exception:
+                alive = False
+            if not alive:
+                with self._lock:
+                    self._failed_pings += 1
+                self._close(connection)
+                return None
+        
+        return connection
+    
+    def _record_wait(self, elapsed):
+        self._waits += 1
+        self._wait_time += elapsed
+        self._max_wait_time = max(self._max_wait_time, elapsed)
+    
+    @staticmethod
+    def _close(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _env_bool(name, default):
+    return os.getenv(name, str(default)).strip().lower() in ('1', 'true', 'yes', 'on')
+
+def get_pool():
+    """Return the process-wide connection pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                params = _connection_params()
+                _pool = ConnectionPool(
+                    connect=lambda: mysql.connector.connect(**params),
+                    size=int(os.getenv('MYSQL_POOL_SIZE', '5')),
+                    max_overflow=int(os.getenv('MYSQL_POOL_MAX_OVERFLOW', '10')),
+                    timeout=float(os.getenv('MYSQL_POOL_TIMEOUT', '10')),
+                    recycle=float(os.getenv('MYSQL_POOL_RECYCLE', '3600')),
+                    pre_ping=_env_bool('MYSQL_POOL_PRE_PING', True)
+                )
+    return _pool
+
+def _forget_pool_after_fork():
+    # The child must not reuse (or close) the parent's sockets; it opens its own on first use
+    global _pool, _pool_lock
+    _pool = None
+    _pool_lock = threading.Lock()
+
+os.register_at_fork(after_in_child=_forget_pool_after_fork)
+
+def configure_pool(pool):
+    """Replace the process-wide pool (e.g. with a differently sized one)"""
+    global _pool
+    with _pool_lock:
+        previous, _pool = _pool, pool
+    if previous is not None:
+        previous.dispose()
+
+def pool_stats():
+    """Return usage counters of the process-wide pool"""
+    return get_pool().stats()
+
+@contextmanager
+def db_connection(pool=None):
+    """Borrow a pooled database connection (from the process-wide pool by default); yields None when MySQL is unreachable"""
+    pool = pool or get_pool()
+    start = time.perf_counter()
+    try:
+        connection = pool.acquire()
+    except PoolTimeoutError:
+        raise
+    except Error as e:
+        print(f"Error connecting to MySQL: {e}")
+        connection = None
+    finally:
+        # Pool wait plus any new connection handshake
+        record_stage('db_connect', time.perf_counter() - start)
+    
+    if connection is None:
+        yield None
+        return
+    
+    try:
+        yield connection
+    finally:
+        pool.release(connection)
+
 def setup_database():
     """Set up the database and tables"""
     try:
@@ -34,69 +282,42 @@ def setup_database():
             print("Failed to connect to MySQL server")
             return
             
-        cursor = connection.cursor()
-        
-        # Create database
-        cursor.execute("CREATE DATABASE IF NOT EXISTS medical_chatbot")
-        cursor.execute("USE medical_chatbot")
-        
-        # Create symptoms table
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS symptoms (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            name VARCHAR(255) NOT NULL,
-            description TEXT
-        )
-        """)
-        
-        # Create diseases table
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS diseases (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            name VARCHAR(255) NOT NULL,
-            description TEXT,
-            treatment TEXT
-        )
-        """)
-        
-        # Create symptoms_diseases relationship table
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS symptoms_diseases (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            symptom_id INT,
-            disease_id INT,
-            correlation_strength FLOAT,
-            FOREIGN KEY (symptom_id) REFERENCES symptoms(id),
-            FOREIGN KEY (disease_id) REFERENCES diseases(id)
-        )
-        """)
-        
-        # Create user_interactions table to store chat history
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS user_interactions (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            user_id VARCHAR(255),
-            message TEXT,
-            response TEXT,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-        """)
-        
-        connection.commit()
-        cursor.close()
-        connection.close()
+        try:
+            cursor = connection.cursor()
+            
+            # Create database
+            cursor.execute("CREATE DATABASE IF NOT EXISTS medical_chatbot")
+            cursor.execute("USE medical_chatbot")
+            
+            # Tables from the schema shared with the SQLite backend
+            for statement in create_table_statements('mysql'):
+                cursor.execute(statement)
+            
+            connection.commit()
+            cursor.close()
+            
+            # Indexes and constraints are managed as versioned migrations
+            # (imported here because migrations imports this module)
+            from migrations import apply_migrations
+            apply_migrations(connection)
+        finally:
+            connection.close()
+        
         print("Database setup complete")
     except Error as e:
         print(f"Error setting up database: {e}")
 
 def populate_sample_data():
-    """Populate the database with sample data"""
-    connection = create_db_connection()
+    """Populate the configured storage backend with sample data"""
+    # Imported here: kb_importer's CLI and storage import this module
+    from kb_importer import KnowledgeBaseImporter
+    from storage import get_storage
+    
+    storage = get_storage()
+    connection = storage.connect()
     if connection is None:
         return
     
-    cursor = connection.cursor()
-    
     # Sample symptoms
     symptoms = [
         ("fever", "Elevated body temperature above the normal range"),
@@ -118,59 +339,50 @@ def populate_sample_data():
         ("Bronchitis", "Inflammation of the lining of bronchial tubes", "Rest, fluids, symptom relief medications")
     ]
     
-    # Insert symptoms
-    cursor.executemany("INSERT INTO symptoms (name, description) VALUES (%s, %s)", symptoms)
-    
-    # Insert diseases
-    cursor.executemany("INSERT INTO diseases (name, description, treatment) VALUES (%s, %s, %s)", diseases)
-    
-    # Get symptom and disease IDs for relationships
-    cursor.execute("SELECT id, name FROM symptoms")
-    symptoms_map = {name: id for id, name in cursor.fetchall()}
-    
-    cursor.execute("SELECT id, name FROM diseases")
-    diseases_map = {name: id for id, name in cursor.fetchall()}
-    
-    # Define symptom-disease relationships with correlation strength (0-1)
+    # Symptom-disease relationships by name with correlation strength (0-1)
     relationships = [
         # Common Cold symptoms
-        (symptoms_map["fever"], diseases_map["Common Cold"], 0.6),
-        (symptoms_map["cough"], diseases_map["Common Cold"], 0.8),
-        (symptoms_map["sore throat"], diseases_map["Common Cold"], 0.7),
-        (symptoms_map["headache"], diseases_map["Common Cold"], 0.5),
-        (symptoms_map["fatigue"], diseases_map["Common Cold"], 0.6),
+        ("fever", "Common Cold", 0.6),
+        ("cough", "Common Cold", 0.8),
+        ("sore throat", "Common Cold", 0.7),
+        ("headache", "Common Cold", 0.5),
+        ("fatigue", "Common Cold", 0.6),
         
         # Influenza symptoms
-        (symptoms_map["fever"], diseases_map["Influenza"], 0.9),
-        (symptoms_map["cough"], diseases_map["Influenza"], 0.7),
-        (symptoms_map["fatigue"], diseases_map["Influenza"], 0.9),
-        (symptoms_map["headache"], diseases_map["Influenza"], 0.7),
-        (symptoms_map["sore throat"], diseases_map["Influenza"], 0.5),
+        ("fever", "Influenza", 0.9),
+        ("cough", "Influenza", 0.7),
+        ("fatigue", "Influenza", 0.9),
+        ("headache", "Influenza", 0.7),
+        ("sore throat", "Influenza", 0.5),
         
         # COVID-19 symptoms
-        (symptoms_map["fever"], diseases_map["COVID-19"], 0.8),
-        (symptoms_map["cough"], diseases_map["COVID-19"], 0.9),
-        (symptoms_map["fatigue"], diseases_map["COVID-19"], 0.8),
-        (symptoms_map["shortness of breath"], diseases_map["COVID-19"], 0.7),
+        ("fever", "COVID-19", 0.8),
+        ("cough", "COVID-19", 0.9),
+        ("fatigue", "COVID-19", 0.8),
+        ("shortness of breath", "COVID-19", 0.7),
         
         # Pneumonia symptoms
-        (symptoms_map["fever"], diseases_map["Pneumonia"], 0.8),
-        (symptoms_map["cough"], diseases_map["Pneumonia"], 0.9),
-        (symptoms_map["shortness of breath"], diseases_map["Pneumonia"], 0.9),
-        (symptoms_map["chest pain"], diseases_map["Pneumonia"], 0.7),
-        (symptoms_map["fatigue"], diseases_map["Pneumonia"], 0.7),
+        ("fever", "Pneumonia", 0.8),
+        ("cough", "Pneumonia", 0.9),
+        ("shortness of breath", "Pneumonia", 0.9),
+        ("chest pain", "Pneumonia", 0.7),
+        ("fatigue", "Pneumonia", 0.7),
         
         # Bronchitis symptoms
-        (symptoms_map["cough"], diseases_map["Bronchitis"], 0.9),
-        (symptoms_map["shortness of breath"], diseases_map["Bronchitis"], 0.7),
-        (symptoms_map["chest pain"], diseases_map["Bronchitis"], 0.6),
-        (symptoms_map["fatigue"], diseases_map["Bronchitis"], 0.5)
+        ("cough", "Bronchitis", 0.9),
+        ("shortness of breath", "Bronchitis", 0.7),
+        ("chest pain", "Bronchitis", 0.6),
+        ("fatigue", "Bronchitis", 0.5)
     ]
     
-    # Insert relationships
-    cursor.executemany("INSERT INTO symptoms_diseases (symptom_id, disease_id, correlation_strength) VALUES (%s, %s, %s)", relationships)
-    
-    connection.commit()
-    cursor.close()
-    connection.close()
+    # Upsert by name, so running this again updates the rows instead of duplicating them
+    try:
+        importer = KnowledgeBaseImporter(connection, progress_interval=0, dialect=storage.dialect)
+        importer.import_symptoms({'name': name, 'description': description} for name, description in symptoms)
+        importer.import_diseases({'name': name, 'description': description, 'treatment': treatment}
+                                 for name, description, treatment in diseases)
+        importer.import_relationships({'symptom': symptom, 'disease': disease, 'correlation_strength': strength}
+                                      for symptom, disease, strength in relationships)
+    finally:
+        connection.close()
     print("Sample data populated")
@@ -1,9 +1,14 @@
+import os
 from nlp_processor import NLPProcessor
-from database import create_db_connection
+from storage import StorageUnavailable, get_storage
+from knowledge_base import current_snapshot
+from metrics import count_error, stage
 
 class MedicalDiagnosisSystem:
-    def __init__(self):
+    def __init__(self, top_k=None):
         self.nlp_processor = NLPProcessor()
+        # Maximum number of diagnoses returned per message (0 returns every match)
+        self.top_k = top_k if top_k is not None else int(os.getenv('DIAGNOSIS_TOP_K', '0'))
     
     def get_possible_diagnoses(self, symptoms):
         """Get possible diagnoses based on symptoms"""
@@ -26,67 +31,76 @@ class MedicalDiagnosisSystem:
             }
         ]
         
+        snapshot = current_snapshot()
+        if snapshot is not None:
+            return self._score_from_snapshot(snapshot, symptoms)
+        
         try:
-            connection = create_db_connection()
-            if connection is None:
-                # If symptoms contain fever and (cough or sore throat), return flu
-                if 'fever' in symptoms and ('cough' in symptoms or 'sore throat' in symptoms):
-                    return fallback_diagnoses
-                return []
-            
-            cursor = connection.cursor()
-            
-            # Convert symptoms to IDs
-            symptom_ids = []
-            for symptom in symptoms:
-                cursor.execute("SELECT id FROM symptoms WHERE name = %s", (symptom,))
-                result = cursor.fetchone()
-                if result:
-                    symptom_ids.append(result[0])
-            
-            if not symptom_ids:
-                cursor.close()
-                connection.close()
-                return []
-            
-            # Query for diseases related to these symptoms
-            placeholders = ','.join(['%s'] * len(symptom_ids))
-            query = f"""
-            SELECT d.id, d.name, d.description, d.treatment, 
-                   SUM(sd.correlation_strength) as total_correlation,
-                   COUNT(sd.symptom_id) as matching_symptoms,
-                   (SELECT COUNT(*) FROM symptoms_diseases WHERE disease_id = d.id) as total_symptoms
-            FROM diseases d
-            JOIN symptoms_diseases sd ON d.id = sd.disease_id
-            WHERE sd.symptom_id IN ({placeholders})
-            GROUP BY d.id
-            ORDER BY total_correlation DESC, matching_symptoms DESC
-            """
-            
-            cursor.execute(query, tuple(symptom_ids))
-            results = cursor.fetchall()
-            
-            diagnoses = []
-            for result in results:
-                disease_id, name, description, treatment, correlation, matching, total = result
-                
-                # Calculate confidence based on correlation and symptom coverage
-                symptom_coverage = matching / total if total > 0 else 0
-                confidence = (correlation * 0.7 + symptom_coverage * 0.3) * 100
-                
-                diagnoses.append({
-                    'disease': name,
-                    'description': description,
-                    'treatment': treatment,
-                    'confidence': min(round(confidence, 2), 95.0)  # Cap at 95% to acknowledge uncertainty
-                })
-            
-            cursor.close()
-            connection.close()
-            return diagnoses
+            with stage('db_query'):
+                results = get_storage().rank_diseases(symptoms, self.top_k)
+        except StorageUnavailable:
+            # If symptoms contain fever and (cough or sore throat), return flu
+            if 'fever' in symptoms and ('cough' in symptoms or 'sore throat' in symptoms):
+                return fallback_diagnoses
+            return []
         except Exception as e:
             print(f"Error in get_possible_diagnoses: {e}")
+            count_error('diagnosis')
             # Return fallback diagnoses if there's an error
             if 'fever' in symptoms:
                 return fallback_diagnoses
             return []
+        
+        diagnoses = []
+        for result in results:
+            disease_id, name, description, treatment, correlation, matching, total = result
+            
+            # Calculate confidence based on correlation and symptom coverage
+            symptom_coverage = matching / total if total > 0 else 0
+            confidence = (correlation * 0.7 + symptom_coverage * 0.3) * 100
+            
+            diagnoses.append({
+                'disease': name,
+                'description': description,
+                'treatment': treatment,
+                'confidence': min(round(confidence, 2), 95.0)  # Cap at 95% to acknowledge uncertainty
+            })
+        
+        return diagnoses
+    
+    def get_possible_diagnoses_batch(self, symptom_lists):
+        """Diagnoses for many symptom lists in input order, scored with one matrix product when a snapshot is loaded"""
+        snapshot = current_snapshot()
+        if snapshot is None:
+            return [self.get_possible_diagnoses(symptoms) for symptoms in symptom_lists]
+        
+        symptom_id_sets = [self._snapshot_symptom_ids(snapshot, symptoms) for symptoms in symptom_lists]
+        ranked_lists = snapshot.scoring_engine.score_batch(symptom_id_sets, top_k=self.top_k)
+        return [self._format_ranked(snapshot, ranked) for ranked in ranked_lists]
+    
+    def _score_from_snapshot(self, snapshot, symptoms):
+        """Score diseases with the snapshot's vectorized engine, mirroring the SQL ranking"""
+        symptom_ids = self._snapshot_symptom_ids(snapshot, symptoms)
+        return self._format_ranked(snapshot, snapshot.scoring_engine.score(symptom_ids, top_k=self.top_k))
+    
+    @staticmethod
+    def _snapshot_symptom_ids(snapshot, symptoms):
+        return [
+            snapshot.symptom_ids[symptom.lower()]
+            for symptom in symptoms
+            if symptom.lower() in snapshot.symptom_ids
+        ]
+    
+    @staticmethod
+    def _format_ranked(snapshot, ranked):
+        diagnoses = []
+        for disease_id, _, _, _, confidence in ranked:
+            name, description, treatment = snapshot.diseases[disease_id]
+            diagnoses.append({
+                'disease': name,
+                'description': description,
+                'treatment': treatment,
+                'confidence': confidence
+            })
+        
+        return diagnoses
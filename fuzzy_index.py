@@ -0,0 +1,158 @@
+import re
+import string
+
+# Misspellings are corrected only when both the token and the vocabulary word are at least this long;
+# three-letter words sit within one edit of too many ordinary ones ("hot"/"not")
+MIN_WORD_LENGTH = 4
+
+_WORD = re.compile(r'[a-z]+')
+
+# Lookups remembered per index; messages repeat the same ordinary words
+LOOKUP_CACHE_SIZE = 10000
+
+def edit_distance(a, b, max_distance):
+    """Optimal string alignment distance (adjacent transpositions count once), or max_distance + 1 beyond it"""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+
+    previous_row = None
+    row = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        before, previous_row, row = previous_row, row, [i] + [0] * len(b)
+        row_min = i
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(previous_row[j] + 1, row[j - 1] + 1, previous_row[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                value = min(value, before[j - 2] + 1)
+            row[j] = value
+            row_min = min(row_min, value)
+        if row_min > max_distance:
+            return max_distance + 1
+    return row[-1] if row[-1] <= max_distance else max_distance + 1
+
+def _deletes(word, max_distance):
+    """word and every string obtained by deleting up to max_distance characters"""
+    results = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        frontier = {candidate[:i] + candidate[i + 1:] for candidate in frontier for i in range(len(candidate))}
+        results |= frontier
+    return results
+
+def _edits1(word):
+    """Every string one deletion, transposition, substitution or insertion away from word"""
+    splits = [(word[:i], word[i:]) for i in range(len(word) + 1)]
+    deletes = [left + right[1:] for left, right in splits if right]
+    transposes = [left + right[1] + right[0] + right[2:] for left, right in splits if len(right) > 1]
+    replaces = [left + char + right[1:] for left, right in splits if right for char in string.ascii_lowercase]
+    inserts = [left + char + right for left, right in splits for char in string.ascii_lowercase]
+    return set(deletes + transposes + replaces + inserts)
+
+class FuzzyIndex:
+    """Symmetric-delete spelling index (SymSpell): maps typos to vocabulary words without scanning the vocabulary
+
+    Every vocabulary word is stored under each string reachable by deleting up to max_distance
+    characters from its first prefix_length characters. A lookup generates the same deletes of the
+    token, so it touches a few dozen dictionary keys whatever the vocabulary size, and only the
+    words found there are compared with edit_distance.
+
+    With a dictionary (a set of ordinary words), a token is only corrected when it is closer to a
+    vocabulary word than to any other dictionary word: a token that is itself a word ("could") or
+    lies one edit from one is left alone. The token's own neighbours are only looked up in the set;
+    is_word, a slower check that also knows inflections ("tried"), runs once on the token itself.
+    """
+
+    def __init__(self, words, max_distance=2, prefix_length=7, min_length=MIN_WORD_LENGTH,
+                 dictionary=None, is_word=None):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.min_length = min_length
+        self.dictionary = dictionary
+        self.is_word = is_word
+        self.words = []
+        self._known = set()
+        # delete string -> word index, or a tuple of indexes when several words share it
+        self._deletes = {}
+        self._cache = {}
+
+        for word in words:
+            word = word.lower()
+            if word in self._known:
+                continue
+            self._known.add(word)
+            if len(word) < min_length or not word.isalpha():
+                continue
+            index = len(self.words)
+            self.words.append(word)
+            for delete in _deletes(word[:prefix_length], max_distance):
+                existing = self._deletes.get(delete)
+                if existing is None:
+                    self._deletes[delete] = index
+                elif isinstance(existing, tuple):
+                    self._deletes[delete] = existing + (index,)
+                else:
+                    self._deletes[delete] = (existing, index)
+
+    def __len__(self):
+        return len(self.words)
+
+    @property
+    def entry_count(self):
+        return len(self._deletes)
+
+    def clear_cache(self):
+        self._cache.clear()
+
+    def allowed_distance(self, token):
+        """Edits tolerated for a token: one up to six characters, then max_distance"""
+        return min(self.max_distance, 1) if len(token) <= 6 else self.max_distance
+
+    def _near_dictionary_word(self, token):
+        """True when token, or a string one edit from it, is a dictionary word outside the vocabulary"""
+        dictionary, known = self.dictionary, self._known
+        if token in dictionary or (self.is_word is not None and self.is_word(token)):
+            return True
+        return any(candidate in dictionary and candidate not in known for candidate in _edits1(token))
+
+    def lookup(self, token):
+        """Return (closest vocabulary word, distance) for a token, or None when nothing is close enough"""
+        token = token.lower()
+        if token in self._known:
+            return token, 0
+        if len(token) < self.min_length:
+            return None
+        if token in self._cache:
+            return self._cache[token]
+
+        max_distance = self.allowed_distance(token)
+        best = None
+        seen = set()
+        for delete in _deletes(token[:self.prefix_length], max_distance):
+            entry = self._deletes.get(delete)
+            if entry is None:
+                continue
+            for index in (entry if isinstance(entry, tuple) else (entry,)):
+                if index in seen:
+                    continue
+                seen.add(index)
+                word = self.words[index]
+                distance = edit_distance(token, word, max_distance)
+                # Closest word wins; ties go to the word listed first in the vocabulary
+                if distance <= max_distance and (best is None or (distance, index) < best):
+                    best = (distance, index)
+        result = None if best is None else (self.words[best[1]], best[0])
+        if result is not None and self.dictionary is not None and self._near_dictionary_word(token):
+            # An ordinary word is at least as close as the symptom word ("tried" is not "tired")
+            result = None
+        if len(self._cache) >= LOOKUP_CACHE_SIZE:
+            self._cache.clear()
+        self._cache[token] = result
+        return result
+
+    def correct(self, text):
+        """Lowercased text with misspelled words replaced by their closest vocabulary word"""
+        def replace(match):
+            result = self.lookup(match.group())
+            return result[0] if result is not None else match.group()
+        return _WORD.sub(replace, text.lower())
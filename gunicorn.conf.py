@@ -0,0 +1,25 @@
+"""gunicorn settings for wsgi:application; every value can be overridden from the environment.
+
+    gunicorn -c gunicorn.conf.py wsgi:application
+"""
+import os
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('WEB_CONCURRENCY', '4'))
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+
+# Every chat request holds a thread here, so admission control keeps two free to answer overflow at once
+if not os.getenv('CHAT_MAX_IN_FLIGHT'):
+    os.environ['CHAT_MAX_IN_FLIGHT'] = str(max(1, threads - 2))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+
+# Warm up once in the master and fork the workers from it, instead of every worker loading its own copy
+preload_app = os.getenv('GUNICORN_PRELOAD', 'true').lower() in ('1', 'true', 'yes', 'on')
+
+# Recycle workers periodically; new ones are forked from the warmed master, so this stays cheap
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '0'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '0'))
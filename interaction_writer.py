@@ -0,0 +1,320 @@
+import os
+import json
+import time
+import fcntl
+import atexit
+import threading
+import itertools
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from storage import get_storage
+from metrics import count_error, record_stage
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+OVERFLOW_POLICIES = ('block', 'drop', 'spill')
+
+@contextmanager
+def _file_lock(path, blocking=True):
+    """Hold an flock on path so worker processes sharing a spill file take turns; yields False if busy"""
+    with open(path, 'a') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+class InteractionWriter:
+    """Write-behind queue that batches user_interactions inserts on a background thread"""
+    
+    # Seconds to wait before retrying a failed replay of the spill file
+    REPLAY_RETRY_INTERVAL = 30.0
+    
+    def __init__(self, batch_size=100, flush_interval=1.0, max_queue=10000,
+                 overflow_policy='block', block_timeout=5.0, spill_path='interactions_spill.jsonl'):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow_policy must be one of {OVERFLOW_POLICIES}, got {overflow_policy!r}")
+        
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.overflow_policy = overflow_policy
+        self.block_timeout = block_timeout
+        self.spill_path = spill_path
+        
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._idle = threading.Condition(self._lock)
+        self._spill_lock = threading.Lock()
+        # on_written callbacks of spilled rows, by spill token, run when this process replays them
+        self._spill_callbacks = {}
+        self._spill_tokens = itertools.count()
+        self._thread = None
+        self._stopping = False
+        self._flushing = False
+        self._flush_requested = False
+        self._next_replay = 0.0
+        
+        # Counters
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.replayed = 0
+        self.flushes = 0
+        self.flush_errors = 0
+        self.last_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+        self._total_flush_latency = 0.0
+    
+    def enqueue(self, user_id, message, response, timestamp=None, on_written=None):
+        """Buffer one interaction; returns False if it was dropped
+
+        on_written(row_id) is called from the writer thread once the row is in the database.
+        """
+        row = (user_id, message, response, timestamp or datetime.now().replace(microsecond=0))
+        spill = False
+        
+        with self._lock:
+            self._ensure_started()
+            
+            if len(self._queue) >= self.max_queue:
+                if self.overflow_policy == 'block':
+                    deadline = time.monotonic() + self.block_timeout
+                    while len(self._queue) >= self.max_queue:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.dropped += 1
+                            return False
+                        self._not_full.wait(remaining)
+                elif self.overflow_policy == 'drop':
+                    self.dropped += 1
+                    return False
+                else:
+                    spill = True
+            
+            if not spill:
+                self._queue.append((row, on_written))
+                self.enqueued += 1
+                if len(self._queue) >= self.batch_size:
+                    self._not_empty.notify()
+                return True
+        
+        # Spill outside the queue lock so file I/O never blocks other producers
+        self._spill([(row, on_written)])
+        return True
+    
+    def flush(self, timeout=30.0):
+        """Write everything buffered so far and wait for it to reach the database"""
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            if self._thread is None:
+                return
+            self._flush_requested = True
+            self._not_empty.notify()
+            while (self._queue or self._flushing) and time.monotonic() < deadline:
+                self._idle.wait(deadline - time.monotonic())
+    
+    def stop(self, timeout=30.0):
+        """Flush the queue and stop the background thread"""
+        self.flush(timeout)
+        with self._lock:
+            self._stopping = True
+            self._not_empty.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        with self._lock:
+            self._thread = None
+            self._stopping = False
+    
+    def stats(self):
+        """Queue depth and flush counters"""
+        with self._lock:
+            return {
+                'queue_depth': len(self._queue),
+                'max_queue': self.max_queue,
+                'overflow_policy': self.overflow_policy,
+                'enqueued': self.enqueued,
+                'written': self.written,
+                'dropped': self.dropped,
+                'spilled': self.spilled,
+                'replayed': self.replayed,
+                'flushes': self.flushes,
+                'flush_errors': self.flush_errors,
+                'last_flush_latency': round(self.last_flush_latency, 6),
+                'max_flush_latency': round(self.max_flush_latency, 6),
+                'avg_flush_latency': round(self._total_flush_latency / self.flushes, 6) if self.flushes else 0.0
+            }
+    
+    def _ensure_started(self):
+        # Started on first use so a pre-fork master never owns the thread
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='interaction-writer', daemon=True)
+            self._thread.start()
+    
+    def _run(self):
+        while True:
+            with self._lock:
+                deadline = time.monotonic() + self.flush_interval
+                while (len(self._queue) < self.batch_size and not self._flush_requested
+                       and not self._stopping):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._not_empty.wait(remaining)
+                
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                if not self._queue:
+                    self._flush_requested = False
+                stopping = self._stopping and not self._queue
+                self._flushing = bool(batch)
+                self._not_full.notify_all()
+            
+            if batch:
+                self._write(batch)
+            elif time.monotonic() >= self._next_replay and (
+                    os.path.exists(self.spill_path) or os.path.exists(self.spill_path + '.replay')):
+                try:
+                    self._replay_spill()
+                except Exception as e:
+                    print(f"Error replaying spilled interactions: {e}")
+                    with self._lock:
+                        self.flush_errors += 1
+                    self._next_replay = time.monotonic() + self.REPLAY_RETRY_INTERVAL
+            
+            with self._lock:
+                self._flushing = False
+                if not self._queue:
+                    self._idle.notify_all()
+            if stopping and not batch:
+                return
+    
+    def _write(self, batch):
+        rows = [row for row, _ in batch]
+        start = time.monotonic()
+        try:
+            ids = self._insert(rows)
+        except Exception as e:
+            print(f"Error flushing {len(rows)} interactions: {e}")
+            count_error('interaction_flush')
+            with self._lock:
+                self.flush_errors += 1
+            # Keep the rows on disk so they are retried once the database is back
+            self._spill(batch)
+            return
+        
+        elapsed = time.monotonic() - start
+        record_stage('interaction_flush', elapsed)
+        with self._lock:
+            self.written += len(batch)
+            self.flushes += 1
+            self.last_flush_latency = elapsed
+            self.max_flush_latency = max(self.max_flush_latency, elapsed)
+            self._total_flush_latency += elapsed
+        
+        self._notify_written(ids, [on_written for _, on_written in batch])
+    
+    def _notify_written(self, ids, callbacks):
+        for row_id, on_written in zip(ids or (), callbacks):
+            if on_written is not None and row_id is not None:
+                try:
+                    on_written(row_id)
+                except Exception as e:
+                    print(f"Error in interaction write callback: {e}")
+    
+    def _insert(self, batch):
+        # Raises StorageUnavailable (a ConnectionError) when the database is unreachable
+        return get_storage().insert_interactions(batch)
+    
+    def _spill(self, batch):
+        """Append (row, on_written) pairs to the spill file shared by every worker process"""
+        with self._spill_lock, _file_lock(self.spill_path + '.lock'):
+            with open(self.spill_path, 'a', encoding='utf-8') as spill_file:
+                for (user_id, message, response, timestamp), on_written in batch:
+                    record = {
+                        'user_id': user_id,
+                        'message': message,
+                        'response': response,
+                        'timestamp': timestamp.isoformat()
+                    }
+                    if on_written is not None:
+                        record['token'] = f"{os.getpid()}:{next(self._spill_tokens)}"
+                        self._spill_callbacks[record['token']] = on_written
+                    spill_file.write(json.dumps(record) + '\n')
+            # Rows replayed by another worker never claim theirs, so keep only the newest
+            while len(self._spill_callbacks) > self.max_queue:
+                self._spill_callbacks.pop(next(iter(self._spill_callbacks)))
+        with self._lock:
+            self.spilled += len(batch)
+    
+    def _replay_spill(self):
+        """Move spilled rows into the database in batches (at-least-once: a failed replay is retried whole)
+
+        One process replays at a time; the others skip until the replay file is gone.
+        """
+        replay_path = self.spill_path + '.replay'
+        with _file_lock(replay_path + '.lock', blocking=False) as acquired:
+            if not acquired:
+                return
+            with self._spill_lock, _file_lock(self.spill_path + '.lock'):
+                if not os.path.exists(replay_path):
+                    if not os.path.exists(self.spill_path):
+                        return
+                    os.replace(self.spill_path, replay_path)
+            
+            replayed = 0
+            with open(replay_path, encoding='utf-8') as replay_file:
+                batch, tokens = [], []
+                for line in replay_file:
+                    record = json.loads(line)
+                    batch.append((record['user_id'], record['message'], record['response'],
+                                  datetime.fromisoformat(record['timestamp'])))
+                    tokens.append(record.get('token'))
+                    if len(batch) >= self.batch_size:
+                        self._replay_batch(batch, tokens)
+                        replayed += len(batch)
+                        batch, tokens = [], []
+                if batch:
+                    self._replay_batch(batch, tokens)
+                    replayed += len(batch)
+            
+            os.remove(replay_path)
+        with self._lock:
+            self.replayed += replayed
+    
+    def _replay_batch(self, batch, tokens):
+        ids = self._insert(batch)
+        # Rows spilled by another worker have no callback here
+        with self._spill_lock:
+            callbacks = [self._spill_callbacks.pop(token, None) for token in tokens]
+        self._notify_written(ids, callbacks)
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def get_interaction_writer():
+    """Return the process-wide interaction writer, creating it from the environment on first use"""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = InteractionWriter(
+                    batch_size=int(os.getenv('INTERACTION_BATCH_SIZE', '100')),
+                    flush_interval=float(os.getenv('INTERACTION_FLUSH_INTERVAL', '1.0')),
+                    max_queue=int(os.getenv('INTERACTION_MAX_QUEUE', '10000')),
+                    overflow_policy=os.getenv('INTERACTION_OVERFLOW_POLICY', 'block'),
+                    block_timeout=float(os.getenv('INTERACTION_BLOCK_TIMEOUT', '5.0')),
+                    spill_path=os.getenv('INTERACTION_SPILL_PATH', 'interactions_spill.jsonl')
+                )
+                atexit.register(_writer.stop)
+    return _writer
@@ -0,0 +1,319 @@
+"""Stream symptoms, diseases and symptom-disease relationships from CSV/JSONL into the database.
+
+Rows are upserted in chunks, one transaction per chunk, so re-running an
+import updates rows in place instead of duplicating them. Files may be
+gzip-compressed (.csv.gz, .jsonl.gz). Example:
+
+    python kb_importer.py --symptoms symptoms.csv --diseases diseases.jsonl \\
+        --relationships relationships.csv.gz --chunk-size 5000
+
+Columns: symptoms (name, description), diseases (name, description,
+treatment), relationships (symptom, disease, correlation_strength), with
+names matched case-insensitively. The target is the configured storage
+backend: MySQL, or the SQLite file with STORAGE_BACKEND=sqlite.
+"""
+import os
+import io
+import csv
+import sys
+import gzip
+import json
+import time
+import argparse
+from itertools import islice
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Empty descriptions in a later file keep the stored text
+UPSERT_SYMPTOMS = (
+    "INSERT INTO symptoms (name, description) VALUES (%s, %s) "
+    "ON DUPLICATE KEY UPDATE description = COALESCE(VALUES(description), description)"
+)
+UPSERT_DISEASES = (
+    "INSERT INTO diseases (name, description, treatment) VALUES (%s, %s, %s) "
+    "ON DUPLICATE KEY UPDATE description = COALESCE(VALUES(description), description), "
+    "treatment = COALESCE(VALUES(treatment), treatment)"
+)
+UPSERT_RELATIONSHIPS = (
+    "INSERT INTO symptoms_diseases (symptom_id, disease_id, correlation_strength) VALUES (%s, %s, %s) "
+    "ON DUPLICATE KEY UPDATE correlation_strength = VALUES(correlation_strength)"
+)
+INSERT_MISSING = {
+    'symptoms': "INSERT INTO symptoms (name) VALUES (%s) ON DUPLICATE KEY UPDATE id = id",
+    'diseases': "INSERT INTO diseases (name) VALUES (%s) ON DUPLICATE KEY UPDATE id = id"
+}
+
+# SQLite spells the upserts with ON CONFLICT; other statements only need ? placeholders
+SQLITE_STATEMENTS = {
+    UPSERT_SYMPTOMS: (
+        "INSERT INTO symptoms (name, description) VALUES (?, ?) "
+        "ON CONFLICT (name) DO UPDATE SET description = COALESCE(excluded.description, description)"
+    ),
+    UPSERT_DISEASES: (
+        "INSERT INTO diseases (name, description, treatment) VALUES (?, ?, ?) "
+        "ON CONFLICT (name) DO UPDATE SET description = COALESCE(excluded.description, description), "
+        "treatment = COALESCE(excluded.treatment, treatment)"
+    ),
+    UPSERT_RELATIONSHIPS: (
+        "INSERT INTO symptoms_diseases (symptom_id, disease_id, correlation_strength) VALUES (?, ?, ?) "
+        "ON CONFLICT (symptom_id, disease_id) DO UPDATE SET correlation_strength = excluded.correlation_strength"
+    ),
+    INSERT_MISSING['symptoms']: "INSERT INTO symptoms (name) VALUES (?) ON CONFLICT (name) DO NOTHING",
+    INSERT_MISSING['diseases']: "INSERT INTO diseases (name) VALUES (?) ON CONFLICT (name) DO NOTHING"
+}
+
+# Names per SELECT ... WHERE name IN (...) when resolving ids
+LOOKUP_BATCH = 1000
+
+def read_records(path, file_format=None):
+    """Yield one dict per CSV row or JSON line without loading the file; '-' reads stdin"""
+    if file_format is None:
+        base = path[:-3] if path.endswith('.gz') else path
+        file_format = 'csv' if base.endswith('.csv') else 'jsonl'
+    
+    if path == '-':
+        stream = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
+    elif path.endswith('.gz'):
+        stream = gzip.open(path, 'rt', encoding='utf-8', newline='')
+    else:
+        stream = open(path, encoding='utf-8', newline='')
+    
+    try:
+        if file_format == 'csv':
+            yield from csv.DictReader(stream)
+        else:
+            for line in stream:
+                if line.strip():
+                    yield json.loads(line)
+    finally:
+        if path != '-':
+            stream.close()
+
+def _chunks(records, size):
+    iterator = iter(records)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def _text(value):
+    """Strip strings; empty values become NULL"""
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+class ImportStats:
+    """Row counters and throughput for one table"""
+    
+    def __init__(self, table):
+        self.table = table
+        self.read = 0
+        self.upserted = 0
+        self.skipped = 0
+        self.chunks = 0
+        self.started = time.monotonic()
+    
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+    
+    @property
+    def rows_per_second(self):
+        return self.read / self.elapsed if self.elapsed > 0 else 0.0
+    
+    def summary(self):
+        return (f"{self.table}: {self.read} rows read, {self.upserted} upserted, {self.skipped} skipped "
+                f"in {self.elapsed:.1f}s ({self.rows_per_second:.0f} rows/s)")
+
+class KnowledgeBaseImporter:
+    """Chunked, idempotent upserts into the knowledge-base tables over one connection"""
+    
+    def __init__(self, connection, chunk_size=1000, create_missing=False, progress_interval=5.0, dialect='mysql'):
+        self.connection = connection
+        self.dialect = dialect
+        self.chunk_size = chunk_size
+        # Create symptoms/diseases named by relationships but absent from the tables
+        self.create_missing = create_missing
+        self.progress_interval = progress_interval
+        
+        # Lowercased name -> id, filled as chunks are written; grows with the vocabulary, not the file
+        self.symptom_ids = {}
+        self.disease_ids = {}
+    
+    def _sql(self, statement):
+        if self.dialect == 'sqlite':
+            return SQLITE_STATEMENTS.get(statement) or statement.replace('%s', '?')
+        return statement
+    
+    def import_symptoms(self, records):
+        """Upsert {'name', 'description'} records"""
+        return self._import_named('symptoms', records, self.symptom_ids, UPSERT_SYMPTOMS,
+                                  lambda record, name: (name, _text(record.get('description'))))
+    
+    def import_diseases(self, records):
+        """Upsert {'name', 'description', 'treatment'} records"""
+        return self._import_named('diseases', records, self.disease_ids, UPSERT_DISEASES,
+                                  lambda record, name: (name, _text(record.get('description')),
+                                                        _text(record.get('treatment'))))
+    
+    def import_relationships(self, records):
+        """Upsert {'symptom', 'disease', 'correlation_strength'} records, resolving names to ids"""
+        stats = ImportStats('symptoms_diseases')
+        next_report = time.monotonic() + self.progress_interval
+        
+        for chunk in _chunks(records, self.chunk_size):
+            stats.read += len(chunk)
+            parsed = []
+            for record in chunk:
+                symptom = _text(record.get('symptom'))
+                disease = _text(record.get('disease'))
+                try:
+                    strength = float(record.get('correlation_strength'))
+                except (TypeError, ValueError):
+                    strength = None
+                if not symptom or not disease or strength is None or not 0.0 <= strength <= 1.0:
+                    stats.skipped += 1
+                    continue
+                parsed.append((symptom, disease, strength))
+            
+            cursor = self.connection.cursor()
+            try:
+                self._resolve(cursor, 'symptoms', {symptom for symptom, _, _ in parsed}, self.symptom_ids)
+                self._resolve(cursor, 'diseases', {disease for _, disease, _ in parsed}, self.disease_ids)
+                
+                # The last row wins when a pair repeats within a chunk
+                rows = {}
+                for symptom, disease, strength in parsed:
+                    symptom_id = self.symptom_ids.get(symptom.lower())
+                    disease_id = self.disease_ids.get(disease.lower())
+                    if symptom_id is None or disease_id is None:
+                        stats.skipped += 1
+                        continue
+                    rows[(symptom_id, disease_id)] = (symptom_id, disease_id, strength)
+                
+                if rows:
+                    cursor.executemany(self._sql(UPSERT_RELATIONSHIPS), list(rows.values()))
+                self.connection.commit()
+            except Exception:
+                self.connection.rollback()
+                raise
+            finally:
+                cursor.close()
+            
+            stats.upserted += len(rows)
+            stats.chunks += 1
+            next_report = self._report(stats, next_report)
+        
+        return stats
+    
+    def _import_named(self, table, records, id_map, upsert, to_row):
+        stats = ImportStats(table)
+        next_report = time.monotonic() + self.progress_interval
+        
+        for chunk in _chunks(records, self.chunk_size):
+            stats.read += len(chunk)
+            rows = {}
+            for record in chunk:
+                name = _text(record.get('name'))
+                if not name:
+                    stats.skipped += 1
+                    continue
+                rows[name.lower()] = to_row(record, name)
+            
+            cursor = self.connection.cursor()
+            try:
+                if rows:
+                    cursor.executemany(self._sql(upsert), list(rows.values()))
+                self._lookup(cursor, table, [row[0] for key, row in rows.items() if key not in id_map], id_map)
+                self.connection.commit()
+            except Exception:
+                self.connection.rollback()
+                raise
+            finally:
+                cursor.close()
+            
+            stats.upserted += len(rows)
+            stats.chunks += 1
+            next_report = self._report(stats, next_report)
+        
+        return stats
+    
+    def _resolve(self, cursor, table, names, id_map):
+        """Make sure every name in the chunk has an id, creating rows when create_missing is set"""
+        unknown = [name for name in names if name.lower() not in id_map]
+        self._lookup(cursor, table, unknown, id_map)
+        
+        missing = [name for name in unknown if name.lower() not in id_map]
+        if missing and self.create_missing:
+            cursor.executemany(self._sql(INSERT_MISSING[table]), [(name,) for name in missing])
+            self._lookup(cursor, table, missing, id_map)
+    
+    def _lookup(self, cursor, table, names, id_map):
+        for start in range(0, len(names), LOOKUP_BATCH):
+            batch = names[start:start + LOOKUP_BATCH]
+            placeholders = ','.join(['%s'] * len(batch))
+            cursor.execute(self._sql(f"SELECT id, name FROM {table} WHERE name IN ({placeholders})"), tuple(batch))
+            for row_id, name in cursor.fetchall():
+                id_map[name.lower()] = row_id
+    
+    def _report(self, stats, next_report):
+        if self.progress_interval and time.monotonic() >= next_report:
+            print(f"  {stats.table}: {stats.read} rows ({stats.rows_per_second:.0f} rows/s)")
+            return time.monotonic() + self.progress_interval
+        return next_report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--symptoms", help="CSV/JSONL file of symptoms")
+    parser.add_argument("--diseases", help="CSV/JSONL file of diseases")
+    parser.add_argument("--relationships", help="CSV/JSONL file of symptom-disease relationships")
+    parser.add_argument("--format", choices=('csv', 'jsonl'), help="Input format (default: from the file extension)")
+    parser.add_argument("--chunk-size", type=int, default=int(os.getenv('KB_IMPORT_CHUNK_SIZE', '1000')),
+                        help="Rows per upsert transaction")
+    parser.add_argument("--create-missing", action="store_true",
+                        help="Create symptoms and diseases that relationships name but the tables lack")
+    parser.add_argument("--progress-interval", type=float, default=5.0, help="Seconds between progress lines")
+    args = parser.parse_args()
+    
+    if not (args.symptoms or args.diseases or args.relationships):
+        parser.error("nothing to import: pass --symptoms, --diseases and/or --relationships")
+    
+    from migrations import apply_migrations
+    from storage import get_storage
+    
+    storage = get_storage()
+    connection = storage.connect()
+    if connection is None:
+        print("Failed to connect to the database")
+        return 1
+    
+    try:
+        # Upserts rely on the unique name and pair keys (SQLite creates them with the schema)
+        if storage.dialect == 'mysql':
+            apply_migrations(connection)
+        
+        importer = KnowledgeBaseImporter(connection, chunk_size=args.chunk_size,
+                                         create_missing=args.create_missing,
+                                         progress_interval=args.progress_interval,
+                                         dialect=storage.dialect)
+        for path, load in ((args.symptoms, importer.import_symptoms),
+                           (args.diseases, importer.import_diseases),
+                           (args.relationships, importer.import_relationships)):
+            if path:
+                print(f"Importing {path}")
+                print(load(read_records(path, args.format)).summary())
+    except Exception as e:
+        print(f"Import failed (committed chunks are kept; re-running is safe): {e}")
+        return 1
+    finally:
+        connection.close()
+    
+    print("Import complete; reload running servers with POST /api/admin/knowledge-base/reload")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+import os
+import time
+import threading
+from types import MappingProxyType
+from storage import StorageUnavailable, get_storage
+from scoring_engine import DiagnosisScoringEngine
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+class KnowledgeBaseSnapshot:
+    """Immutable in-memory copy of the symptoms, diseases and symptoms_diseases tables"""
+    
+    def __init__(self, version, symptoms, diseases, relationships):
+        self.version = version
+        self.loaded_at = time.time()
+        
+        # Symptoms in id order; names resolve to the lowest id like the old per-name lookup
+        self.symptom_rows = tuple(tuple(row) for row in symptoms)
+        self.symptom_names = tuple(name for _, name, _ in symptoms)
+        symptom_ids = {}
+        for symptom_id, name, _ in symptoms:
+            symptom_ids.setdefault(name.lower(), symptom_id)
+        self.symptom_ids = MappingProxyType(symptom_ids)
+        self.symptom_descriptions = MappingProxyType({
+            symptom_id: description for symptom_id, _, description in symptoms
+        })
+        
+        # disease id -> (name, description, treatment)
+        self.diseases = MappingProxyType({
+            disease_id: (name, description, treatment)
+            for disease_id, name, description, treatment in diseases
+        })
+        
+        disease_symptom_counts = {}
+        for _, disease_id, _ in relationships:
+            disease_symptom_counts[disease_id] = disease_symptom_counts.get(disease_id, 0) + 1
+        self.disease_symptom_counts = MappingProxyType(disease_symptom_counts)
+        
+        # Sparse symptom -> disease relationships used to score diagnoses
+        self.scoring_engine = DiagnosisScoringEngine(
+            [symptom_id for symptom_id, _, _ in symptoms],
+            [disease_id for disease_id, _, _, _ in diseases],
+            relationships
+        )
+        self.relationship_count = len(relationships)
+    
+    def __setattr__(self, name, value):
+        if name in self.__dict__:
+            raise AttributeError(f"KnowledgeBaseSnapshot is immutable; cannot reassign {name}")
+        super().__setattr__(name, value)
+    
+    def summary(self):
+        """Return a small description of the snapshot for admin endpoints"""
+        return {
+            'version': self.version,
+            'loaded_at': self.loaded_at,
+            'symptoms': len(self.symptom_names),
+            'diseases': len(self.diseases),
+            'relationships': self.relationship_count
+        }
+
+class KnowledgeBase:
+    """Holds the current snapshot and refreshes it when the underlying tables change"""
+    
+    def __init__(self, refresh_interval=300):
+        self.refresh_interval = refresh_interval
+        self._snapshot = None
+        self._reload_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._thread_pid = None
+        self._thread_lock = threading.Lock()
+    
+    @property
+    def snapshot(self):
+        """The current snapshot, or None if none could be loaded yet"""
+        return self._snapshot
+    
+    def refresh(self, force=False):
+        """Reload the snapshot if the tables changed (or always when forced); returns True on swap"""
+        with self._reload_lock:
+            storage = get_storage()
+            try:
+                version = storage.knowledge_base_version()
+                current = self._snapshot
+                if not force and current is not None and current.version == version:
+                    return False
+                
+                snapshot = KnowledgeBaseSnapshot(version, *storage.load_knowledge_base())
+            except StorageUnavailable:
+                return False
+            except Exception as e:
+                print(f"Error loading knowledge base: {e}")
+                return False
+            
+            self.swap(snapshot)
+            print(f"Knowledge base loaded (version {version}, "
+                  f"{len(snapshot.symptom_names)} symptoms, {len(snapshot.diseases)} diseases)")
+            return True
+    
+    def swap(self, snapshot):
+        """Install a snapshot as the current one"""
+        # Single reference assignment, so readers see either the old or the new snapshot
+        self._snapshot = snapshot
+    
+    def start(self):
+        """Load the initial snapshot unless one is loaded and start the background refresh thread"""
+        if self._snapshot is None:
+            self.refresh(force=True)
+        self.ensure_refreshing()
+    
+    def ensure_refreshing(self):
+        """Start the refresh thread in this process if it is not running there yet"""
+        # Threads do not survive fork, so a worker forked from a pre-loaded master starts its own
+        pid = os.getpid()
+        if self.refresh_interval <= 0 or (self._thread is not None and self._thread_pid == pid):
+            return
+        
+        with self._thread_lock:
+            if self._thread is None or self._thread_pid != pid:
+                self._stop_event = threading.Event()
+                self._thread = threading.Thread(target=self._refresh_loop, name='knowledge-base-refresh', daemon=True)
+                self._thread_pid = pid
+                self._thread.start()
+    
+    def stop(self):
+        """Stop the background refresh thread"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+    
+    def _refresh_loop(self):
+        while not self._stop_event.wait(self.refresh_interval):
+            self.refresh()
+
+_knowledge_base = KnowledgeBase(
+    refresh_interval=float(os.getenv('KNOWLEDGE_BASE_REFRESH_INTERVAL', '300'))
+)
+
+def get_knowledge_base():
+    """Return the process-wide knowledge base"""
+    return _knowledge_base
+
+def current_snapshot():
+    """Return the current knowledge-base snapshot, or None if it has not been loaded"""
+    return _knowledge_base.snapshot
@@ -0,0 +1,277 @@
+import os
+import re
+import json
+import time
+import uuid
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Seconds; spans in-process stages (sub-millisecond) up to slow Gemini calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Tokens per Gemini prompt or response
+TOKEN_BUCKETS = (32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+_VALID_REQUEST_ID = re.compile(r'^[A-Za-z0-9._-]{1,128}$')
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """Monotonic counter, optionally split by labels"""
+    
+    type_name = 'counter'
+    
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name if name.endswith('_total') else name + '_total'
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+    
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+    
+    def value(self, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0)
+    
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield self.name, dict(zip(self.labelnames, key)), value
+
+class Histogram:
+    """Fixed-bucket histogram: one bisect and a few additions per observation"""
+    
+    type_name = 'histogram'
+    
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+    
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket counts (last slot is +Inf), sum, count
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+    
+    def samples(self):
+        with self._lock:
+            series_items = [(key, list(counts), total, count) for key, (counts, total, count) in self._series.items()]
+        for key, counts, total, count in sorted(series_items):
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                yield self.name + '_bucket', {**labels, 'le': _format_value(float(bound))}, cumulative
+            yield self.name + '_sum', labels, total
+            yield self.name + '_count', labels, count
+
+class Registry:
+    """Metrics rendered at /metrics, plus collectors that read other components' counters on demand"""
+    
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+    
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+    
+    def add_collector(self, collector):
+        """collector() returns an iterable of (name, type, help, [(labels, value), ...])"""
+        with self._lock:
+            self._collectors.append(collector)
+    
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        with self._lock:
+            metrics = list(self._metrics)
+            collectors = list(self._collectors)
+        
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        
+        for collector in collectors:
+            try:
+                families = list(collector())
+            except Exception as e:
+                print(f"Error collecting metrics: {e}")
+                continue
+            for name, type_name, documentation, samples in families:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {type_name}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'chatbot_stage_seconds', 'Time spent in each request stage', ('stage',)))
+STAGE_ERRORS = REGISTRY.register(Counter(
+    'chatbot_stage_errors', 'Errors caught per stage', ('stage',)))
+LLM_FALLBACKS = REGISTRY.register(Counter(
+    'chatbot_llm_fallbacks', 'Responses built locally instead of by Gemini', ('reason',)))
+LLM_EXTRA_ATTEMPTS = REGISTRY.register(Counter(
+    'chatbot_llm_extra_attempts', 'Gemini calls beyond the first per response', ('kind',)))
+LLM_TOKENS = REGISTRY.register(Histogram(
+    'chatbot_llm_tokens', 'Prompt and response tokens per Gemini call', ('kind',), buckets=TOKEN_BUCKETS))
+ADMISSION_REFUSALS = REGISTRY.register(Counter(
+    'chatbot_admission_refusals', 'Chat requests shed or answered locally by admission control', ('outcome', 'reason')))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'chatbot_request_seconds', 'Request latency until the response headers', ('endpoint', 'status')))
+
+class RequestTrace:
+    """Per-request stage breakdown; stages that run more than once are summed"""
+    
+    def __init__(self, request_id=None, endpoint=''):
+        valid = request_id and _VALID_REQUEST_ID.match(request_id)
+        self.request_id = request_id if valid else uuid.uuid4().hex
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.tokens = {}
+        self._lock = threading.Lock()
+    
+    def add(self, stage_name, seconds):
+        # Batch requests record stages from several worker threads
+        with self._lock:
+            self.stages[stage_name] = self.stages.get(stage_name, 0.0) + seconds
+    
+    def add_tokens(self, kind, count):
+        with self._lock:
+            self.tokens[kind] = self.tokens.get(kind, 0) + count
+    
+    def elapsed(self):
+        return time.perf_counter() - self.started
+    
+    def server_timing(self):
+        """Stage breakdown as a Server-Timing header value (milliseconds)"""
+        with self._lock:
+            stages = list(self.stages.items())
+        return ', '.join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in stages)
+
+_current_trace = contextvars.ContextVar('request_trace', default=None)
+
+def start_trace(request_id=None, endpoint=''):
+    """Begin tracing the current request; returns (trace, token for end_trace)"""
+    trace = RequestTrace(request_id, endpoint)
+    return trace, _current_trace.set(trace)
+
+def end_trace(token):
+    try:
+        _current_trace.reset(token)
+    except ValueError:
+        # Streamed responses finish in a different context than the one that started the trace
+        _current_trace.set(None)
+
+def current_trace():
+    """The trace of the request being handled, or None outside a request"""
+    return _current_trace.get()
+
+def record_stage(stage_name, seconds):
+    """Record a stage duration measured by the caller"""
+    STAGE_SECONDS.observe(seconds, stage=stage_name)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(stage_name, seconds)
+
+@contextmanager
+def stage(stage_name):
+    """Time the enclosed block as one stage; exceptions escaping it are counted as stage errors"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=stage_name)
+        raise
+    finally:
+        record_stage(stage_name, time.perf_counter() - start)
+
+def count_error(stage_name):
+    """Count an error that the stage caught and recovered from"""
+    STAGE_ERRORS.inc(stage=stage_name)
+
+def count_fallback(reason):
+    LLM_FALLBACKS.inc(reason=reason)
+
+def count_extra_attempt(kind):
+    """Count a Gemini retry or hedged request"""
+    LLM_EXTRA_ATTEMPTS.inc(kind=kind)
+
+def count_admission(outcome, reason):
+    """Count a chat request that admission control shed or degraded"""
+    ADMISSION_REFUSALS.inc(outcome=outcome, reason=reason)
+
+def record_tokens(prompt_tokens, response_tokens):
+    """Record the token counts of one Gemini response, per call and on the current request"""
+    trace = _current_trace.get()
+    for kind, count in (('prompt', prompt_tokens), ('response', response_tokens)):
+        LLM_TOKENS.observe(count, kind=kind)
+        if trace is not None:
+            trace.add_tokens(kind, count)
+
+def stage_timing_header_enabled():
+    return os.getenv('STAGE_TIMING_HEADER', 'false').lower() in ('1', 'true', 'yes', 'on')
+
+def finish_request(trace, status):
+    """Record the request latency and log it when it exceeds SLOW_REQUEST_THRESHOLD_MS"""
+    elapsed = trace.elapsed()
+    REQUEST_SECONDS.observe(elapsed, endpoint=trace.endpoint, status=str(status))
+    
+    threshold_ms = float(os.getenv('SLOW_REQUEST_THRESHOLD_MS', '2000'))
+    if threshold_ms > 0 and elapsed * 1000 >= threshold_ms:
+        with trace._lock:
+            stages = {name: round(seconds * 1000, 2) for name, seconds in trace.stages.items()}
+            tokens = dict(trace.tokens)
+        # One JSON object per line so log shippers can parse it
+        print(json.dumps({
+            'event': 'slow_request',
+            'request_id': trace.request_id,
+            'endpoint': trace.endpoint,
+            'status': status,
+            'duration_ms': round(elapsed * 1000, 2),
+            'threshold_ms': threshold_ms,
+            'stages_ms': stages,
+            'llm_tokens': tokens
+        }))
+    return elapsed
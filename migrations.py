@@ -0,0 +1,169 @@
+"""Versioned schema migrations for the medical chatbot database.
+
+Each migration runs once; applied versions are recorded in the
+schema_migrations table. Apply pending migrations with:
+
+    python migrations.py
+"""
+import os
+import sys
+from datetime import date
+from mysql.connector import Error
+from database import create_db_connection
+
+def _partition_user_interactions(cursor):
+    """Range-partition user_interactions by month so retention.py can drop expired months whole"""
+    from retention import add_months, month_partitions, month_start
+    
+    cursor.execute("SELECT MIN(timestamp) FROM user_interactions")
+    oldest = cursor.fetchall()[0][0]
+    first = month_start(oldest or date.today())
+    months_ahead = int(os.getenv('INTERACTION_PARTITIONS_AHEAD', '3'))
+    
+    # The partitioning column must be in every unique key and cannot be NULL; undated rows
+    # land in the oldest partition
+    cursor.execute("UPDATE user_interactions SET timestamp = '1970-01-01' WHERE timestamp IS NULL")
+    cursor.execute("""
+    ALTER TABLE user_interactions
+        MODIFY timestamp DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        DROP PRIMARY KEY,
+        ADD PRIMARY KEY (id, timestamp)
+    """)
+    cursor.execute(
+        "ALTER TABLE user_interactions PARTITION BY RANGE COLUMNS(timestamp) (\n    "
+        f"{month_partitions(first, add_months(month_start(date.today()), months_ahead + 1))}\n)"
+    )
+
+# (version, name, statements); append new migrations, never edit applied ones.
+# A statement may be a function of the cursor for steps that depend on the data.
+MIGRATIONS = [
+    (1, 'knowledge_base_and_interaction_indexes', [
+        # Name lookups used to resolve detected symptoms and diseases
+        "CREATE INDEX idx_symptoms_name ON symptoms (name)",
+        "CREATE INDEX idx_diseases_name ON diseases (name)",
+        
+        # Keep the oldest copy of duplicated symptom/disease pairs before enforcing uniqueness
+        """
+        DELETE sd FROM symptoms_diseases sd
+        JOIN symptoms_diseases keep
+          ON keep.symptom_id = sd.symptom_id
+         AND keep.disease_id = sd.disease_id
+         AND keep.id < sd.id
+        """,
+        """
+        ALTER TABLE symptoms_diseases
+            ADD UNIQUE KEY uq_symptoms_diseases_pair (symptom_id, disease_id),
+            ADD KEY idx_symptoms_diseases_disease (disease_id, symptom_id)
+        """,
+        
+        # Per-user history in time order
+        "CREATE INDEX idx_user_interactions_user_timestamp ON user_interactions (user_id, timestamp)"
+    ]),
+    (2, 'user_interactions_history_keyset', [
+        # Keyset pagination of /api/history: WHERE user_id = ? AND id < ? ORDER BY id DESC
+        "CREATE INDEX idx_user_interactions_user_id ON user_interactions (user_id, id)"
+    ]),
+    (3, 'unique_knowledge_base_names', [
+        # Point relationships of duplicated symptom/disease names at the oldest copy; IGNORE leaves
+        # rows whose pair already exists for the keeper, and those are deleted with the duplicates
+        """
+        UPDATE IGNORE symptoms_diseases sd
+        JOIN symptoms dup ON dup.id = sd.symptom_id
+        JOIN (SELECT name, MIN(id) AS keep_id FROM symptoms GROUP BY name) keep
+          ON keep.name = dup.name AND keep.keep_id <> dup.id
+        SET sd.symptom_id = keep.keep_id
+        """,
+        """
+        UPDATE IGNORE symptoms_diseases sd
+        JOIN diseases dup ON dup.id = sd.disease_id
+        JOIN (SELECT name, MIN(id) AS keep_id FROM diseases GROUP BY name) keep
+          ON keep.name = dup.name AND keep.keep_id <> dup.id
+        SET sd.disease_id = keep.keep_id
+        """,
+        """
+        DELETE sd FROM symptoms_diseases sd
+        JOIN symptoms dup ON dup.id = sd.symptom_id
+        JOIN symptoms keep ON keep.name = dup.name AND keep.id < dup.id
+        """,
+        """
+        DELETE sd FROM symptoms_diseases sd
+        JOIN diseases dup ON dup.id = sd.disease_id
+        JOIN diseases keep ON keep.name = dup.name AND keep.id < dup.id
+        """,
+        "DELETE dup FROM symptoms dup JOIN symptoms keep ON keep.name = dup.name AND keep.id < dup.id",
+        "DELETE dup FROM diseases dup JOIN diseases keep ON keep.name = dup.name AND keep.id < dup.id",
+        
+        # kb_importer.py and populate_sample_data upsert by name
+        "ALTER TABLE symptoms DROP INDEX idx_symptoms_name, ADD UNIQUE KEY uq_symptoms_name (name)",
+        "ALTER TABLE diseases DROP INDEX idx_diseases_name, ADD UNIQUE KEY uq_diseases_name (name)"
+    ]),
+    (4, 'user_interactions_monthly_partitions', [
+        _partition_user_interactions
+    ]),
+]
+
+def _ensure_migrations_table(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INT PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+def applied_versions(connection):
+    """Return the set of migration versions already applied"""
+    cursor = connection.cursor()
+    _ensure_migrations_table(cursor)
+    cursor.execute("SELECT version FROM schema_migrations")
+    versions = {row[0] for row in cursor.fetchall()}
+    cursor.close()
+    return versions
+
+def apply_migrations(connection):
+    """Apply every pending migration in version order; returns the versions applied"""
+    done = applied_versions(connection)
+    applied = []
+    
+    cursor = connection.cursor()
+    for version, name, statements in MIGRATIONS:
+        if version in done:
+            continue
+        
+        print(f"Applying migration {version}: {name}")
+        # MySQL commits DDL implicitly, so a failure here needs manual cleanup before re-running
+        for statement in statements:
+            if callable(statement):
+                statement(cursor)
+            else:
+                cursor.execute(statement)
+        cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+        connection.commit()
+        applied.append(version)
+    
+    cursor.close()
+    return applied
+
+def main():
+    connection = create_db_connection()
+    if connection is None:
+        print("Failed to connect to MySQL server")
+        return 1
+    
+    try:
+        if '--status' in sys.argv[1:]:
+            done = applied_versions(connection)
+            for version, name, _ in MIGRATIONS:
+                print(f"{version:>4} {'applied' if version in done else 'pending':<8} {name}")
+        else:
+            applied = apply_migrations(connection)
+            print(f"Applied {len(applied)} migration(s)" if applied else "Schema is up to date")
+    except Error as e:
+        print(f"Error applying migrations: {e}")
+        return 1
+    finally:
+        connection.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
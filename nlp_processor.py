@@ -1,92 +1,208 @@
-import nltk
-import string
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
-from nltk.stem import WordNetLemmatizer
-from database import create_db_connection
+import os
+import threading
+from collections import namedtuple
+from storage import StorageUnavailable, get_storage
+from metrics import count_error, stage
+from knowledge_base import current_snapshot
+from symptom_matcher import SymptomMatcher
+from text_normalizer import NLTKResourceError, get_normalizer, tokenize
 
-# Download NLTK resources
-nltk.download('punkt')
-nltk.download('stopwords')
-nltk.download('wordnet')
+# NLTK data packages used by preprocess_text and the spelling correction ('punkt_tab' replaces 'punkt'
+# in newer NLTK releases)
+NLTK_PACKAGES = ('punkt', 'punkt_tab', 'stopwords', 'wordnet', 'words')
+
+NLTKResources = namedtuple('NLTKResources', ['tokenize', 'stop_words', 'lemmatizer'])
+
+_nltk_resources = None
+_nltk_lock = threading.Lock()
+_dictionary_words = None
+
+def download_nltk_resources():
+    """Download the NLTK data packages (needs network access; run once at install time)"""
+    import nltk
+    for package in NLTK_PACKAGES:
+        nltk.download(package, quiet=True)
+
+def load_nltk_resources():
+    """Load the tokenizer, stopwords and lemmatizer once per process, without network access"""
+    global _nltk_resources
+    if _nltk_resources is not None:
+        return _nltk_resources
+    
+    with _nltk_lock:
+        if _nltk_resources is None:
+            # Imported here so importing this module stays cheap
+            from nltk.corpus import stopwords
+            from nltk.tokenize import word_tokenize
+            from nltk.stem import WordNetLemmatizer
+            
+            try:
+                # Touch every corpus so missing data fails now rather than mid-request
+                stop_words = frozenset(stopwords.words('english'))
+                word_tokenize("warm up")
+                lemmatizer = WordNetLemmatizer()
+                lemmatizer.lemmatize("warming")
+            except LookupError as e:
+                raise NLTKResourceError(
+                    "NLTK data is missing; install it with "
+                    "'python -c \"import nlp_processor; nlp_processor.download_nltk_resources()\"' "
+                    "or point NLTK_DATA at a pre-populated directory"
+                ) from e
+            
+            _nltk_resources = NLTKResources(word_tokenize, stop_words, lemmatizer)
+    
+    return _nltk_resources
+
+def load_dictionary_words():
+    """English words and stopwords as one set, built once per process; None without the 'words' corpus"""
+    global _dictionary_words
+    if _dictionary_words is not None:
+        return _dictionary_words or None
+    
+    stop_words = load_nltk_resources().stop_words
+    with _nltk_lock:
+        if _dictionary_words is None:
+            from nltk.corpus import words
+            try:
+                _dictionary_words = frozenset(word.lower() for word in words.words()) | stop_words
+            except LookupError:
+                print("Warning: NLTK 'words' corpus is missing; spelling correction of symptom words is disabled")
+                # Empty rather than None so the warning is printed once
+                _dictionary_words = frozenset()
+    
+    return _dictionary_words or None
+
+def is_dictionary_word(token):
+    """True for an English word or an inflection of one ("tried" -> "try")"""
+    if token in (load_dictionary_words() or load_nltk_resources().stop_words):
+        return True
+    from nltk.corpus import wordnet
+    return wordnet.morphy(token) is not None
+
+def prewarm():
+    """Load NLTK corpora up front, e.g. in a pre-fork master so workers share them copy-on-write"""
+    load_dictionary_words()
+    return load_nltk_resources()
+
+# Hardcoded symptoms for testing when database connection fails
+FALLBACK_SYMPTOMS = ("fever", "cough", "headache", "fatigue", "sore throat",
+                     "chest pain", "shortness of breath", "nausea")
+
+# Common symptoms and the ways users tend to mention them
+COMMON_SYMPTOMS = {
+    "fever": ["fever", "high temperature", "feverish", "feel hot", "feeling hot"],
+    "cough": ["cough", "coughing"],
+    "headache": ["headache", "head pain", "head ache"],
+    "fatigue": ["fatigue", "tired", "exhausted", "tiredness"],
+    "sore throat": ["sore throat", "throat pain", "throat ache"],
+    "chest pain": ["chest pain", "pain in chest"],
+    "shortness of breath": ["shortness of breath", "hard to breathe", "difficulty breathing"],
+    "nausea": ["nausea", "feel sick", "feeling sick"],
+    "joint pain": ["joint pain", "joint ache", "aching joint", "sore joint"],
+    "diarrhea": ["diarrhea", "diarrhoea", "loose stool"],
+    "cold": ["a cold", "head cold", "common cold", "runny nose", "stuffy nose"],
+    "flu": ["flu", "influenza", "flue"]
+}
+
+def build_vocabulary(symptom_names):
+    """Ordered (canonical symptom, aliases) pairs: common symptoms first, then database symptoms"""
+    vocabulary = {symptom: list(aliases) for symptom, aliases in COMMON_SYMPTOMS.items()}
+    for name in symptom_names:
+        if name in vocabulary:
+            vocabulary[name].append(name)
+        else:
+            vocabulary[name] = [name]
+    return list(vocabulary.items())
+
+def create_matcher(symptom_names):
+    """SymptomMatcher over the common symptoms and symptom_names, configured from the environment"""
+    # FUZZY_MAX_DISTANCE=0 restricts matching to exact aliases
+    max_edit_distance = int(os.getenv('FUZZY_MAX_DISTANCE', '2'))
+    # Typos are only corrected with a dictionary to tell them from ordinary words
+    dictionary = load_dictionary_words()
+    if dictionary is None:
+        max_edit_distance = 0
+    # Aliases are lemmatized once here; messages through the normalizer's lemma cache
+    return SymptomMatcher(build_vocabulary(symptom_names), max_edit_distance,
+                          normalizer=get_normalizer(), is_word=is_dictionary_word, dictionary=dictionary)
+
+# Compiled matcher shared by every NLPProcessor, keyed by the vocabulary it was built from
+_matcher = None
+_matcher_key = None
+_matcher_lock = threading.Lock()
 
 class NLPProcessor:
-    def __init__(self):
-        self.lemmatizer = WordNetLemmatizer()
-        self.stop_words = set(stopwords.words('english'))
-        
+    @property
+    def lemmatizer(self):
+        return load_nltk_resources().lemmatizer
+    
+    @property
+    def stop_words(self):
+        return load_nltk_resources().stop_words
+    
     def preprocess_text(self, text):
-        """Preprocess text for NLP analysis"""
-        # Convert to lowercase
-        text = text.lower()
-        
-        # Remove punctuation
-        text = text.translate(str.maketrans('', '', string.punctuation))
-        
-        # Tokenize
-        tokens = word_tokenize(text)
-        
-        # Remove stopwords and lemmatize
-        processed_tokens = [
-            self.lemmatizer.lemmatize(token) 
-            for token in tokens 
-            if token not in self.stop_words
-        ]
+        """Lowercased lemmas of the words in text, without stopwords"""
+        stop_words = self.stop_words
+        tokens = [token for token in tokenize(text) if token not in stop_words]
+        normalizer = get_normalizer()
+        return [normalizer.lemma(token) for token in tokens] if normalizer is not None else tokens
+    
+    def _fetch_symptom_names(self, default):
+        """Read symptom names straight from the database when no snapshot is loaded"""
+        try:
+            with stage('db_query'):
+                return [name for _, name, _ in get_storage().fetch_symptoms()]
+        except StorageUnavailable:
+            pass
+        except Exception as e:
+            print(f"Error fetching symptoms from database: {e}")
+            count_error('db_query')
+        return default
+    
+    def get_matcher(self, symptom_names, vocabulary_key):
+        """Return the compiled matcher for this vocabulary, rebuilding it only when the key changes"""
+        global _matcher, _matcher_key
+        if _matcher is not None and _matcher_key == vocabulary_key:
+            return _matcher
         
-        return processed_tokens
+        with _matcher_lock:
+            if _matcher is None or _matcher_key != vocabulary_key:
+                _matcher = create_matcher(symptom_names)
+                _matcher_key = vocabulary_key
+            return _matcher
+    
+    def current_matcher(self):
+        """Matcher over the loaded snapshot's symptoms, or the database/fallback list without one"""
+        snapshot = current_snapshot()
+        if snapshot is not None:
+            all_symptoms = snapshot.symptom_names
+            vocabulary_key = ('snapshot', snapshot.version)
+        else:
+            all_symptoms = tuple(self._fetch_symptom_names(FALLBACK_SYMPTOMS))
+            vocabulary_key = ('names', all_symptoms)
+        return self.get_matcher(all_symptoms, vocabulary_key)
     
     def extract_symptoms(self, text):
         """Extract potential symptoms from user input"""
         try:
-            # Hardcoded symptoms for testing when database connection fails
-            fallback_symptoms = ["fever", "cough", "headache", "fatigue", "sore throat", 
-                                 "chest pain", "shortness of breath", "nausea"]
-            
-            all_symptoms = fallback_symptoms
-            
-            try:
-                connection = create_db_connection()
-                if connection is not None:
-                    cursor = connection.cursor()
-                    cursor.execute("SELECT name FROM symptoms")
-                    all_symptoms = [symptom[0] for symptom in cursor.fetchall()]
-                    cursor.close()
-                    connection.close()
-            except Exception as e:
-                print(f"Error fetching symptoms from database: {e}")
-            
-            # Preprocess user input
-            text_lower = text.lower()
-            
-            # Simple symptom matching with improved logic
-            detected_symptoms = []
-            
-            # Add common symptoms that might be mentioned
-            common_symptoms = {
-                "fever": ["fever", "high temperature", "hot"],
-                "cough": ["cough", "coughing"],
-                "headache": ["headache", "head pain", "head ache"],
-                "fatigue": ["fatigue", "tired", "exhausted", "tiredness"],
-                "sore throat": ["sore throat", "throat pain", "throat ache"],
-                "chest pain": ["chest pain", "pain in chest"],
-                "shortness of breath": ["shortness of breath", "hard to breathe", "difficulty breathing"],
-                "nausea": ["nausea", "feel sick", "feeling sick"],
-                "cold": ["cold", "runny nose", "stuffy nose"],
-                "flu": ["flu", "influenza", "flue"]
-            }
-            
-            # Check for common symptoms in the text
-            for symptom, aliases in common_symptoms.items():
-                if any(alias in text_lower for alias in aliases):
-                    detected_symptoms.append(symptom)
-            
-            # Also check database symptoms
-            for symptom in all_symptoms:
-                if symptom.lower() in text_lower and symptom not in detected_symptoms:
-                    detected_symptoms.append(symptom)
+            # Single pass over the message for every alias and database symptom, plus one over
+            # the spelling-corrected message when it contains typos and one over its lemmas
+            matcher = self.current_matcher()
+            detected_symptoms = matcher.find(text)
             
             print(f"Detected symptoms: {detected_symptoms}")
             return detected_symptoms
         except Exception as e:
             print(f"Error in extract_symptoms: {e}")
+            count_error('extract_symptoms')
             return []
+    
+    def extract_symptoms_batch(self, texts):
+        """Extract symptoms from many messages, resolving the vocabulary once for the batch"""
+        try:
+            matcher = self.current_matcher()
+            return [matcher.find(text) for text in texts]
+        except Exception as e:
+            print(f"Error in extract_symptoms_batch: {e}")
+            count_error('extract_symptoms')
+            return [[] for _ in texts]
@@ -1,64 +1,380 @@
 import os
-import json
-import google.generativeai as genai
+import re
+import time
+import random
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from dotenv import load_dotenv
+from circuit_breaker import CircuitBreaker
+from metrics import count_extra_attempt, count_fallback, record_tokens, stage
+from prompt_builder import PROMPT_FORMAT, SYSTEM_INSTRUCTION, PromptBuilder, estimate_tokens
+from response_cache import create_response_cache
 
 # Load environment variables
 load_dotenv()
 
+def _genai():
+    """Import the Gemini SDK on first use; it is by far the slowest import at startup"""
+    import google.generativeai as genai
+    return genai
+
+MODEL_NAME = os.getenv('GEMINI_MODEL', 'gemini-pro')
+
+# Gemini 1.0 models reject a system instruction; their prompts carry it inline
+INLINE_INSTRUCTION_MODELS = ('gemini-pro', 'gemini-1.0-pro')
+
+# Identifies the prompt template and model in response-cache keys
+PROMPT_VERSION = hashlib.sha256(
+    f"{MODEL_NAME}\n{PROMPT_FORMAT}\n{SYSTEM_INSTRUCTION}".encode('utf-8')
+).hexdigest()[:16]
+
 class OpenAIProcessor:
-    def __init__(self, api_key=None):
+    def __init__(self, api_key=None, model_factory=None, response_cache=None):
         # Set API key from environment variable or parameter
         self.api_key = api_key or os.getenv("GEMINI_API_KEY")
-        if self.api_key:
-            genai.configure(api_key=self.api_key)
-        else:
+        # Builds the model handle (once per process); replaceable so a local stub can stand in for Gemini
+        self.model_factory = model_factory or self._build_model
+        self._model = None
+        # Set once the handle carries SYSTEM_INSTRUCTION, so prompts leave it out
+        self.instruction_in_model = False
+        self._model_lock = threading.Lock()
+        if self.api_key and model_factory is None:
+            _genai().configure(api_key=self.api_key)
+        elif not self.api_key:
             print("Warning: No Gemini API key provided")
+        
+        # Bound on in-flight Gemini calls and the per-response deadline, retries and hedges included
+        self.max_concurrency = int(os.getenv("GEMINI_MAX_CONCURRENCY", "100"))
+        self.timeout = float(os.getenv("GEMINI_TIMEOUT", "30"))
+        self._semaphores = {}
+        self._executor = None
+        self._executor_pid = None
+        
+        # Failed calls are retried after a full-jitter backoff; a hedge duplicates a call still pending after the delay
+        self.max_retries = int(os.getenv("GEMINI_MAX_RETRIES", "1"))
+        self.retry_backoff = float(os.getenv("GEMINI_RETRY_BACKOFF", "0.2"))
+        self.hedge_delay = float(os.getenv("GEMINI_HEDGE_DELAY", "0"))
+        
+        # After repeated failures, answer locally instead of waiting on a degraded API
+        self.breaker = CircuitBreaker(
+            failure_threshold=int(os.getenv("GEMINI_BREAKER_FAILURES", "5")),
+            cooldown=float(os.getenv("GEMINI_BREAKER_COOLDOWN", "30"))
+        )
+        
+        # Compact context: the top diagnoses within a token budget
+        self.prompt_builder = PromptBuilder()
+        
+        # Generated responses reused across identical symptom/diagnosis contexts
+        self.response_cache = response_cache if response_cache is not None else create_response_cache()
+    
+    def _build_prompt(self, user_message, detected_symptoms, diagnoses):
+        """Combine the user message and detected context, plus the system instruction unless the model holds it"""
+        return self.prompt_builder.build(user_message, detected_symptoms, diagnoses,
+                                         include_instruction=not self.instruction_in_model)
+    
+    def _record_usage(self, prompt, text, usage):
+        """Token counts reported by Gemini, estimated from the text when the response has none"""
+        prompt_tokens = getattr(usage, 'prompt_token_count', 0)
+        response_tokens = getattr(usage, 'candidates_token_count', 0)
+        if not prompt_tokens:
+            # The API bills the system instruction with every prompt, wherever it is sent
+            prompt_tokens = estimate_tokens(prompt) + (estimate_tokens(SYSTEM_INSTRUCTION) if self.instruction_in_model else 0)
+        record_tokens(prompt_tokens, response_tokens or estimate_tokens(text))
     
     def generate_response(self, user_message, detected_symptoms, diagnoses):
         """Generate a natural language response using Gemini"""
         if not self.api_key:
+            count_fallback('no_api_key')
+            return self._generate_fallback_response(detected_symptoms, diagnoses)
+        
+        cache_key, cached = self._cache_lookup(user_message, detected_symptoms, diagnoses)
+        if cached is not None:
+            return cached
+        
+        if not self.breaker.allow():
+            count_fallback('circuit_open')
             return self._generate_fallback_response(detected_symptoms, diagnoses)
         
         try:
-            # Prepare system prompt with medical disclaimer
-            system_prompt = """
-            You are a medical chatbot assistant designed to provide general health information.
-            Important disclaimers:
-            1. You are not a licensed medical professional.
-            2. Your responses are for informational purposes only and do not constitute medical advice.
-            3. Always advise users to consult with a healthcare professional for proper diagnosis and treatment.
+            self.get_model()
+            prompt = self._build_prompt(user_message, detected_symptoms, diagnoses)
+            with stage('llm'):
+                text, usage = self._generate_with_retries(prompt)
+            self.breaker.record_success()
             
-            Based on the user's message and the symptoms and potential diagnoses detected, 
-            provide a helpful, informative response that:
-            1. Acknowledges the symptoms they've described
-            2. Provides general information about possible conditions
-            3. Offers general self-care tips if appropriate
-            4. Always emphasizes the importance of consulting a healthcare professional
-            5. Never make definitive diagnoses or prescribe treatments
-            """
-            
-            # Prepare context for the model
-            context = {
-                "detected_symptoms": detected_symptoms,
-                "possible_diagnoses": diagnoses
-            }
-            
-            # Configure the model
-            model = genai.GenerativeModel('gemini-pro')
+            self._record_usage(prompt, text, usage)
+            self._cache_store(cache_key, text)
+            return text
+        
+        except FutureTimeoutError:
+            self.breaker.record_failure()
+            print(f"Gemini response timed out after {self.timeout}s")
+            count_fallback('timeout')
+            return self._generate_fallback_response(detected_symptoms, diagnoses)
+        except Exception as e:
+            self.breaker.record_failure()
+            print(f"Error generating Gemini response: {e}")
+            count_fallback('error')
+            return self._generate_fallback_response(detected_symptoms, diagnoses)
+    
+    def get_model(self):
+        """The model handle shared by every call in this process, built on first use"""
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    self._model = self.model_factory()
+        return self._model
+    
+    def _build_model(self):
+        """Default model factory; the system instruction travels with the handle where the model and SDK allow"""
+        genai = _genai()
+        if MODEL_NAME not in INLINE_INSTRUCTION_MODELS:
+            try:
+                model = genai.GenerativeModel(MODEL_NAME, system_instruction=SYSTEM_INSTRUCTION)
+                self.instruction_in_model = True
+                return model
+            except TypeError:
+                # SDK releases before 0.5 have no system_instruction
+                pass
+        return genai.GenerativeModel(MODEL_NAME)
+    
+    @staticmethod
+    def _generate_once(model, prompt):
+        """(text, usage metadata) of one call; reading .text raises for blocked answers, failing the attempt"""
+        response = model.generate_content(prompt)
+        return response.text, getattr(response, 'usage_metadata', None)
+    
+    def _generate_with_retries(self, prompt):
+        """(text, usage), retrying failed calls while the deadline allows; raises FutureTimeoutError past it"""
+        deadline = time.monotonic() + self.timeout
+        attempt = 0
+        while True:
+            try:
+                return self._generate_hedged(prompt, deadline)
+            except FutureTimeoutError:
+                raise
+            except Exception:
+                delay = self._retry_delay(attempt)
+                if attempt >= self.max_retries or time.monotonic() + delay >= deadline:
+                    raise
+                attempt += 1
+                count_extra_attempt('retry')
+                time.sleep(delay)
+    
+    def _generate_hedged(self, prompt, deadline):
+        """One call, plus a duplicate if it is still pending after hedge_delay; the first success wins"""
+        executor = self._call_executor()
+        model = self.get_model()
+        pending = {executor.submit(self._generate_once, model, prompt)}
+        
+        if 0 < self.hedge_delay < deadline - time.monotonic():
+            done, _ = wait(pending, timeout=self.hedge_delay)
+            if not done:
+                count_extra_attempt('hedge')
+                pending.add(executor.submit(self._generate_once, model, prompt))
+        
+        error = None
+        while pending:
+            # Calls still running at the deadline are abandoned to finish in the background
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                raise FutureTimeoutError()
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        raise error
+    
+    def _retry_delay(self, attempt):
+        # Full jitter: spreads the retries of many requests that failed together
+        return random.uniform(0, self.retry_backoff * 2 ** attempt)
+    
+    def _call_executor(self):
+        """Threads that run blocking Gemini calls so the caller can stop waiting at the deadline"""
+        pid = os.getpid()
+        if self._executor is None or self._executor_pid != pid:
+            with self._model_lock:
+                if self._executor is None or self._executor_pid != pid:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix='gemini')
+                    self._executor_pid = pid
+        return self._executor
+    
+    def stream_response(self, user_message, detected_symptoms, diagnoses):
+        """Yield the response text in chunks as Gemini produces it"""
+        if not self.api_key:
+            count_fallback('no_api_key')
+            yield from self.stream_text(self._generate_fallback_response(detected_symptoms, diagnoses))
+            return
+        
+        cache_key, cached = self._cache_lookup(user_message, detected_symptoms, diagnoses)
+        if cached is not None:
+            yield from self.stream_text(cached)
+            return
+        
+        if not self.breaker.allow():
+            count_fallback('circuit_open')
+            yield from self.stream_text(self._generate_fallback_response(detected_symptoms, diagnoses))
+            return
+        
+        chunks = []
+        streamed_any = False
+        usage = None
+        # The whole stream, first chunk and every gap after it, shares one deadline
+        deadline = time.monotonic() + self.timeout
+        try:
+            model = self.get_model()
+            prompt = self._build_prompt(user_message, detected_symptoms, diagnoses)
+            response = self._before_deadline(deadline, model.generate_content, prompt, stream=True)
+            chunk_iterator = iter(response)
             
-            # Create the prompt with system instructions, user message and context
-            full_prompt = f"{system_prompt}\n\nUser message: {user_message}\n\nAdditional context: {json.dumps(context)}"
+            while True:
+                chunk = self._before_deadline(deadline, next, chunk_iterator, None)
+                if chunk is None:
+                    break
+                # The final chunk carries the usage of the whole response
+                usage = getattr(chunk, 'usage_metadata', None) or usage
+                text = chunk.text
+                if text:
+                    streamed_any = True
+                    chunks.append(text)
+                    yield text
             
-            # Generate response
-            response = model.generate_content(full_prompt)
+            self.breaker.record_success()
+            self._record_usage(prompt, ''.join(chunks), usage)
+            self._cache_store(cache_key, ''.join(chunks))
+        
+        except FutureTimeoutError:
+            self.breaker.record_failure()
+            print(f"Gemini stream timed out after {self.timeout}s")
+            count_fallback('timeout')
+            fallback = self._generate_fallback_response(detected_symptoms, diagnoses)
+            yield from self.stream_text("\n\n" + fallback if streamed_any else fallback)
+        except Exception as e:
+            self.breaker.record_failure()
+            print(f"Error streaming Gemini response: {e}")
+            count_fallback('error')
+            fallback = self._generate_fallback_response(detected_symptoms, diagnoses)
+            if streamed_any:
+                # Part of the answer is already on screen; finish with the local summary
+                fallback = "\n\n" + fallback
+            yield from self.stream_text(fallback)
+    
+    def _before_deadline(self, deadline, function, *args, **kwargs):
+        """function(*args, **kwargs) on the call executor; raises FutureTimeoutError if it is still running at deadline
+
+        A call past the deadline is abandoned to finish in the background.
+        """
+        future = self._call_executor().submit(function, *args, **kwargs)
+        return future.result(timeout=max(0.0, deadline - time.monotonic()))
+    
+    @staticmethod
+    def stream_text(text):
+        """Split locally generated text into word-sized chunks so it streams like model output"""
+        yield from re.findall(r'\s*\S+', text)
+    
+    async def generate_response_async(self, user_message, detected_symptoms, diagnoses):
+        """Generate a response without blocking the event loop, bounded by the concurrency limit"""
+        if not self.api_key:
+            count_fallback('no_api_key')
+            return self._generate_fallback_response(detected_symptoms, diagnoses)
+        
+        cache_key, cached = self._cache_lookup(user_message, detected_symptoms, diagnoses)
+        if cached is not None:
+            return cached
+        
+        if not self.breaker.allow():
+            count_fallback('circuit_open')
+            return self._generate_fallback_response(detected_symptoms, diagnoses)
+        
+        try:
+            model = self.get_model()
+            prompt = self._build_prompt(user_message, detected_symptoms, diagnoses)
             
-            return response.text
+            # The deadline covers waiting for a slot, the Gemini round trips and retry backoff
+            with stage('llm'):
+                text, usage = await asyncio.wait_for(self._generate_with_retries_async(model, prompt),
+                                                     timeout=self.timeout)
+            self.breaker.record_success()
             
+            self._record_usage(prompt, text, usage)
+            self._cache_store(cache_key, text)
+            return text
+        
+        except asyncio.TimeoutError:
+            self.breaker.record_failure()
+            print(f"Gemini response timed out after {self.timeout}s")
+            count_fallback('timeout')
+            return self._generate_fallback_response(detected_symptoms, diagnoses)
         except Exception as e:
+            self.breaker.record_failure()
             print(f"Error generating Gemini response: {e}")
+            count_fallback('error')
             return self._generate_fallback_response(detected_symptoms, diagnoses)
     
+    async def _generate_with_retries_async(self, model, prompt):
+        attempt = 0
+        while True:
+            try:
+                return await self._generate_hedged_async(model, prompt)
+            except Exception:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._retry_delay(attempt)
+                attempt += 1
+                count_extra_attempt('retry')
+                await asyncio.sleep(delay)
+    
+    async def _generate_hedged_async(self, model, prompt):
+        pending = {asyncio.ensure_future(self._generate_bounded(model, prompt))}
+        try:
+            if self.hedge_delay > 0:
+                done, _ = await asyncio.wait(pending, timeout=self.hedge_delay)
+                if not done:
+                    count_extra_attempt('hedge')
+                    pending.add(asyncio.ensure_future(self._generate_bounded(model, prompt)))
+            
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # The losing call is cancelled, as are all of them when the deadline cancels us
+            for task in pending:
+                task.cancel()
+    
+    def _cache_lookup(self, user_message, detected_symptoms, diagnoses):
+        """Return (key, cached response or None); key is None when the reply is not cached"""
+        # Without symptoms or diagnoses the reply depends only on the message text
+        if self.response_cache is None or not (detected_symptoms or diagnoses):
+            return None, None
+        key = self.response_cache.make_key(user_message, detected_symptoms, diagnoses, PROMPT_VERSION)
+        return key, self.response_cache.get(key)
+    
+    def _cache_store(self, key, response):
+        # Only model output is cached; fallback text is cheap to rebuild
+        if key is not None and response:
+            self.response_cache.set(key, response)
+    
+    async def _generate_bounded(self, model, prompt):
+        async with self._semaphore():
+            response = await model.generate_content_async(prompt)
+            return response.text, getattr(response, 'usage_metadata', None)
+    
+    def _semaphore(self):
+        """Concurrency limiter for the running event loop (asyncio primitives are per-loop)"""
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        return semaphore
+    
     def _generate_fallback_response(self, detected_symptoms, diagnoses):
         """Generate a fallback response without using Gemini"""
         response = "I've analyzed your symptoms"
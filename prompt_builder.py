@@ -0,0 +1,69 @@
+import os
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Sent once per model handle where the model accepts a system instruction, otherwise at the top of each prompt
+SYSTEM_INSTRUCTION = (
+    "You are a medical chatbot assistant giving general health information. "
+    "You are not a licensed medical professional; your answers are informational only and not medical advice. "
+    "Using the user's message and the detected symptoms and possible conditions: "
+    "acknowledge the symptoms, give general information about the possible conditions, "
+    "offer general self-care tips if appropriate and always advise consulting a healthcare professional. "
+    "Never make definitive diagnoses or prescribe treatments. "
+    "Each condition line reads name|confidence %|description|treatment."
+)
+
+# Bump when the prompt layout changes so cached responses built from the old layout are not reused
+PROMPT_FORMAT = 2
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token), used where the API reports no usage"""
+    return (len(text) + 3) // 4
+
+def _clip(text, limit):
+    text = ' '.join(str(text or '').split()).replace('|', '/')
+    if len(text) <= limit:
+        return text
+    return text[:limit - 1].rstrip() + '…'
+
+class PromptBuilder:
+    """Builds compact prompts: the top-k diagnoses as one line each, within a token budget"""
+    
+    def __init__(self, top_k=None, context_tokens=None, field_chars=None):
+        self.top_k = top_k if top_k is not None else int(os.getenv('PROMPT_TOP_K', '3'))
+        self.context_tokens = context_tokens if context_tokens is not None else int(os.getenv('PROMPT_CONTEXT_TOKENS', '300'))
+        self.field_chars = field_chars if field_chars is not None else int(os.getenv('PROMPT_FIELD_CHARS', '160'))
+    
+    def build(self, user_message, detected_symptoms, diagnoses, include_instruction=True):
+        """The prompt text; include_instruction=False when the model handle already carries SYSTEM_INSTRUCTION"""
+        lines = [SYSTEM_INSTRUCTION] if include_instruction else []
+        lines.append(f"User message: {' '.join(user_message.split())}")
+        lines.extend(self.context_lines(detected_symptoms, diagnoses))
+        return '\n'.join(lines)
+    
+    def context_lines(self, detected_symptoms, diagnoses):
+        """Symptoms and condition lines, best match first, stopping at the token budget"""
+        lines = [f"Symptoms: {', '.join(detected_symptoms) if detected_symptoms else 'none detected'}"]
+        if not diagnoses:
+            return lines + ["Conditions: none matched"]
+        
+        lines.append("Conditions:")
+        used = sum(estimate_tokens(line) for line in lines)
+        for diagnosis in diagnoses[:self.top_k]:
+            name = _clip(diagnosis['disease'], self.field_chars)
+            confidence = f"{float(diagnosis['confidence']):g}"
+            full = (f"{name}|{confidence}|{_clip(diagnosis.get('description'), self.field_chars)}|"
+                    f"{_clip(diagnosis.get('treatment'), self.field_chars)}")
+            
+            # Drop the free text before dropping a condition; the best match is always named
+            for line in (full, f"{name}|{confidence}"):
+                cost = estimate_tokens(line)
+                if used + cost <= self.context_tokens or len(lines) == 2 and line != full:
+                    lines.append(line)
+                    used += cost
+                    break
+            else:
+                break
+        return lines
@@ -0,0 +1,476 @@
+"""Replay logged user messages through symptom extraction and diagnosis ranking, offline.
+
+Messages stream from user_interactions in id order (a server-side cursor on
+the configured storage backend, after any months retention.py archived to
+INTERACTION_ARCHIVE_DIR) or from an export file (CSV/JSONL with an
+id and a message column, optionally gzipped). Each configuration runs in
+its own pool of worker processes that apply KEY=VALUE environment overrides
+before loading the knowledge base, so a candidate can point at another
+database or SQLite file with new correlation weights, or change
+FUZZY_MAX_DISTANCE or DIAGNOSIS_TOP_K. The LLM is never called. Example:
+
+    python replay.py --limit 1000000 \\
+        --candidate STORAGE_BACKEND=sqlite --candidate SQLITE_PATH=new_weights.sqlite3
+
+To compare code changes (e.g. to the symptom matcher), save the results on
+one checkout and compare against them from the other:
+
+    python replay.py --save before.jsonl.gz
+    python replay.py --compare before.jsonl.gz --diff-output changed.jsonl
+
+Only chunks in flight are held in memory; latency percentiles come from
+log-spaced histograms and the diff report keeps counters and a few examples.
+"""
+import os
+import sys
+import json
+import gzip
+import math
+import time
+import argparse
+import multiprocessing
+from itertools import islice
+from collections import Counter, deque
+from kb_importer import read_records
+
+STAGES = ('extract_symptoms', 'diagnose', 'total')
+
+class LatencyHistogram:
+    """Log-spaced buckets 2% apart from 1 µs: percentiles within 2% in constant memory"""
+    
+    SMALLEST = 1e-6
+    GROWTH = 1.02
+    
+    def __init__(self):
+        self.buckets = Counter()
+        self.count = 0
+        self.total = 0.0
+    
+    def observe(self, seconds):
+        index = int(math.log(max(seconds, self.SMALLEST) / self.SMALLEST, self.GROWTH))
+        self.buckets[index] += 1
+        self.count += 1
+        self.total += seconds
+    
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of observations (seconds)"""
+        rank = fraction * self.count
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return self.SMALLEST * self.GROWTH ** (index + 1)
+        return 0.0
+    
+    def summary(self):
+        if not self.count:
+            return {}
+        return {
+            'mean_ms': self.total / self.count * 1000,
+            'p50_ms': self.percentile(0.50) * 1000,
+            'p95_ms': self.percentile(0.95) * 1000,
+            'p99_ms': self.percentile(0.99) * 1000
+        }
+
+# Worker state: one MedicalDiagnosisSystem per process, built for the pool's configuration
+_system = None
+_top_k = None
+
+def _init_worker(overrides, top_k):
+    """Apply a configuration's environment overrides, then load its knowledge base"""
+    global _system, _top_k
+    os.environ.update(overrides)
+    # The snapshot must not change under a replay
+    os.environ['KNOWLEDGE_BASE_REFRESH_INTERVAL'] = '0'
+    # Per-message log lines would dominate the run time
+    sys.stdout = open(os.devnull, 'w')
+    
+    # Imported after the overrides are applied (workers are spawned, not forked)
+    from knowledge_base import get_knowledge_base
+    from diagnosis_system import MedicalDiagnosisSystem
+    get_knowledge_base().refresh(force=True)
+    _system = MedicalDiagnosisSystem()
+    _top_k = top_k
+
+def _error_count():
+    from metrics import STAGE_ERRORS
+    return sum(value for _, _, value in STAGE_ERRORS.samples())
+
+def _replay_chunk(rows):
+    """Run (id, message) rows through extraction and ranking; returns (kb version, results, timings, errors)"""
+    from knowledge_base import current_snapshot
+    
+    errors = _error_count()
+    results, timings = [], []
+    for _, message in rows:
+        start = time.perf_counter()
+        symptoms = _system.nlp_processor.extract_symptoms(message or '')
+        extracted = time.perf_counter()
+        diagnoses = _system.get_possible_diagnoses(symptoms)
+        done = time.perf_counter()
+        
+        results.append((sorted(symptoms), [(d['disease'], d['confidence']) for d in diagnoses[:_top_k]]))
+        timings.append((extracted - start, done - extracted))
+    
+    snapshot = current_snapshot()
+    version = snapshot.version if snapshot is not None else 'none (SQL fallback)'
+    return version, results, timings, _error_count() - errors
+
+class LiveSide:
+    """A configuration replayed in its own process pool"""
+    
+    def __init__(self, overrides, workers, top_k):
+        self.overrides = overrides
+        # Spawned so module-level settings are read after the overrides are applied
+        context = multiprocessing.get_context('spawn')
+        self.pool = context.Pool(workers, initializer=_init_worker, initargs=(overrides, top_k))
+    
+    def describe(self):
+        return ' '.join(f"{key}={value}" for key, value in self.overrides.items()) or 'current environment'
+    
+    def submit(self, chunk):
+        return self.pool.apply_async(_replay_chunk, (chunk,))
+    
+    def close(self):
+        # Every submitted chunk has been collected unless the replay failed
+        self.pool.terminate()
+        self.pool.join()
+
+class SavedSide:
+    """Results saved by an earlier run with --save, read back in lockstep with the messages"""
+    
+    def __init__(self, path):
+        self.path = path
+        self._records = read_records(path, 'jsonl')
+    
+    def submit(self, chunk):
+        results = []
+        for row_id, _ in chunk:
+            record = next(self._records, None)
+            if record is None or str(record['id']) != str(row_id):
+                raise ValueError(f"{self.path} does not match the replayed messages at id {row_id}; "
+                                 "replay the same source, --after-id and --limit as the saved run")
+            results.append((record['symptoms'], [tuple(diagnosis) for diagnosis in record['diagnoses']]))
+        return _Ready((None, results, None, 0))
+    
+    def describe(self):
+        return f"results saved in {self.path}"
+    
+    def close(self):
+        self._records.close()
+
+class _Ready:
+    """A result available immediately, with the AsyncResult interface"""
+    
+    def __init__(self, value):
+        self.value = value
+    
+    def get(self):
+        return self.value
+
+class ReplayReport:
+    """Streaming aggregates: throughput, per-stage latency per side, and the baseline/candidate diff"""
+    
+    def __init__(self, labels, top_k, max_examples=10, diff_output=None):
+        self.labels = labels
+        self.top_k = top_k
+        self.max_examples = max_examples
+        self.diff_output = diff_output
+        self.started = time.perf_counter()
+        self.messages = 0
+        self.latency = {label: {name: LatencyHistogram() for name in STAGES} for label in labels}
+        self.versions = {label: set() for label in labels}
+        self.errors = Counter()
+        
+        self.symptoms_changed = 0
+        self.top1_changed = 0
+        self.topk_changed = 0
+        self.order_changed = 0
+        self.overlap_total = 0.0
+        self.top1_delta_total = 0.0
+        self.top1_same = 0
+        self.symptoms_added = Counter()
+        self.symptoms_removed = Counter()
+        self.diseases_entered = Counter()
+        self.diseases_left = Counter()
+        self.examples = []
+    
+    def add(self, chunk, outcomes):
+        """Record one chunk: outcomes holds (version, results, timings, errors) per side"""
+        for label, (version, _, timings, errors) in zip(self.labels, outcomes):
+            if version is not None:
+                self.versions[label].add(version)
+            self.errors[label] += errors
+            for extract_seconds, diagnose_seconds in timings or ():
+                latency = self.latency[label]
+                latency['extract_symptoms'].observe(extract_seconds)
+                latency['diagnose'].observe(diagnose_seconds)
+                latency['total'].observe(extract_seconds + diagnose_seconds)
+        
+        self.messages += len(chunk)
+        if len(outcomes) == 2:
+            for row, baseline, candidate in zip(chunk, outcomes[0][1], outcomes[1][1]):
+                self._compare(row, baseline, candidate)
+    
+    def _compare(self, row, baseline, candidate):
+        baseline_symptoms, candidate_symptoms = set(baseline[0]), set(candidate[0])
+        baseline_names = [name for name, _ in baseline[1]]
+        candidate_names = [name for name, _ in candidate[1]]
+        
+        changed = False
+        if baseline_symptoms != candidate_symptoms:
+            self.symptoms_changed += 1
+            self.symptoms_added.update(candidate_symptoms - baseline_symptoms)
+            self.symptoms_removed.update(baseline_symptoms - candidate_symptoms)
+            changed = True
+        if baseline_names[:1] != candidate_names[:1]:
+            self.top1_changed += 1
+        elif baseline_names:
+            self.top1_same += 1
+            self.top1_delta_total += abs(baseline[1][0][1] - candidate[1][0][1])
+        if set(baseline_names) != set(candidate_names):
+            self.topk_changed += 1
+            self.diseases_entered.update(set(candidate_names) - set(baseline_names))
+            self.diseases_left.update(set(baseline_names) - set(candidate_names))
+            changed = True
+        elif baseline_names != candidate_names:
+            self.order_changed += 1
+            changed = True
+        
+        largest = max(len(baseline_names), len(candidate_names))
+        self.overlap_total += len(set(baseline_names) & set(candidate_names)) / largest if largest else 1.0
+        
+        if changed and (self.diff_output is not None or len(self.examples) < self.max_examples):
+            difference = {
+                'id': row[0],
+                'message': row[1],
+                'baseline': {'symptoms': list(baseline[0]), 'diagnoses': baseline_names},
+                'candidate': {'symptoms': list(candidate[0]), 'diagnoses': candidate_names}
+            }
+            if len(self.examples) < self.max_examples:
+                self.examples.append(difference)
+            if self.diff_output is not None:
+                self.diff_output.write(json.dumps(difference, default=str) + '\n')
+    
+    def elapsed(self):
+        return time.perf_counter() - self.started
+    
+    def summary(self):
+        elapsed = self.elapsed()
+        summary = {
+            'messages': self.messages,
+            'elapsed_s': elapsed,
+            'messages_per_s': self.messages / elapsed if elapsed else 0.0,
+            'sides': {
+                label: {
+                    'knowledge_base': sorted(self.versions[label]),
+                    'errors': self.errors[label],
+                    'latency': {name: histogram.summary() for name, histogram in self.latency[label].items()}
+                }
+                for label in self.labels
+            }
+        }
+        if len(self.labels) == 2:
+            compared = self.messages or 1
+            summary['diff'] = {
+                'top_k': self.top_k,
+                'symptoms_changed': self.symptoms_changed,
+                'top1_changed': self.top1_changed,
+                'top_k_changed': self.topk_changed,
+                'top_k_reordered': self.order_changed,
+                'symptoms_changed_rate': self.symptoms_changed / compared,
+                'top1_changed_rate': self.top1_changed / compared,
+                'top_k_changed_rate': self.topk_changed / compared,
+                'mean_top_k_overlap': self.overlap_total / compared,
+                'mean_top1_confidence_delta': self.top1_delta_total / self.top1_same if self.top1_same else 0.0,
+                'symptoms_added': self.symptoms_added.most_common(10),
+                'symptoms_removed': self.symptoms_removed.most_common(10),
+                'diseases_entered': self.diseases_entered.most_common(10),
+                'diseases_left': self.diseases_left.most_common(10),
+                'examples': self.examples
+            }
+        return summary
+    
+    def format(self):
+        summary = self.summary()
+        lines = [f"{summary['messages']} messages in {summary['elapsed_s']:.1f} s "
+                 f"({summary['messages_per_s']:.0f} messages/s)"]
+        for label, side in summary['sides'].items():
+            lines.append(f"{label}: knowledge base {', '.join(side['knowledge_base']) or '-'}, "
+                         f"{side['errors']} errors")
+            for name, latency in side['latency'].items():
+                if latency:
+                    lines.append(f"  {name:<17} mean {latency['mean_ms']:.3f} ms  p50 {latency['p50_ms']:.3f} ms  "
+                                 f"p95 {latency['p95_ms']:.3f} ms  p99 {latency['p99_ms']:.3f} ms")
+        
+        diff = summary.get('diff')
+        if diff:
+            lines.append(f"diff (top {diff['top_k']}):")
+            lines.append(f"  symptoms changed   {diff['symptoms_changed']} ({diff['symptoms_changed_rate']:.2%})")
+            lines.append(f"  top-1 changed      {diff['top1_changed']} ({diff['top1_changed_rate']:.2%})")
+            lines.append(f"  top-k set changed  {diff['top_k_changed']} ({diff['top_k_changed_rate']:.2%}), "
+                         f"reordered only {diff['top_k_reordered']}")
+            lines.append(f"  mean top-k overlap {diff['mean_top_k_overlap']:.3f}, mean top-1 confidence "
+                         f"change {diff['mean_top1_confidence_delta']:.2f} points")
+            for key in ('symptoms_added', 'symptoms_removed', 'diseases_entered', 'diseases_left'):
+                if diff[key]:
+                    counts = ', '.join(f"{name} ({count})" for name, count in diff[key])
+                    lines.append(f"  {key.replace('_', ' ')}: {counts}")
+            for example in diff['examples']:
+                lines.append(f"  #{example['id']} {example['message']!r}")
+                lines.append(f"    baseline  {example['baseline']['symptoms']} -> {example['baseline']['diagnoses']}")
+                lines.append(f"    candidate {example['candidate']['symptoms']} -> {example['candidate']['diagnoses']}")
+        return '\n'.join(lines)
+
+def _open_output(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'wt', encoding='utf-8')
+    return open(path, 'w', encoding='utf-8')
+
+def _overrides(values, parser):
+    overrides = {}
+    for value in values:
+        key, separator, setting = value.partition('=')
+        if not separator or not key:
+            parser.error(f"expected KEY=VALUE, got {value!r}")
+        overrides[key] = setting
+    return overrides
+
+def _file_messages(path, file_format):
+    """(id, message) rows from an export file; rows without an id are numbered from 1"""
+    for number, record in enumerate(read_records(path, file_format), 1):
+        yield record.get('id') or number, record.get('message') or ''
+
+def _logged_messages(after_id, limit, batch_size, archive_directory=None):
+    """(id, message) rows from archived months, then from user_interactions
+
+    Archived rows left the database once archived, so the two never overlap except in a month
+    an interrupted SQLite retention run has not finished deleting.
+    """
+    from storage import get_storage
+    
+    count = 0
+    if archive_directory:
+        from archive import InteractionArchive
+        for row in InteractionArchive(archive_directory).stream_messages(after_id):
+            if limit and count >= limit:
+                return
+            yield row
+            count += 1
+    
+    stream = get_storage().stream_messages(after_id, limit - count if limit else None, batch_size=batch_size)
+    try:
+        yield from stream
+    finally:
+        stream.close()
+
+def _chunks(rows, size):
+    iterator = iter(rows)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def replay(messages, sides, report, chunk_size=500, max_in_flight=8, save=None, progress_interval=10.0):
+    """Feed message chunks to every side, at most max_in_flight chunks ahead of the report"""
+    pending = deque()
+    next_progress = time.monotonic() + progress_interval
+    
+    def collect():
+        chunk, results = pending.popleft()
+        outcomes = [result.get() for result in results]
+        report.add(chunk, outcomes)
+        if save is not None:
+            # The last side is the one under test: the only one, or the candidate
+            for (row_id, _), (symptoms, diagnoses) in zip(chunk, outcomes[-1][1]):
+                save.write(json.dumps({'id': row_id, 'symptoms': symptoms, 'diagnoses': diagnoses},
+                                      default=str) + '\n')
+    
+    for chunk in _chunks(messages, chunk_size):
+        pending.append((chunk, [side.submit(chunk) for side in sides]))
+        if len(pending) >= max_in_flight:
+            collect()
+        if progress_interval and time.monotonic() >= next_progress:
+            print(f"  {report.messages} messages ({report.messages / report.elapsed():.0f} messages/s)")
+            next_progress = time.monotonic() + progress_interval
+    while pending:
+        collect()
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--input", help="CSV/JSONL export with id and message columns (default: user_interactions)")
+    parser.add_argument("--format", choices=('csv', 'jsonl'), help="Input format (default: from the file extension)")
+    parser.add_argument("--after-id", type=int, default=0, help="Replay messages with a larger id (database only)")
+    parser.add_argument("--archive", default=os.getenv('INTERACTION_ARCHIVE_DIR', ''),
+                        help="Replay months archived by retention.py from this directory first ('' skips them)")
+    parser.add_argument("--limit", type=int, help="Replay at most this many messages")
+    parser.add_argument("--baseline", action="append", default=[], metavar="KEY=VALUE",
+                        help="Environment override for the baseline configuration (repeatable)")
+    parser.add_argument("--candidate", action="append", default=[], metavar="KEY=VALUE",
+                        help="Environment override for the candidate configuration (repeatable); "
+                             "without any, only the baseline is replayed")
+    parser.add_argument("--compare", help="Use results saved with --save as the baseline")
+    parser.add_argument("--save", help="Write per-message results of the configuration under test (JSONL, .gz ok)")
+    parser.add_argument("--diff-output", help="Write every message whose results differ (JSONL, .gz ok)")
+    parser.add_argument("--json", help="Write the report as JSON")
+    parser.add_argument("--top-k", type=int, default=5, help="Diagnoses compared per message")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Worker processes, split between the live configurations")
+    parser.add_argument("--chunk-size", type=int, default=500, help="Messages per task")
+    parser.add_argument("--examples", type=int, default=10, help="Differing messages shown in the report")
+    parser.add_argument("--progress-interval", type=float, default=10.0, help="Seconds between progress lines")
+    args = parser.parse_args()
+    
+    baseline, candidate = _overrides(args.baseline, parser), _overrides(args.candidate, parser)
+    if args.compare and baseline:
+        parser.error("--baseline overrides do not apply to saved results from --compare")
+    
+    live = [candidate] if args.compare or candidate else []
+    if not args.compare:
+        live.insert(0, baseline)
+    workers = max(1, args.workers // len(live))
+    
+    if args.input:
+        messages = _file_messages(args.input, args.format)
+        if args.limit:
+            messages = islice(messages, args.limit)
+    else:
+        messages = _logged_messages(args.after_id, args.limit, args.chunk_size, args.archive)
+    
+    sides = [SavedSide(args.compare)] if args.compare else []
+    outputs = []
+    try:
+        sides.extend(LiveSide(overrides, workers, args.top_k) for overrides in live)
+        labels = ['baseline'] + (['candidate'] if len(sides) == 2 else [])
+        for side, label in zip(sides, labels):
+            print(f"{label}: {side.describe()}")
+        
+        save = _open_output(args.save) if args.save else None
+        diff_output = _open_output(args.diff_output) if args.diff_output else None
+        outputs = [output for output in (save, diff_output) if output is not None]
+        
+        report = ReplayReport(labels, args.top_k, args.examples, diff_output)
+        replay(messages, sides, report, args.chunk_size, max_in_flight=2 * workers, save=save,
+               progress_interval=args.progress_interval)
+    except Exception as e:
+        print(f"Replay failed: {e}")
+        return 1
+    finally:
+        for side in sides:
+            side.close()
+        # Releases the server-side cursor of a stream that stopped early
+        if hasattr(messages, 'close'):
+            messages.close()
+        for output in outputs:
+            output.close()
+    
+    print(report.format())
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report.summary(), f, indent=2, default=str)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,223 @@
+import os
+import json
+import time
+import string
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+class MemoryCacheBackend:
+    """Per-process LRU store of (value, expires_at) pairs"""
+    
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+    
+    def set(self, key, value, expires_at):
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+    
+    def __len__(self):
+        return len(self._entries)
+
+class SQLiteCacheBackend:
+    """LRU store in a SQLite file, shared by every worker process on the host"""
+    
+    # Trim back to max_entries after this many writes rather than on every write
+    EVICT_EVERY = 32
+    
+    def __init__(self, path, max_entries=10000):
+        self.path = path
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._writes = 0
+        self._local = threading.local()
+        
+        connection = self._connection()
+        connection.execute("""
+        CREATE TABLE IF NOT EXISTS response_cache (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            expires_at REAL NOT NULL,
+            last_access REAL NOT NULL
+        )
+        """)
+        connection.execute("CREATE INDEX IF NOT EXISTS idx_response_cache_last_access ON response_cache (last_access)")
+        connection.commit()
+    
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        # A forked worker inherits the parent's thread-local; SQLite connections must not cross fork
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+    
+    def get(self, key):
+        connection = self._connection()
+        row = connection.execute(
+            "SELECT value, expires_at FROM response_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is not None:
+            connection.execute("UPDATE response_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+            connection.commit()
+        return row
+    
+    def set(self, key, value, expires_at):
+        connection = self._connection()
+        connection.execute(
+            "INSERT OR REPLACE INTO response_cache (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+            (key, value, expires_at, time.time())
+        )
+        self._writes += 1
+        if self._writes % self.EVICT_EVERY == 0:
+            self._evict(connection)
+        connection.commit()
+    
+    def delete(self, key):
+        connection = self._connection()
+        connection.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+        connection.commit()
+    
+    def _evict(self, connection):
+        connection.execute("DELETE FROM response_cache WHERE expires_at <= ?", (time.time(),))
+        cursor = connection.execute("""
+        DELETE FROM response_cache WHERE key IN (
+            SELECT key FROM response_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?
+        )
+        """, (self.max_entries,))
+        self.evictions += max(cursor.rowcount, 0)
+    
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+
+_PUNCTUATION = str.maketrans('', '', string.punctuation)
+
+def normalize_message(message):
+    """Lowercase, strip punctuation and collapse whitespace"""
+    return ' '.join(message.lower().translate(_PUNCTUATION).split())
+
+class ResponseCache:
+    """TTL cache of generated responses keyed by the canonical symptom/diagnosis context"""
+    
+    def __init__(self, backend, ttl=3600, top_diagnoses=3, include_message=True):
+        self.backend = backend
+        self.ttl = ttl
+        self.top_diagnoses = top_diagnoses
+        self.include_message = include_message
+        
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.sets = 0
+    
+    def make_key(self, user_message, detected_symptoms, diagnoses, prompt_version):
+        """Stable key: sorted symptoms, the top diagnoses, the prompt version and, unless disabled, the message"""
+        canonical = {
+            'symptoms': sorted({symptom.lower() for symptom in detected_symptoms}),
+            'diagnoses': [
+                [diagnosis['disease'], diagnosis['confidence']]
+                for diagnosis in diagnoses[:self.top_diagnoses]
+            ],
+            'prompt': prompt_version
+        }
+        if self.include_message:
+            canonical['message'] = normalize_message(user_message)
+        
+        encoded = json.dumps(canonical, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+    
+    def get(self, key):
+        """Return the cached response text, or None on a miss"""
+        try:
+            entry = self.backend.get(key)
+        except Exception as e:
+            print(f"Error reading response cache: {e}")
+            entry = None
+        
+        if entry is not None and entry[1] <= time.time():
+            self.backend.delete(key)
+            with self._lock:
+                self.expired += 1
+            entry = None
+        
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return entry[0]
+    
+    def set(self, key, response):
+        try:
+            self.backend.set(key, response, time.time() + self.ttl)
+        except Exception as e:
+            print(f"Error writing response cache: {e}")
+            return
+        with self._lock:
+            self.sets += 1
+    
+    def stats(self):
+        """Hit/miss counters for the admin endpoint"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': type(self.backend).__name__,
+                'entries': len(self.backend),
+                'max_entries': self.backend.max_entries,
+                'ttl': self.ttl,
+                'include_message': self.include_message,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'expired': self.expired,
+                'sets': self.sets,
+                'evictions': self.backend.evictions
+            }
+
+def create_response_cache():
+    """Build the response cache configured in the environment, or None when disabled"""
+    backend_name = os.getenv('RESPONSE_CACHE_BACKEND', 'memory').lower()
+    max_entries = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '1024'))
+    
+    if backend_name == 'memory':
+        backend = MemoryCacheBackend(max_entries=max_entries)
+    elif backend_name == 'sqlite':
+        backend = SQLiteCacheBackend(os.getenv('RESPONSE_CACHE_PATH', 'response_cache.sqlite3'), max_entries=max_entries)
+    elif backend_name in ('none', 'off', ''):
+        return None
+    else:
+        raise ValueError(f"Unknown RESPONSE_CACHE_BACKEND: {backend_name}")
+    
+    return ResponseCache(
+        backend,
+        ttl=float(os.getenv('RESPONSE_CACHE_TTL', '3600')),
+        top_diagnoses=int(os.getenv('RESPONSE_CACHE_TOP_DIAGNOSES', '3')),
+        include_message=os.getenv('RESPONSE_CACHE_INCLUDE_MESSAGE', 'true').lower() in ('1', 'true', 'yes', 'on')
+    )
@@ -0,0 +1,316 @@
+"""Archive user_interactions rows older than the retention window, then remove them from the database.
+
+On MySQL the table is range-partitioned by month on timestamp (migration 4);
+expired months are exported partition by partition and dropped whole with
+ALTER TABLE ... DROP PARTITION, and partitions for the coming months are
+split off p_future. On SQLite each expired month is exported by its
+timestamp range and deleted in chunks. Run it daily (or at least monthly)
+from cron:
+
+    python retention.py --months 12 --archive-dir /var/lib/chatbot/archive
+
+Exports go to gzipped JSONL files read back by archive.py, so /api/history
+and replay.py still see archived months. Rows are read in keyset chunks of
+--chunk-size, and a month is only dropped once its archive batch is on
+disk and a fresh COUNT(*) of the partition matches the rows archived; an
+interrupted run resumes where the last committed batch ended.
+"""
+import os
+import sys
+import time
+import argparse
+from datetime import date, datetime
+from dotenv import load_dotenv
+from archive import InteractionArchive
+
+# Load environment variables
+load_dotenv()
+
+FUTURE_PARTITION = 'p_future'
+
+EXPORT_COLUMNS = "id, user_id, message, response, timestamp"
+
+def month_start(value):
+    """First day of the month of a date or datetime"""
+    return date(value.year, value.month, 1)
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+def month_label(month):
+    return month.strftime('%Y-%m')
+
+def partition_name(month):
+    return month.strftime('p%Y%m')
+
+def month_partitions(first, end):
+    """Partition definitions for the months from first up to (not including) end, then p_future"""
+    definitions = []
+    month = first
+    while month < end:
+        definitions.append(f"PARTITION {partition_name(month)} VALUES LESS THAN ('{add_months(month, 1).isoformat()}')")
+        month = add_months(month, 1)
+    definitions.append(f"PARTITION {FUTURE_PARTITION} VALUES LESS THAN (MAXVALUE)")
+    return ',\n    '.join(definitions)
+
+def list_partitions(cursor):
+    """(name, month or None for p_future, estimated rows) of user_interactions in range order"""
+    cursor.execute("""
+    SELECT PARTITION_NAME, TABLE_ROWS FROM information_schema.PARTITIONS
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'user_interactions' AND PARTITION_NAME IS NOT NULL
+    ORDER BY PARTITION_ORDINAL_POSITION
+    """)
+    partitions = []
+    for name, rows in cursor.fetchall():
+        month = None if name == FUTURE_PARTITION else date(int(name[1:5]), int(name[5:7]), 1)
+        partitions.append((name, month, rows or 0))
+    return partitions
+
+def ensure_partitions(connection, months_ahead, today=None):
+    """Split p_future so every month up to months_ahead from now has its own partition; returns the new names"""
+    cursor = connection.cursor()
+    months = [month for _, month, _ in list_partitions(cursor) if month is not None]
+    if not months:
+        cursor.close()
+        raise RuntimeError("user_interactions is not partitioned; apply the migrations first")
+    
+    first = add_months(months[-1], 1)
+    end = add_months(month_start(today or date.today()), months_ahead + 1)
+    created = []
+    if first < end:
+        cursor.execute(f"ALTER TABLE user_interactions REORGANIZE PARTITION {FUTURE_PARTITION} INTO (\n    "
+                       f"{month_partitions(first, end)}\n)")
+        month = first
+        while month < end:
+            created.append(partition_name(month))
+            month = add_months(month, 1)
+    cursor.close()
+    return created
+
+class RetentionJob:
+    """Exports months before the retention window to an InteractionArchive and removes them"""
+    
+    def __init__(self, connection, dialect, archive, months=12, chunk_size=5000, dry_run=False,
+                 progress_interval=10.0, today=None):
+        if months < 1:
+            raise ValueError("Retention must keep at least the current month")
+        self.connection = connection
+        self.dialect = dialect
+        self.archive = archive
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        self.progress_interval = progress_interval
+        # The retention window counts the current month
+        self.keep_from = add_months(month_start(today or date.today()), 1 - months)
+        self._last_progress = time.monotonic()
+    
+    def _sql(self, statement):
+        return statement.replace('%s', '?') if self.dialect == 'sqlite' else statement
+    
+    def _scalar(self, cursor, statement, params=()):
+        cursor.execute(self._sql(statement), params)
+        return cursor.fetchall()[0][0]
+    
+    def _export(self, cursor, month, statement, params):
+        """Write every row of statement (keyset-paged on id) past the archived ones as one batch; returns its size"""
+        after_id = self.archive.archived_through(month_label(month), self.dialect) or 0
+        writer = None
+        try:
+            while True:
+                cursor.execute(self._sql(statement), params + (after_id, self.chunk_size))
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                if writer is None:
+                    writer = self.archive.writer(month_label(month), self.dialect)
+                for row in rows:
+                    writer.write(row)
+                after_id = rows[-1][0]
+                self._progress(month, writer.rows)
+        except BaseException:
+            if writer is not None:
+                writer.abort()
+            raise
+        
+        if writer is None:
+            return 0
+        writer.commit()
+        return writer.rows
+    
+    def _export_all(self, cursor, month, statement, params):
+        # Exporting again until nothing is left catches rows written while the last batch was read
+        total = 0
+        while True:
+            # End the read snapshot so each pass sees the rows committed since the last one
+            self.connection.commit()
+            rows = self._export(cursor, month, statement, params)
+            if not rows:
+                return total
+            total += rows
+    
+    def _progress(self, month, rows):
+        now = time.monotonic()
+        if now - self._last_progress >= self.progress_interval:
+            print(f"  {month_label(month)}: {rows} rows archived")
+            self._last_progress = now
+    
+    def run(self):
+        """Archive and remove every expired month; returns [(month, rows archived)] oldest first"""
+        if self.dialect == 'mysql':
+            return self._run_mysql()
+        return self._run_sqlite()
+    
+    def _run_mysql(self):
+        cursor = self.connection.cursor()
+        expired = [(name, month, rows) for name, month, rows in list_partitions(cursor)
+                   if month is not None and month < self.keep_from]
+        
+        done = []
+        for name, month, estimated_rows in expired:
+            if self.dry_run:
+                done.append((month_label(month), estimated_rows))
+                continue
+            
+            statement = (f"SELECT {EXPORT_COLUMNS} FROM user_interactions PARTITION ({name}) "
+                         "WHERE id > %s ORDER BY id LIMIT %s")
+            rows = self._export_all(cursor, month, statement, ())
+            # Writers wait from here to the drop, so no row lands in the partition after it is
+            # counted; rows committed during the export above are archived first
+            cursor.execute("LOCK TABLES user_interactions WRITE")
+            try:
+                rows += self._export_all(cursor, month, statement, ())
+                remaining = self._scalar(cursor, f"SELECT COUNT(*) FROM user_interactions PARTITION ({name})")
+                archived = self.archive.archived_rows(month_label(month), self.dialect)
+                if remaining != archived:
+                    raise RuntimeError(f"{name} holds {remaining} rows but {archived} are archived; not dropping it")
+                # Dropping the partition frees its space at once, with no per-row delete
+                cursor.execute(f"ALTER TABLE user_interactions DROP PARTITION {name}")
+            finally:
+                cursor.execute("UNLOCK TABLES")
+            done.append((month_label(month), rows))
+        cursor.close()
+        return done
+    
+    def _run_sqlite(self):
+        cursor = self.connection.cursor()
+        oldest = self._scalar(cursor, "SELECT MIN(timestamp) FROM user_interactions")
+        done = []
+        if oldest is None:
+            cursor.close()
+            return done
+        
+        month = month_start(datetime.fromisoformat(oldest))
+        while month < self.keep_from:
+            start = datetime(month.year, month.month, 1)
+            end = datetime.combine(add_months(month, 1), datetime.min.time())
+            expected_rows = self._scalar(
+                cursor, "SELECT COUNT(*) FROM user_interactions WHERE timestamp >= %s AND timestamp < %s", (start, end)
+            )
+            if expected_rows and self.dry_run:
+                done.append((month_label(month), expected_rows))
+            elif expected_rows:
+                statement = (f"SELECT {EXPORT_COLUMNS} FROM user_interactions "
+                             "WHERE timestamp >= %s AND timestamp < %s AND id > %s ORDER BY id LIMIT %s")
+                rows = self._export_all(cursor, month, statement, (start, end))
+                self._delete_archived(cursor, month, start, end)
+                done.append((month_label(month), rows))
+            month = add_months(month, 1)
+        cursor.close()
+        return done
+    
+    def _delete_archived(self, cursor, month, start, end):
+        # Only rows at or below the archived id are deleted, in short transactions
+        through = self.archive.archived_through(month_label(month), self.dialect)
+        if through is None:
+            return
+        while True:
+            cursor.execute(self._sql(
+                "DELETE FROM user_interactions WHERE id IN (SELECT id FROM user_interactions "
+                "WHERE timestamp >= %s AND timestamp < %s AND id <= %s LIMIT %s)"
+            ), (start, end, through, self.chunk_size))
+            deleted = cursor.rowcount
+            self.connection.commit()
+            if not deleted:
+                return
+
+def print_status(connection, dialect, archive):
+    cursor = connection.cursor()
+    if dialect == 'mysql':
+        print("Partitions (estimated rows):")
+        for name, month, rows in list_partitions(cursor):
+            print(f"  {name:<10} {month_label(month) if month else 'later':<8} {rows}")
+    else:
+        cursor.execute("SELECT strftime('%Y-%m', timestamp), COUNT(*) FROM user_interactions "
+                       "GROUP BY 1 ORDER BY 1")
+        print("Months in the database:")
+        for month, rows in cursor.fetchall():
+            print(f"  {month or 'no timestamp':<12} {rows}")
+    cursor.close()
+    
+    if archive is not None:
+        print(f"Archived months ({archive.directory}):")
+        for month in archive.months():
+            batches = archive.batches(month)
+            rows = sum(manifest['rows'] for _, manifest in batches)
+            print(f"  {month:<12} {rows} rows in {len(batches)} batch(es)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--months", type=int, default=int(os.getenv('INTERACTION_RETENTION_MONTHS', '12')),
+                        help="Months kept in the database, counting the current one")
+    parser.add_argument("--months-ahead", type=int, default=int(os.getenv('INTERACTION_PARTITIONS_AHEAD', '3')),
+                        help="Future months given a partition in advance (MySQL)")
+    parser.add_argument("--archive-dir", default=os.getenv('INTERACTION_ARCHIVE_DIR', ''),
+                        help="Directory of archived months")
+    parser.add_argument("--chunk-size", type=int, default=int(os.getenv('INTERACTION_ARCHIVE_CHUNK_SIZE', '5000')),
+                        help="Rows read per query")
+    parser.add_argument("--dry-run", action="store_true", help="List the months that would be archived")
+    parser.add_argument("--status", action="store_true", help="Show months in the database and the archive")
+    parser.add_argument("--progress-interval", type=float, default=10.0, help="Seconds between progress lines")
+    args = parser.parse_args()
+    
+    archive = InteractionArchive(args.archive_dir, int(os.getenv('INTERACTION_ARCHIVE_SHARDS', '16'))) \
+        if args.archive_dir else None
+    if archive is None and not args.status:
+        parser.error("set INTERACTION_ARCHIVE_DIR or pass --archive-dir")
+    
+    from migrations import apply_migrations
+    from storage import get_storage
+    
+    storage = get_storage()
+    connection = storage.connect()
+    if connection is None:
+        print("Failed to connect to the database")
+        return 1
+    
+    try:
+        if args.status:
+            print_status(connection, storage.dialect, archive)
+            return 0
+        
+        if storage.dialect == 'mysql':
+            # Partitioning arrives with migration 4
+            apply_migrations(connection)
+            if not args.dry_run:
+                created = ensure_partitions(connection, args.months_ahead)
+                if created:
+                    print(f"Created partitions {', '.join(created)}")
+        
+        job = RetentionJob(connection, storage.dialect, archive, months=args.months, chunk_size=args.chunk_size,
+                           dry_run=args.dry_run, progress_interval=args.progress_interval)
+        done = job.run()
+        verb = "Would archive" if args.dry_run else "Archived"
+        for month, rows in done:
+            print(f"{verb} {month}: {rows} rows")
+        if not done:
+            print(f"Nothing older than {month_label(job.keep_from)} to archive")
+    except Exception as e:
+        print(f"Retention failed (archived months are kept; re-running resumes): {e}")
+        return 1
+    finally:
+        connection.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
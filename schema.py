@@ -0,0 +1,94 @@
+"""Table and index definitions shared by the MySQL and SQLite storage backends.
+
+Columns use portable type names that each dialect renders in its own
+spelling. On MySQL the tables are created by setup_database() and the
+indexes by the versioned migrations in migrations.py; INDEXES lists the
+state those migrations leave behind, so a new MySQL index needs both a
+migration and an entry here. SQLite creates everything at once.
+
+Migration 4 also range-partitions user_interactions by month on MySQL
+(primary key (id, timestamp)) so retention.py can drop expired months.
+"""
+
+# Portable column types per dialect
+TYPES = {
+    'mysql': {
+        'serial': 'INT AUTO_INCREMENT PRIMARY KEY',
+        'name': 'VARCHAR(255)',
+        'key': 'VARCHAR(255)',
+        'text': 'TEXT',
+        'int': 'INT',
+        'float': 'FLOAT',
+        'datetime': 'DATETIME'
+    },
+    'sqlite': {
+        'serial': 'INTEGER PRIMARY KEY AUTOINCREMENT',
+        # MySQL's default collation compares names case-insensitively; keep lookups and uniqueness the same
+        'name': 'TEXT COLLATE NOCASE',
+        'key': 'TEXT',
+        'text': 'TEXT',
+        'int': 'INTEGER',
+        'float': 'REAL',
+        'datetime': 'DATETIME'
+    }
+}
+
+# (table, columns as (name, type, constraints), table constraints)
+TABLES = (
+    ('symptoms', (
+        ('id', 'serial', ''),
+        ('name', 'name', 'NOT NULL'),
+        ('description', 'text', '')
+    ), ()),
+    ('diseases', (
+        ('id', 'serial', ''),
+        ('name', 'name', 'NOT NULL'),
+        ('description', 'text', ''),
+        ('treatment', 'text', '')
+    ), ()),
+    ('symptoms_diseases', (
+        ('id', 'serial', ''),
+        ('symptom_id', 'int', ''),
+        ('disease_id', 'int', ''),
+        ('correlation_strength', 'float', '')
+    ), (
+        'FOREIGN KEY (symptom_id) REFERENCES symptoms(id)',
+        'FOREIGN KEY (disease_id) REFERENCES diseases(id)'
+    )),
+    ('user_interactions', (
+        ('id', 'serial', ''),
+        ('user_id', 'key', ''),
+        ('message', 'text', ''),
+        ('response', 'text', ''),
+        ('timestamp', 'datetime', 'DEFAULT CURRENT_TIMESTAMP')
+    ), ())
+)
+
+# (name, table, columns, unique): the indexes migrations 1-3 create on MySQL
+INDEXES = (
+    ('uq_symptoms_name', 'symptoms', ('name',), True),
+    ('uq_diseases_name', 'diseases', ('name',), True),
+    ('uq_symptoms_diseases_pair', 'symptoms_diseases', ('symptom_id', 'disease_id'), True),
+    ('idx_symptoms_diseases_disease', 'symptoms_diseases', ('disease_id', 'symptom_id'), False),
+    ('idx_user_interactions_user_timestamp', 'user_interactions', ('user_id', 'timestamp'), False),
+    ('idx_user_interactions_user_id', 'user_interactions', ('user_id', 'id'), False)
+)
+
+def create_table_statements(dialect):
+    """CREATE TABLE IF NOT EXISTS statements in dependency order"""
+    types = TYPES[dialect]
+    statements = []
+    for table, columns, constraints in TABLES:
+        definitions = [' '.join(filter(None, (name, types[kind], extra))) for name, kind, extra in columns]
+        definitions.extend(constraints)
+        body = ',\n    '.join(definitions)
+        statements.append(f"CREATE TABLE IF NOT EXISTS {table} (\n    {body}\n)")
+    return statements
+
+def create_index_statements(dialect):
+    """CREATE INDEX statements for INDEXES; only SQLite can skip existing ones"""
+    if_not_exists = 'IF NOT EXISTS ' if dialect == 'sqlite' else ''
+    return [
+        f"CREATE {'UNIQUE ' if unique else ''}INDEX {if_not_exists}{name} ON {table} ({', '.join(columns)})"
+        for name, table, columns, unique in INDEXES
+    ]
@@ -0,0 +1,133 @@
+import numpy as np
+
+class DiagnosisScoringEngine:
+    """Vectorized disease scoring over each symptom's relationships (compressed sparse rows)
+
+    Memory grows with the number of relationships, not symptoms x diseases; a query gathers
+    only the rows of its symptoms.
+    """
+
+    def __init__(self, symptom_ids, disease_ids, relationships,
+                 correlation_weight=0.7, coverage_weight=0.3, max_confidence=95.0):
+        self.correlation_weight = correlation_weight
+        self.coverage_weight = coverage_weight
+        self.max_confidence = max_confidence
+
+        self.symptom_index = {symptom_id: i for i, symptom_id in enumerate(symptom_ids)}
+        self.disease_ids = np.asarray(disease_ids)
+        disease_index = {disease_id: i for i, disease_id in enumerate(disease_ids)}
+        n_diseases = len(disease_ids)
+
+        # Row r's relationships are columns[indptr[r]:indptr[r + 1]] with their strengths;
+        # duplicated pairs stay separate entries and are summed when scored, as in SQL
+        self.disease_totals = np.zeros(n_diseases, dtype=np.float64)
+        entries = []
+        for symptom_id, disease_id, strength in relationships:
+            column = disease_index.get(disease_id)
+            if column is None:
+                continue
+            self.disease_totals[column] += 1
+            row = self.symptom_index.get(symptom_id)
+            if row is not None:
+                entries.append((row, column, strength or 0.0))
+        entries.sort(key=lambda entry: entry[0])
+
+        self.columns = np.fromiter((column for _, column, _ in entries), dtype=np.int32, count=len(entries))
+        self.strengths = np.fromiter((strength for _, _, strength in entries), dtype=np.float32, count=len(entries))
+        self.indptr = np.zeros(len(symptom_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(np.fromiter((row for row, _, _ in entries), dtype=np.int64, count=len(entries)),
+                              minlength=len(symptom_ids)), out=self.indptr[1:])
+
+        self._n_diseases = n_diseases
+
+    @property
+    def nbytes(self):
+        """Memory held by the relationship arrays"""
+        return self.columns.nbytes + self.strengths.nbytes + self.indptr.nbytes + self.disease_totals.nbytes
+
+    def _gather(self, rows):
+        """(disease columns, strengths) of every relationship of the given rows"""
+        slices = [slice(self.indptr[row], self.indptr[row + 1]) for row in rows]
+        if len(slices) == 1:
+            return self.columns[slices[0]], self.strengths[slices[0]]
+        return (np.concatenate([self.columns[part] for part in slices]),
+                np.concatenate([self.strengths[part] for part in slices]))
+
+    def rows_for(self, symptom_ids):
+        """Map symptom ids to matrix rows, dropping unknown ids and duplicates"""
+        return list(dict.fromkeys(
+            self.symptom_index[symptom_id]
+            for symptom_id in symptom_ids
+            if symptom_id in self.symptom_index
+        ))
+
+    def score(self, symptom_ids, top_k=None):
+        """Score one symptom set; returns (disease_id, correlation, matching, total, confidence) best first"""
+        rows = self.rows_for(symptom_ids)
+        if not rows or self._n_diseases == 0:
+            return []
+
+        # Per-disease SUM(correlation_strength) and COUNT(symptom_id) over the gathered rows,
+        # summed in double precision as MySQL's SUM over FLOAT columns is
+        columns, strengths = self._gather(rows)
+        correlations = np.bincount(columns, weights=strengths.astype(np.float64), minlength=self._n_diseases)
+        matching = np.bincount(columns, minlength=self._n_diseases).astype(np.float64)
+        return self._rank(correlations, matching, top_k)
+
+    def score_batch(self, symptom_id_sets, top_k=None):
+        """Score many symptom sets with one gather and bincount; results follow input order"""
+        row_sets = [self.rows_for(symptom_ids) for symptom_ids in symptom_id_sets]
+        if not any(row_sets) or self._n_diseases == 0:
+            return [[] for _ in row_sets]
+
+        # Offset each set's disease columns by set_index * D so one bincount scores the batch
+        n_diseases = self._n_diseases
+        columns, strengths = [], []
+        for i, rows in enumerate(row_sets):
+            if rows:
+                set_columns, set_strengths = self._gather(rows)
+                columns.append(set_columns.astype(np.int64) + i * n_diseases)
+                strengths.append(set_strengths)
+        columns = np.concatenate(columns)
+        size = len(row_sets) * n_diseases
+        correlations = np.bincount(columns, weights=np.concatenate(strengths).astype(np.float64), minlength=size)
+        matching = np.bincount(columns, minlength=size).astype(np.float64)
+        return [
+            self._rank(correlations[i * n_diseases:(i + 1) * n_diseases],
+                       matching[i * n_diseases:(i + 1) * n_diseases], top_k) if rows else []
+            for i, rows in enumerate(row_sets)
+        ]
+
+    def _rank(self, correlations, matching, top_k):
+        candidates = np.flatnonzero(matching > 0)
+        if top_k is not None and 0 < top_k < len(candidates):
+            # Keep everything tied with the k-th best correlation so the cut matches a full sort
+            candidate_scores = correlations[candidates]
+            kth = np.argpartition(-candidate_scores, top_k - 1)[top_k - 1]
+            candidates = candidates[candidate_scores >= candidate_scores[kth]]
+
+        # ORDER BY total_correlation DESC, matching_symptoms DESC
+        order = np.lexsort((-matching[candidates], -correlations[candidates]))
+        candidates = candidates[order]
+        if top_k is not None and top_k > 0:
+            candidates = candidates[:top_k]
+
+        results = []
+        for column in candidates:
+            correlation = float(correlations[column])
+            count = int(round(matching[column]))
+            total = int(self.disease_totals[column])
+
+            # Calculate confidence based on correlation and symptom coverage
+            symptom_coverage = count / total if total > 0 else 0
+            confidence = (correlation * self.correlation_weight + symptom_coverage * self.coverage_weight) * 100
+
+            results.append((
+                self.disease_ids[column].item(),
+                correlation,
+                count,
+                total,
+                min(round(confidence, 2), self.max_confidence)
+            ))
+
+        return results
@@ -2,6 +2,9 @@ import os
 import mysql.connector
 from mysql.connector import Error
 from dotenv import load_dotenv
+from migrations import apply_migrations
+from kb_importer import KnowledgeBaseImporter
+from schema import create_table_statements
 
 # Load environment variables
 load_dotenv()
@@ -41,50 +44,16 @@ def setup_database():
         cursor.execute(f"CREATE DATABASE IF NOT EXISTS {db_name}")
         cursor.execute(f"USE {db_name}")
         
-        # Create symptoms table
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS symptoms (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            name VARCHAR(255) NOT NULL,
-            description TEXT
-        )
-        """)
-        
-        # Create diseases table
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS diseases (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            name VARCHAR(255) NOT NULL,
-            description TEXT,
-            treatment TEXT
-        )
-        """)
-        
-        # Create symptoms_diseases relationship table
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS symptoms_diseases (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            symptom_id INT,
-            disease_id INT,
-            correlation_strength FLOAT,
-            FOREIGN KEY (symptom_id) REFERENCES symptoms(id),
-            FOREIGN KEY (disease_id) REFERENCES diseases(id)
-        )
-        """)
-        
-        # Create user_interactions table to store chat history
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS user_interactions (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            user_id VARCHAR(255),
-            message TEXT,
-            response TEXT,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-        """)
+        # Tables from the schema shared with the SQLite backend
+        for statement in create_table_statements('mysql'):
+            cursor.execute(statement)
         
         connection.commit()
         cursor.close()
+        
+        # Indexes and constraints are managed as versioned migrations
+        apply_migrations(connection)
+        
         connection.close()
         print("Database setup complete")
     except Error as e:
@@ -105,6 +74,7 @@ def populate_sample_data():
         cursor.close()
         connection.close()
         return
+    cursor.close()
     
     # Sample symptoms
     symptoms = [
@@ -138,86 +108,76 @@ def populate_sample_data():
         ("Gastroenteritis", "Inflammation of the stomach and intestines", "Fluids, rest, bland diet, anti-diarrheal medications")
     ]
     
-    # Insert symptoms
-    cursor.executemany("INSERT INTO symptoms (name, description) VALUES (%s, %s)", symptoms)
-    
-    # Insert diseases
-    cursor.executemany("INSERT INTO diseases (name, description, treatment) VALUES (%s, %s, %s)", diseases)
-    
-    # Get symptom and disease IDs for relationships
-    cursor.execute("SELECT id, name FROM symptoms")
-    symptoms_map = {name: id for id, name in cursor.fetchall()}
-    
-    cursor.execute("SELECT id, name FROM diseases")
-    diseases_map = {name: id for id, name in cursor.fetchall()}
-    
-    # Define symptom-disease relationships with correlation strength (0-1)
+    # Symptom-disease relationships by name with correlation strength (0-1)
     relationships = [
         # Common Cold symptoms
-        (symptoms_map["fever"], diseases_map["Common Cold"], 0.6),
-        (symptoms_map["cough"], diseases_map["Common Cold"], 0.8),
-        (symptoms_map["sore throat"], diseases_map["Common Cold"], 0.7),
-        (symptoms_map["headache"], diseases_map["Common Cold"], 0.5),
-        (symptoms_map["fatigue"], diseases_map["Common Cold"], 0.6),
-        (symptoms_map["runny nose"], diseases_map["Common Cold"], 0.9),
-        (symptoms_map["congestion"], diseases_map["Common Cold"], 0.8),
+        ("fever", "Common Cold", 0.6),
+        ("cough", "Common Cold", 0.8),
+        ("sore throat", "Common Cold", 0.7),
+        ("headache", "Common Cold", 0.5),
+        ("fatigue", "Common Cold", 0.6),
+        ("runny nose", "Common Cold", 0.9),
+        ("congestion", "Common Cold", 0.8),
         
         # Influenza symptoms
-        (symptoms_map["fever"], diseases_map["Influenza"], 0.9),
-        (symptoms_map["cough"], diseases_map["Influenza"], 0.7),
-        (symptoms_map["fatigue"], diseases_map["Influenza"], 0.9),
-        (symptoms_map["headache"], diseases_map["Influenza"], 0.7),
-        (symptoms_map["sore throat"], diseases_map["Influenza"], 0.5),
-        (symptoms_map["muscle pain"], diseases_map["Influenza"], 0.8),
-        (symptoms_map["runny nose"], diseases_map["Influenza"], 0.4),
+        ("fever", "Influenza", 0.9),
+        ("cough", "Influenza", 0.7),
+        ("fatigue", "Influenza", 0.9),
+        ("headache", "Influenza", 0.7),
+        ("sore throat", "Influenza", 0.5),
+        ("muscle pain", "Influenza", 0.8),
+        ("runny nose", "Influenza", 0.4),
         
         # COVID-19 symptoms
-        (symptoms_map["fever"], diseases_map["COVID-19"], 0.8),
-        (symptoms_map["cough"], diseases_map["COVID-19"], 0.8),
-        (symptoms_map["fatigue"], diseases_map["COVID-19"], 0.7),
-        (symptoms_map["shortness of breath"], diseases_map["COVID-19"], 0.7),
-        (symptoms_map["headache"], diseases_map["COVID-19"], 0.5),
-        (symptoms_map["sore throat"], diseases_map["COVID-19"], 0.4),
-        (symptoms_map["congestion"], diseases_map["COVID-19"], 0.4),
+        ("fever", "COVID-19", 0.8),
+        ("cough", "COVID-19", 0.8),
+        ("fatigue", "COVID-19", 0.7),
+        ("shortness of breath", "COVID-19", 0.7),
+        ("headache", "COVID-19", 0.5),
+        ("sore throat", "COVID-19", 0.4),
+        ("congestion", "COVID-19", 0.4),
         
         # Allergic Rhinitis symptoms
-        (symptoms_map["runny nose"], diseases_map["Allergic Rhinitis"], 0.9),
-        (symptoms_map["congestion"], diseases_map["Allergic Rhinitis"], 0.9),
-        (symptoms_map["headache"], diseases_map["Allergic Rhinitis"], 0.4),
-        (symptoms_map["sore throat"], diseases_map["Allergic Rhinitis"], 0.3),
+        ("runny nose", "Allergic Rhinitis", 0.9),
+        ("congestion", "Allergic Rhinitis", 0.9),
+        ("headache", "Allergic Rhinitis", 0.4),
+        ("sore throat", "Allergic Rhinitis", 0.3),
         
         # Bronchitis symptoms
-        (symptoms_map["cough"], diseases_map["Bronchitis"], 0.9),
-        (symptoms_map["shortness of breath"], diseases_map["Bronchitis"], 0.7),
-        (symptoms_map["chest pain"], diseases_map["Bronchitis"], 0.6),
-        (symptoms_map["fatigue"], diseases_map["Bronchitis"], 0.5),
+        ("cough", "Bronchitis", 0.9),
+        ("shortness of breath", "Bronchitis", 0.7),
+        ("chest pain", "Bronchitis", 0.6),
+        ("fatigue", "Bronchitis", 0.5),
         
         # Pneumonia symptoms
-        (symptoms_map["fever"], diseases_map["Pneumonia"], 0.8),
-        (symptoms_map["cough"], diseases_map["Pneumonia"], 0.9),
-        (symptoms_map["shortness of breath"], diseases_map["Pneumonia"], 0.9),
-        (symptoms_map["chest pain"], diseases_map["Pneumonia"], 0.7),
-        (symptoms_map["fatigue"], diseases_map["Pneumonia"], 0.7),
+        ("fever", "Pneumonia", 0.8),
+        ("cough", "Pneumonia", 0.9),
+        ("shortness of breath", "Pneumonia", 0.9),
+        ("chest pain", "Pneumonia", 0.7),
+        ("fatigue", "Pneumonia", 0.7),
         
         # Migraine symptoms
-        (symptoms_map["headache"], diseases_map["Migraine"], 0.9),
-        (symptoms_map["nausea"], diseases_map["Migraine"], 0.7),
-        (symptoms_map["vomiting"], diseases_map["Migraine"], 0.5),
-        (symptoms_map["dizziness"], diseases_map["Migraine"], 0.6),
+        ("headache", "Migraine", 0.9),
+        ("nausea", "Migraine", 0.7),
+        ("vomiting", "Migraine", 0.5),
+        ("dizziness", "Migraine", 0.6),
         
         # Gastroenteritis symptoms
-        (symptoms_map["nausea"], diseases_map["Gastroenteritis"], 0.8),
-        (symptoms_map["vomiting"], diseases_map["Gastroenteritis"], 0.8),
-        (symptoms_map["diarrhea"], diseases_map["Gastroenteritis"], 0.9),
-        (symptoms_map["fever"], diseases_map["Gastroenteritis"], 0.5),
-        (symptoms_map["fatigue"], diseases_map["Gastroenteritis"], 0.6)
+        ("nausea", "Gastroenteritis", 0.8),
+        ("vomiting", "Gastroenteritis", 0.8),
+        ("diarrhea", "Gastroenteritis", 0.9),
+        ("fever", "Gastroenteritis", 0.5),
+        ("fatigue", "Gastroenteritis", 0.6)
     ]
     
-    # Insert relationships
-    cursor.executemany("INSERT INTO symptoms_diseases (symptom_id, disease_id, correlation_strength) VALUES (%s, %s, %s)", relationships)
+    # Upsert by name, so running this again updates the rows instead of duplicating them
+    importer = KnowledgeBaseImporter(connection, progress_interval=0)
+    importer.import_symptoms({'name': name, 'description': description} for name, description in symptoms)
+    importer.import_diseases({'name': name, 'description': description, 'treatment': treatment}
+                             for name, description, treatment in diseases)
+    importer.import_relationships({'symptom': symptom, 'disease': disease, 'correlation_strength': strength}
+                                  for symptom, disease, strength in relationships)
     
-    connection.commit()
-    cursor.close()
     connection.close()
     print("Sample data populated")
 
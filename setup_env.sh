@@ -30,10 +30,13 @@ pip install mysql-connector-python
 pip install nltk
 pip install google-generativeai
 pip install python-dotenv
+pip install numpy
+pip install asgiref
+pip install uvicorn
 
 # Download NLTK data
 echo "Downloading NLTK data..."
-python -c "import nltk; nltk.download('punkt'); nltk.download('stopwords'); nltk.download('wordnet')"
+python -c "import nltk; nltk.download('punkt'); nltk.download('punkt_tab'); nltk.download('stopwords'); nltk.download('wordnet'); nltk.download('words')"
 
 # Create requirements.txt
 echo "Creating requirements.txt..."
@@ -48,11 +51,137 @@ cat > .env.template << EOL
 # Gemini API Key
 GEMINI_API_KEY=your_gemini_api_key_here
 
+# Storage backend: mysql, or sqlite for a single-node deployment without a MySQL server
+STORAGE_BACKEND=mysql
+SQLITE_PATH=medical_chatbot.sqlite3
+# Seconds a SQLite writer waits for another process's write lock
+SQLITE_BUSY_TIMEOUT=5
+
 # MySQL Database Configuration
 MYSQL_HOST=localhost
 MYSQL_USER=your_mysql_username
 MYSQL_PASSWORD=your_mysql_password
 MYSQL_DATABASE=medical_chatbot
+
+# MySQL Connection Pool
+MYSQL_POOL_SIZE=5
+MYSQL_POOL_MAX_OVERFLOW=10
+MYSQL_POOL_TIMEOUT=10
+MYSQL_POOL_RECYCLE=3600
+MYSQL_POOL_PRE_PING=true
+
+# Knowledge Base Snapshot (seconds between change checks, 0 disables)
+KNOWLEDGE_BASE_REFRESH_INTERVAL=300
+
+# Admin endpoints require this value in the X-Admin-Token header when set
+ADMIN_TOKEN=
+
+# Maximum diagnoses returned per message; 0 (the default) returns every match
+DIAGNOSIS_TOP_K=0
+
+# Gemini calls: max in flight and per-response deadline in seconds (retries and hedges included)
+GEMINI_MAX_CONCURRENCY=100
+GEMINI_TIMEOUT=30
+# Retries after a failed call (full-jitter backoff from GEMINI_RETRY_BACKOFF seconds);
+# GEMINI_HEDGE_DELAY > 0 sends a duplicate call when the first is still pending after that many seconds
+GEMINI_MAX_RETRIES=1
+GEMINI_RETRY_BACKOFF=0.2
+GEMINI_HEDGE_DELAY=0
+# Circuit breaker: consecutive failures before answering locally, seconds before a recovery probe
+GEMINI_BREAKER_FAILURES=5
+GEMINI_BREAKER_COOLDOWN=30
+# Admission control for /api/chat and /api/chat/stream (all limits per process).
+# Token buckets: sustained messages per second and burst per user_id (client address without one),
+# and for the whole process (0 disables either; both are off by default); a batch is charged one token
+# per message. Over a user's rate the answer is 429 with Retry-After
+CHAT_USER_RATE=0
+CHAT_USER_BURST=10
+CHAT_MAX_TRACKED_USERS=100000
+CHAT_GLOBAL_RATE=0
+CHAT_GLOBAL_BURST=100
+# Requests generating at once (0 = unlimited); others wait up to CHAT_QUEUE_TARGET_MS, at most CHAT_MAX_QUEUE
+# of them. Left empty it is GUNICORN_THREADS - 2 under gunicorn.conf.py, so spare threads answer overflow
+# at once, and GEMINI_MAX_CONCURRENCY otherwise (asgi.py, the development server). Each generation of
+# /api/chat/batch takes its own slot
+CHAT_MAX_IN_FLIGHT=
+CHAT_MAX_QUEUE=32
+CHAT_QUEUE_TARGET_MS=500
+# Over the queue-wait target or the global rate: degrade (answer locally without Gemini) or shed (503)
+CHAT_OVERLOAD_POLICY=degrade
+# Gemini model; gemini-pro (1.0) takes no system instruction, so it is sent inline with every prompt
+GEMINI_MODEL=gemini-pro
+
+# Prompt context: at most PROMPT_TOP_K diagnoses within PROMPT_CONTEXT_TOKENS (estimated),
+# with descriptions and treatments clipped to PROMPT_FIELD_CHARS characters
+PROMPT_TOP_K=3
+PROMPT_CONTEXT_TOKENS=300
+PROMPT_FIELD_CHARS=160
+
+# LLM response cache: memory, sqlite (shared file) or none
+RESPONSE_CACHE_BACKEND=memory
+RESPONSE_CACHE_PATH=response_cache.sqlite3
+RESPONSE_CACHE_TTL=3600
+RESPONSE_CACHE_MAX_ENTRIES=1024
+RESPONSE_CACHE_TOP_DIAGNOSES=3
+# Replies can quote the message, so keys include it; false shares replies across messages
+# with the same symptoms and diagnoses. Messages without symptoms are never cached.
+RESPONSE_CACHE_INCLUDE_MESSAGE=true
+
+# Interaction logging: async (batched write-behind) or sync (one INSERT per message)
+INTERACTION_WRITE_MODE=async
+INTERACTION_BATCH_SIZE=100
+INTERACTION_FLUSH_INTERVAL=1.0
+INTERACTION_MAX_QUEUE=10000
+# When the queue is full: block, drop or spill (append to INTERACTION_SPILL_PATH, which the
+# workers on a host share; one of them at a time replays it once the database is reachable)
+INTERACTION_OVERFLOW_POLICY=block
+INTERACTION_BLOCK_TIMEOUT=5.0
+INTERACTION_SPILL_PATH=interactions_spill.jsonl
+# Retention (retention.py): months of interactions kept in the database, counting the current one;
+# older months are exported to INTERACTION_ARCHIVE_DIR (gzipped JSONL, user-sharded) and removed.
+# History and replays read the archive when the directory is set. On MySQL user_interactions is
+# partitioned by month, with partitions created INTERACTION_PARTITIONS_AHEAD months in advance
+INTERACTION_RETENTION_MONTHS=12
+INTERACTION_PARTITIONS_AHEAD=3
+INTERACTION_ARCHIVE_DIR=
+INTERACTION_ARCHIVE_SHARDS=16
+INTERACTION_ARCHIVE_CHUNK_SIZE=5000
+# Batch triage (/api/chat/batch): messages accepted per request and concurrent LLM generations
+BATCH_MAX_MESSAGES=1000
+BATCH_MAX_WORKERS=8
+
+# Observability: log requests slower than this as JSON lines (0 disables);
+# add a Server-Timing header with the per-stage breakdown to responses
+SLOW_REQUEST_THRESHOLD_MS=2000
+STAGE_TIMING_HEADER=false
+
+# Conversation history (/api/history): recent turns kept in memory per user,
+# LRU-evicted across users under a global byte cap; entries are reloaded after the TTL, so turns
+# written by other workers appear within HISTORY_CACHE_TTL seconds
+HISTORY_CACHE_TURNS=20
+HISTORY_CACHE_MAX_USERS=10000
+HISTORY_CACHE_MAX_BYTES=67108864
+HISTORY_CACHE_TTL=300
+HISTORY_MAX_PAGE_SIZE=100
+
+# /api/symptoms: browser/proxy cache lifetime in seconds and largest page size
+SYMPTOMS_CACHE_MAX_AGE=300
+SYMPTOMS_MAX_PAGE_SIZE=1000
+
+# kb_importer.py: rows per upsert transaction
+KB_IMPORT_CHUNK_SIZE=1000
+
+# Typo-tolerant symptom matching: max edits per word (0 = exact aliases only)
+FUZZY_MAX_DISTANCE=2
+# Inflection-tolerant symptom matching ("coughs", "my joints ache"): wordnet (fails at startup without
+# the WordNet corpus), porter or none; lemmas of distinct words cached per process
+SYMPTOM_LEMMATIZER=wordnet
+LEMMA_CACHE_SIZE=50000
+
+# gunicorn (gunicorn.conf.py): worker processes, threads per worker, warm up in the master before fork
+WEB_CONCURRENCY=4
+GUNICORN_THREADS=8
+GUNICORN_PRELOAD=true
 EOL
 
 # Create actual .env file if it doesn't exist
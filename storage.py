@@ -0,0 +1,377 @@
+import os
+import uuid
+import sqlite3
+import hashlib
+import threading
+from functools import lru_cache
+from datetime import datetime
+from contextlib import contextmanager
+from dotenv import load_dotenv
+from schema import create_index_statements, create_table_statements
+
+# Load environment variables
+load_dotenv()
+
+KNOWLEDGE_BASE_TABLES = ('symptoms', 'diseases', 'symptoms_diseases')
+
+SELECT_SYMPTOMS = "SELECT id, name, description FROM symptoms ORDER BY id"
+SELECT_DISEASES = "SELECT id, name, description, treatment FROM diseases ORDER BY id"
+SELECT_RELATIONSHIPS = "SELECT symptom_id, disease_id, correlation_strength FROM symptoms_diseases ORDER BY id"
+
+INSERT_INTERACTIONS = (
+    "INSERT INTO user_interactions (user_id, message, response, timestamp) VALUES (%s, %s, %s, %s)"
+)
+
+# Keyset pagination of a user's turns on (user_id, id)
+TURN_COLUMNS = ('id', 'message', 'response', 'timestamp')
+SELECT_TURNS = (
+    "SELECT id, message, response, timestamp FROM user_interactions "
+    "WHERE user_id = %s ORDER BY id DESC LIMIT %s"
+)
+SELECT_TURNS_BEFORE = (
+    "SELECT id, message, response, timestamp FROM user_interactions "
+    "WHERE user_id = %s AND id < %s ORDER BY id DESC LIMIT %s"
+)
+
+# Every logged message in id order, for offline replays (replay.py)
+SELECT_MESSAGES = "SELECT id, message FROM user_interactions WHERE id > %s ORDER BY id"
+
+def diagnosis_query(symptoms, top_k=0):
+    """Single set-based statement: resolve symptom names, aggregate matches and count each disease's symptoms"""
+    placeholders = ','.join(['%s'] * len(symptoms))
+    query = f"""
+    WITH matched AS (
+        SELECT sd.disease_id,
+               SUM(sd.correlation_strength) AS total_correlation,
+               COUNT(sd.symptom_id) AS matching_symptoms
+        FROM symptoms s
+        JOIN symptoms_diseases sd ON sd.symptom_id = s.id
+        WHERE s.name IN ({placeholders})
+        GROUP BY sd.disease_id
+    ),
+    totals AS (
+        -- CROSS JOIN keeps SQLite from scanning every relationship (MySQL reads it as JOIN)
+        SELECT sd.disease_id, COUNT(*) AS total_symptoms
+        FROM matched m
+        CROSS JOIN symptoms_diseases sd ON sd.disease_id = m.disease_id
+        GROUP BY sd.disease_id
+    )
+    SELECT d.id, d.name, d.description, d.treatment,
+           m.total_correlation, m.matching_symptoms, t.total_symptoms
+    FROM matched m
+    JOIN totals t ON t.disease_id = m.disease_id
+    JOIN diseases d ON d.id = m.disease_id
+    ORDER BY m.total_correlation DESC, m.matching_symptoms DESC
+    """
+    params = tuple(symptoms)
+    if top_k:
+        query += "LIMIT %s\n"
+        params += (top_k,)
+    return query, params
+
+class StorageUnavailable(ConnectionError):
+    """Raised when the storage backend cannot be reached"""
+
+class Storage:
+    """Knowledge-base reads, interaction writes and history reads over one database engine
+
+    Statements are written once with %s placeholders; subclasses supply connections and
+    the few operations whose SQL differs between engines.
+    """
+    
+    dialect = None
+    
+    @contextmanager
+    def _connection(self):
+        raise NotImplementedError
+    
+    def _sql(self, statement):
+        return statement
+    
+    def connect(self):
+        """A new connection of its own for bulk work (kb_importer); the caller closes it"""
+        raise NotImplementedError
+    
+    def setup(self):
+        """Create the schema"""
+        raise NotImplementedError
+    
+    def dispose(self):
+        """Close idle connections, e.g. before forking workers"""
+    
+    def knowledge_base_version(self):
+        """A tag that changes whenever the knowledge-base tables change"""
+        raise NotImplementedError
+    
+    def insert_interactions(self, rows):
+        """Insert (user_id, message, response, timestamp) rows; returns their ids in row order"""
+        raise NotImplementedError
+    
+    def _streaming_cursor(self, connection):
+        return connection.cursor()
+    
+    def stream_messages(self, after_id=0, limit=None, batch_size=1000):
+        """Yield (id, message) rows with id > after_id in id order, holding batch_size rows at a time
+
+        Rows come from a server-side cursor on a connection of its own, which stays open
+        until the generator is exhausted or closed.
+        """
+        statement, params = SELECT_MESSAGES, (after_id,)
+        if limit:
+            statement += " LIMIT %s"
+            params += (limit,)
+        
+        connection = self.connect()
+        if connection is None:
+            raise StorageUnavailable("Cannot open a connection for streaming")
+        try:
+            cursor = self._streaming_cursor(connection)
+            cursor.execute(self._sql(statement), params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            # Closing the connection discards any unread rows of an abandoned stream
+            connection.close()
+    
+    def load_knowledge_base(self):
+        """(symptoms, diseases, relationships) rows in id order"""
+        with self._connection() as connection:
+            cursor = connection.cursor()
+            tables = []
+            for statement in (SELECT_SYMPTOMS, SELECT_DISEASES, SELECT_RELATIONSHIPS):
+                cursor.execute(self._sql(statement))
+                tables.append(cursor.fetchall())
+            cursor.close()
+        return tuple(tables)
+    
+    def fetch_symptoms(self):
+        """(id, name, description) rows in id order"""
+        with self._connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute(self._sql(SELECT_SYMPTOMS))
+            rows = cursor.fetchall()
+            cursor.close()
+        return rows
+    
+    def rank_diseases(self, symptoms, top_k=0):
+        """(id, name, description, treatment, correlation, matching, total) rows, best match first"""
+        query, params = diagnosis_query(symptoms, top_k)
+        with self._connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute(self._sql(query), params)
+            rows = cursor.fetchall()
+            cursor.close()
+        return rows
+    
+    def fetch_turns(self, user_id, limit, before_id=None):
+        """Newest-first turns (dicts) older than before_id"""
+        if before_id is None:
+            statement, params = SELECT_TURNS, (user_id, limit)
+        else:
+            statement, params = SELECT_TURNS_BEFORE, (user_id, before_id, limit)
+        
+        with self._connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute(self._sql(statement), params)
+            rows = cursor.fetchall()
+            cursor.close()
+        return [dict(zip(TURN_COLUMNS, row)) for row in rows]
+
+class MySQLStorage(Storage):
+    """The MySQL database through the process-wide connection pool (or the given one)"""
+    
+    dialect = 'mysql'
+    
+    def __init__(self, pool=None):
+        self.pool = pool
+    
+    @contextmanager
+    def _connection(self):
+        # Imported here because database imports this module for sample data
+        from database import db_connection
+        with db_connection(self.pool) as connection:
+            if connection is None:
+                raise StorageUnavailable("MySQL is unreachable")
+            yield connection
+    
+    def connect(self):
+        from database import create_db_connection
+        return create_db_connection()
+    
+    def setup(self):
+        from database import setup_database
+        setup_database()
+    
+    def dispose(self):
+        from database import get_pool
+        (self.pool or get_pool()).dispose()
+    
+    def knowledge_base_version(self):
+        with self._connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute(f"CHECKSUM TABLE {', '.join(KNOWLEDGE_BASE_TABLES)}")
+            checksums = cursor.fetchall()
+            cursor.close()
+        
+        digest = hashlib.sha1(repr(sorted(checksums)).encode('utf-8'))
+        return digest.hexdigest()[:16]
+    
+    def insert_interactions(self, rows):
+        with self._connection() as connection:
+            cursor = connection.cursor()
+            cursor.executemany(INSERT_INTERACTIONS, rows)
+            # executemany sends one multi-row INSERT, and InnoDB reserves a block of consecutive
+            # ids for it (a "simple insert" in every innodb_autoinc_lock_mode); lastrowid is the first
+            first_id = cursor.lastrowid
+            connection.commit()
+            cursor.close()
+        return [first_id + offset for offset in range(len(rows))]
+    
+    def _streaming_cursor(self, connection):
+        # Unbuffered: rows are read off the socket as they are fetched instead of all at once.
+        # The server waits on a slow consumer, so allow it more than the default 60 s to send.
+        cursor = connection.cursor()
+        cursor.execute("SET SESSION net_write_timeout = 3600")
+        cursor.close()
+        return connection.cursor(buffered=False)
+
+# DATETIME columns come back as datetime objects, as they do from mysql.connector
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(' '))
+sqlite3.register_converter('DATETIME', lambda value: datetime.fromisoformat(value.decode('utf-8')))
+
+INSERT_INTERACTION_RETURNING = (
+    "INSERT INTO user_interactions (user_id, message, response, timestamp) VALUES (?, ?, ?, ?) RETURNING id"
+)
+
+@lru_cache(maxsize=None)
+def _qmark(statement):
+    return statement.replace('%s', '?')
+
+class SQLiteStorage(Storage):
+    """Embedded SQLite file for single-node deployments: WAL journal, one connection per thread
+
+    CHECKSUM TABLE has no SQLite equivalent, so triggers count changes to the knowledge-base
+    tables in knowledge_base_version.
+    """
+    
+    dialect = 'sqlite'
+    
+    # Compiled statements kept per connection; the diagnosis query varies with the symptom count
+    CACHED_STATEMENTS = 256
+    
+    def __init__(self, path, busy_timeout=5.0):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self.setup()
+    
+    def _open(self):
+        connection = sqlite3.connect(self.path, timeout=self.busy_timeout, detect_types=sqlite3.PARSE_DECLTYPES,
+                                     cached_statements=self.CACHED_STATEMENTS)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute("PRAGMA foreign_keys=ON")
+        return connection
+    
+    @contextmanager
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        # A forked worker inherits the parent's thread-local; SQLite connections must not cross fork
+        if connection is None or self._local.pid != os.getpid():
+            try:
+                connection = self._open()
+            except sqlite3.Error as e:
+                raise StorageUnavailable(f"Cannot open SQLite database {self.path}: {e}") from e
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        try:
+            yield connection
+        except Exception:
+            if connection.in_transaction:
+                connection.rollback()
+            raise
+    
+    def _sql(self, statement):
+        return _qmark(statement)
+    
+    def connect(self):
+        return self._open()
+    
+    def setup(self):
+        connection = self._open()
+        try:
+            for statement in create_table_statements('sqlite') + create_index_statements('sqlite'):
+                connection.execute(statement)
+            
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS knowledge_base_version (generation TEXT NOT NULL, changes INTEGER NOT NULL)"
+            )
+            # A fresh generation per database file, so a recreated file never repeats an old version
+            connection.execute(
+                "INSERT INTO knowledge_base_version (generation, changes) "
+                "SELECT ?, 0 WHERE NOT EXISTS (SELECT 1 FROM knowledge_base_version)",
+                (uuid.uuid4().hex,)
+            )
+            for table in KNOWLEDGE_BASE_TABLES:
+                for event in ('INSERT', 'UPDATE', 'DELETE'):
+                    connection.execute(
+                        f"CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_version AFTER {event} ON {table} "
+                        "BEGIN UPDATE knowledge_base_version SET changes = changes + 1; END"
+                    )
+            connection.commit()
+        finally:
+            connection.close()
+    
+    def dispose(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None and self._local.pid == os.getpid():
+            connection.close()
+        self._local.connection = None
+    
+    def knowledge_base_version(self):
+        with self._connection() as connection:
+            generation, changes = connection.execute(
+                "SELECT generation, changes FROM knowledge_base_version"
+            ).fetchone()
+        return hashlib.sha1(f"{generation}:{changes}".encode('utf-8')).hexdigest()[:16]
+    
+    def insert_interactions(self, rows):
+        with self._connection() as connection:
+            # SQLite's lastrowid is the last row's id and ids need not be consecutive,
+            # so each row reports its own id; the statement is compiled once for the batch
+            cursor = connection.cursor()
+            ids = [cursor.execute(INSERT_INTERACTION_RETURNING, row).fetchone()[0] for row in rows]
+            connection.commit()
+            cursor.close()
+        return ids
+
+def create_storage():
+    """Build the storage backend configured in the environment"""
+    backend = os.getenv('STORAGE_BACKEND', 'mysql').lower()
+    if backend == 'mysql':
+        return MySQLStorage()
+    if backend == 'sqlite':
+        return SQLiteStorage(os.getenv('SQLITE_PATH', 'medical_chatbot.sqlite3'),
+                             busy_timeout=float(os.getenv('SQLITE_BUSY_TIMEOUT', '5')))
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
+
+_storage = None
+_storage_lock = threading.Lock()
+
+def get_storage():
+    """Return the process-wide storage backend, creating it on first use"""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = create_storage()
+    return _storage
+
+def configure_storage(storage):
+    """Replace the process-wide storage backend (e.g. for benchmarks)"""
+    global _storage
+    with _storage_lock:
+        _storage = storage
@@ -0,0 +1,100 @@
+import gzip
+import json
+import bisect
+import hashlib
+import threading
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:
+    # Optional: without it only gzip and identity bodies are offered
+    brotli = None
+
+SYMPTOM_FIELDS = ('id', 'name', 'description')
+
+# Bodies smaller than this are not worth the compression headers
+MIN_COMPRESS_BYTES = 512
+
+def parse_fields(raw):
+    """Validate a ?fields= projection; returns the fields in canonical order"""
+    if not raw:
+        return SYMPTOM_FIELDS
+    requested = {field.strip() for field in raw.split(',') if field.strip()}
+    unknown = requested - set(SYMPTOM_FIELDS)
+    if unknown or not requested:
+        raise ValueError(f"fields must be a comma-separated subset of {', '.join(SYMPTOM_FIELDS)}")
+    return tuple(field for field in SYMPTOM_FIELDS if field in requested)
+
+class CatalogPage:
+    """One serialised /api/symptoms body with its precompressed variants and validator"""
+    
+    __slots__ = ('body', 'encoded', 'etag', 'next_cursor')
+    
+    def __init__(self, body, next_cursor):
+        self.body = body
+        self.next_cursor = next_cursor
+        # Served as a weak validator: the gzip and brotli variants are the same representation
+        self.etag = hashlib.sha1(body).hexdigest()[:20]
+        self.encoded = {}
+        if len(body) >= MIN_COMPRESS_BYTES:
+            self.encoded['gzip'] = gzip.compress(body, compresslevel=9, mtime=0)
+            if brotli is not None:
+                self.encoded['br'] = brotli.compress(body, quality=11)
+    
+    def negotiate(self, accept_encoding):
+        """Return (content encoding or None, body bytes) for an Accept-Encoding header"""
+        accepted = set()
+        for part in (accept_encoding or '').split(','):
+            coding, _, params = part.strip().partition(';')
+            if coding and params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+                accepted.add(coding.strip().lower())
+        for coding in ('br', 'gzip'):
+            if coding in self.encoded and (coding in accepted or '*' in accepted):
+                return coding, self.encoded[coding]
+        return None, self.body
+
+def render_page(rows, fields=SYMPTOM_FIELDS, after_id=None, limit=None):
+    """Serialise symptom rows (id, name, description) in id order, optionally one keyset page"""
+    start = 0
+    if after_id is not None:
+        start = bisect.bisect_right([row[0] for row in rows], after_id)
+    stop = len(rows) if limit is None else min(start + limit, len(rows))
+    
+    indexes = [SYMPTOM_FIELDS.index(field) for field in fields]
+    items = [
+        {SYMPTOM_FIELDS[i]: row[i] for i in indexes}
+        for row in rows[start:stop]
+    ]
+    next_cursor = rows[stop - 1][0] if limit is not None and stop < len(rows) and stop > start else None
+    body = json.dumps(items, separators=(',', ':')).encode('utf-8')
+    return CatalogPage(body, next_cursor)
+
+class SymptomCatalog:
+    """Rendered pages keyed by knowledge-base version, so bodies are rebuilt only when symptoms change"""
+    
+    def __init__(self, max_pages=256):
+        self.max_pages = max_pages
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.builds = 0
+    
+    def page(self, version, rows, fields=SYMPTOM_FIELDS, after_id=None, limit=None):
+        key = (version, fields, after_id, limit)
+        with self._lock:
+            page = self._pages.get(key)
+            if page is not None:
+                self._pages.move_to_end(key)
+                self.hits += 1
+                return page
+        
+        page = render_page(rows, fields, after_id, limit)
+        with self._lock:
+            # Pages of older versions age out through the LRU
+            self._pages[key] = page
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.max_pages:
+                self._pages.popitem(last=False)
+            self.builds += 1
+        return page
@@ -0,0 +1,136 @@
+from collections import deque
+from fuzzy_index import FuzzyIndex
+
+# Inflections accepted after a pattern before the closing word boundary ("coughs", "headaches")
+_SUFFIXES = ('', 's', 'es')
+
+class SymptomMatcher:
+    """Aho-Corasick automaton that finds symptom phrases in one pass over a message"""
+
+    def __init__(self, vocabulary, max_edit_distance=0, normalizer=None, is_word=None, dictionary=None):
+        """Build the automaton from an ordered iterable of (canonical symptom, aliases)
+
+        With max_edit_distance > 0, misspelled words are also corrected against the alias words,
+        unless dictionary holds an ordinary word at least as close (see FuzzyIndex).
+        With a TokenNormalizer, messages are also matched after lemmatization ("my joints ache"
+        finds the alias "joint ache"). The lemma form of an alias is added only when each of its
+        words is an alias word already ("aching joint" -> "ache joint") or, given is_word, no
+        word at all (a Porter stem such as "ach"), so a lemma that is a different word ("tired" ->
+        "tire", "exhausted" -> "exhaust") never becomes a pattern.
+        """
+        self.normalizer = normalizer
+        self.symptoms = []
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [()]
+        words = []
+        patterns = []
+
+        for canonical, aliases in vocabulary:
+            symptom_index = len(self.symptoms)
+            self.symptoms.append(canonical)
+            for alias in aliases:
+                pattern = ' '.join(alias.lower().split())
+                if pattern:
+                    self._add(pattern, symptom_index)
+                    words.extend(pattern.split())
+                    patterns.append((pattern, symptom_index))
+
+        if normalizer is not None:
+            alias_words = set(words)
+
+            def same_word(lemma):
+                return lemma in alias_words or (is_word is not None and not is_word(lemma))
+
+            for pattern, symptom_index in patterns:
+                lemma_pattern = normalizer.normalize(pattern)
+                if lemma_pattern and lemma_pattern != pattern and all(map(same_word, lemma_pattern.split())):
+                    self._add(lemma_pattern, symptom_index)
+
+        self._build_failure_links()
+        self.fuzzy_index = (FuzzyIndex(words, max_edit_distance, dictionary=dictionary, is_word=is_word)
+                            if max_edit_distance > 0 else None)
+
+    @property
+    def node_count(self):
+        return len(self._goto)
+
+    def _add(self, pattern, symptom_index):
+        node = 0
+        for char in pattern:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(())
+            node = next_node
+        self._output[node] = self._output[node] + ((len(pattern), symptom_index),)
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[child] = target if target != child else 0
+
+                # Inherit the matches of the longest proper suffix
+                if self._output[self._fail[child]]:
+                    self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def find(self, text):
+        """Return the canonical symptoms mentioned in text as whole words, in vocabulary order"""
+        text = ' '.join(text.lower().split())
+        found = self._find_indexes(text)
+
+        corrected = text
+        if self.fuzzy_index is not None:
+            corrected = self.fuzzy_index.correct(text)
+            if corrected != text:
+                found |= self._find_indexes(corrected)
+
+        if self.normalizer is not None:
+            normalized = self.normalizer.normalize(corrected)
+            if normalized != corrected:
+                found |= self._find_indexes(normalized)
+
+        return [self.symptoms[i] for i in sorted(found)]
+
+    def _find_indexes(self, text):
+        goto, fail, output = self._goto, self._fail, self._output
+        length = len(text)
+        found = set()
+
+        node = 0
+        for end, char in enumerate(text, 1):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+
+            for pattern_length, symptom_index in output[node]:
+                if symptom_index in found:
+                    continue
+                start = end - pattern_length
+                if start > 0 and text[start - 1].isalnum():
+                    continue
+                if self._ends_word(text, end, length):
+                    found.add(symptom_index)
+
+        return found
+
+    @staticmethod
+    def _ends_word(text, end, length):
+        for suffix in _SUFFIXES:
+            stop = end + len(suffix)
+            if stop > length:
+                break
+            if text[end:stop] == suffix and (stop == length or not text[stop].isalnum()):
+                return True
+        return False
@@ -0,0 +1,123 @@
+import os
+import re
+import threading
+from functools import lru_cache
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Runs of letters and digits; everything else separates words, as stripping punctuation did
+_TOKEN = re.compile(r'[a-z0-9]+')
+
+# Distinct tokens whose lemma is remembered; chat messages reuse a few thousand everyday words
+LEMMA_CACHE_SIZE = 50000
+
+class NLTKResourceError(RuntimeError):
+    """Raised when required NLTK data is not installed locally"""
+
+def tokenize(text):
+    """Lowercased words of text"""
+    return _TOKEN.findall(text.lower())
+
+def wordnet_lemmatizer():
+    """WordNet lemma as a noun, else as a verb ("coughs" -> "cough", "aching" -> "ache")
+
+    Raises LookupError when the WordNet corpus is not installed.
+    """
+    from nltk.stem import WordNetLemmatizer
+    lemmatizer = WordNetLemmatizer()
+    # The corpus loads lazily; touch it so missing data fails here
+    lemmatizer.lemmatize("warming")
+
+    def lemmatize(token):
+        lemma = lemmatizer.lemmatize(token)
+        return lemma if lemma != token else lemmatizer.lemmatize(token, 'v')
+    return lemmatize
+
+def porter_stemmer():
+    """Porter stem of a token; rule-based, so it needs no NLTK data"""
+    from nltk.stem.porter import PorterStemmer
+    return PorterStemmer().stem
+
+class TokenNormalizer:
+    """Lowercases and regex-tokenizes text and lemmatizes each distinct token once
+
+    Lemmas are kept in a bounded LRU cache, so a message costs one regex scan and a
+    dictionary lookup per word once its vocabulary has been seen.
+    """
+
+    def __init__(self, lemmatize, cache_size=LEMMA_CACHE_SIZE, name=None):
+        self.name = name
+        self._lemma = lru_cache(maxsize=cache_size)(lemmatize)
+
+    def lemma(self, token):
+        return self._lemma(token)
+
+    def tokens(self, text):
+        """Lemmas of the words of text, in order"""
+        lemma = self._lemma
+        return [lemma(token) for token in tokenize(text)]
+
+    def normalize(self, text):
+        """text as space-separated lemmas ("Aching joints!" -> "ache joint")"""
+        return ' '.join(self.tokens(text))
+
+    def stats(self):
+        info = self._lemma.cache_info()
+        lookups = info.hits + info.misses
+        return {
+            'lemmatizer': self.name,
+            'hits': info.hits,
+            'misses': info.misses,
+            'hit_rate': info.hits / lookups if lookups else 0.0,
+            'size': info.currsize,
+            'max_size': info.maxsize
+        }
+
+    def clear_cache(self):
+        self._lemma.cache_clear()
+
+def create_normalizer():
+    """Build the normalizer configured in the environment, or None when SYMPTOM_LEMMATIZER=none
+
+    Raises NLTKResourceError when the WordNet corpus is missing; the Porter stemmer, which
+    needs no data, is only used when SYMPTOM_LEMMATIZER=porter asks for it.
+    """
+    kind = os.getenv('SYMPTOM_LEMMATIZER', 'wordnet').lower()
+    cache_size = int(os.getenv('LEMMA_CACHE_SIZE', str(LEMMA_CACHE_SIZE)))
+    if kind == 'none':
+        return None
+    if kind == 'wordnet':
+        try:
+            return TokenNormalizer(wordnet_lemmatizer(), cache_size, 'wordnet')
+        except LookupError as e:
+            raise NLTKResourceError(
+                "The WordNet corpus is missing; install it with "
+                "'python -c \"import nlp_processor; nlp_processor.download_nltk_resources()\"' "
+                "or set SYMPTOM_LEMMATIZER=porter (or none)"
+            ) from e
+    if kind == 'porter':
+        return TokenNormalizer(porter_stemmer(), cache_size, 'porter')
+    raise ValueError(f"Unknown SYMPTOM_LEMMATIZER: {kind}")
+
+_normalizer = None
+_normalizer_loaded = False
+_normalizer_lock = threading.Lock()
+
+def get_normalizer():
+    """Return the process-wide normalizer (None when disabled), creating it on first use"""
+    global _normalizer, _normalizer_loaded
+    if not _normalizer_loaded:
+        with _normalizer_lock:
+            if not _normalizer_loaded:
+                _normalizer = create_normalizer()
+                _normalizer_loaded = True
+    return _normalizer
+
+def configure_normalizer(normalizer):
+    """Replace the process-wide normalizer (e.g. for benchmarks); None disables normalization"""
+    global _normalizer, _normalizer_loaded
+    with _normalizer_lock:
+        _normalizer = normalizer
+        _normalizer_loaded = True
@@ -0,0 +1,16 @@
+"""WSGI entry point for multi-worker servers.
+
+Apply schema migrations once per deploy, then start the workers:
+
+    python migrations.py
+    gunicorn -c gunicorn.conf.py wsgi:application
+
+With preload_app (set in gunicorn.conf.py) this module is imported once
+in the master: NLTK corpora, the knowledge-base snapshot and the compiled
+symptom matchers are loaded before fork and shared copy-on-write by every
+worker. Each worker opens its own database connections and starts its
+own refresh thread.
+"""
+from app import create_app
+
+application = create_app()